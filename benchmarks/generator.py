@@ -0,0 +1,89 @@
+"""Deterministic synthetic goal forests for benchmarks."""
+
+import random
+from typing import Any, Dict, Optional
+
+from models import CURRENT_VERSION
+
+STATUSES = ("진행중", "완료", "보류", "취소")
+WORDS = ("목표", "계획", "진행", "검토", "결과", "일정", "자료", "회의", "보고", "개선")
+
+
+def _text(rng: random.Random, chars: int) -> str:
+    if chars <= 0:
+        return ""
+    words = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:chars]
+
+
+def generate_forest(
+    roots: int = 10,
+    depth: int = 4,
+    fanout: int = 5,
+    dapp_ratio: float = 0.3,
+    board_chars: int = 200,
+    seed: int = 0,
+    legacy: bool = False,
+    max_nodes: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Build an AppData document as plain JSON-mode dicts.
+
+    Each node above ``depth`` gets ``fanout`` children, which are DAPP
+    strategies with probability ``dapp_ratio`` and RRTD subgoals otherwise.
+    ``legacy`` produces a version 1.0 document without timestamps.
+    ``max_nodes`` stops generating once that many nodes exist.
+    """
+    rng = random.Random(seed)
+    budget = [max_nodes if max_nodes is not None else float("inf")]
+
+    def make_node(level: int, dapp: bool) -> Dict[str, Any]:
+        budget[0] -= 1
+        node: Dict[str, Any] = {
+            "id": f"{rng.getrandbits(128):032x}",
+            "type": "DAPP_Child" if dapp else "Base",
+            "name": _text(rng, 20),
+            "description": _text(rng, 40),
+            "status": rng.choice(STATUSES),
+            "completion_condition": _text(rng, 20),
+            "children_type": "LEAF",
+            "children": [],
+            "progress_board": _text(rng, board_chars),
+            "content_board": _text(rng, board_chars),
+        }
+        if not legacy:
+            stamp = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00"
+            node["created_at"] = stamp
+            node["updated_at"] = stamp
+        if dapp:
+            node["atp"] = [_text(rng, 20)]
+            node["signposts"] = [_text(rng, 20) for _ in range(rng.randint(0, 2))]
+            node["triggers"] = [_text(rng, 20) for _ in range(rng.randint(0, 2))]
+        if level < depth and budget[0] > 0:
+            node["children_type"] = "DAPP" if rng.random() < dapp_ratio else "RRTD"
+            for _ in range(fanout):
+                if budget[0] <= 0:
+                    break
+                node["children"].append(make_node(level + 1, node["children_type"] == "DAPP"))
+        return node
+
+    forest = []
+    for _ in range(roots):
+        if budget[0] <= 0:
+            break
+        forest.append(make_node(1, False))
+    return {"version": "1.0" if legacy else CURRENT_VERSION, "last_modified": None, "roots": forest}
+
+
+def count_nodes(document: Dict[str, Any]) -> int:
+    count = 0
+    stack = list(document["roots"])
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node["children"])
+    return count
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Benchmark suite for AppState, JsonStorage, ShardedStorage and tree building.
+
+Usage:
+    python benchmarks/run.py --nodes 20000 --output bench_results.json
+    python benchmarks/run.py --output new.json --compare bench_results.json
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.generator import count_nodes, generate_forest  # noqa: E402
+from components.tree_view import build_tree_nodes  # noqa: E402
+from models import AppData, ChildrenType, Status  # noqa: E402
+from persistence import BaseStorage, JsonStorage, ShardedStorage, SnapshotStore  # noqa: E402
+from state import AppState  # noqa: E402
+
+# Parameters that set sample sizes or the regression threshold; runs that
+# differ only in these still measure the same workload
+MEASUREMENT_PARAMS = ("ops", "repeat", "threshold")
+
+
+class MemoryStorage(BaseStorage):
+    """Hands AppState prepared data and never writes, to time state alone."""
+
+    def __init__(self, data: AppData):
+        super().__init__()
+        self.data: Optional[AppData] = data
+
+    def load(self) -> AppData:
+        # Drop the reference so memory measurements see only what AppState keeps
+        data, self.data = self.data, None
+        assert data is not None
+        return data
+
+    def save(self, data: AppData) -> None:
+        pass
+
+    def _snapshot(self, data: AppData, full: bool = False) -> Any:
+        return None
+
+    def _write_payloads(self, payloads: List[Any]) -> None:
+        pass
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    """Best wall time of ``repeat`` calls, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def per_call(fn: Callable[[Any], Any], args: List[Any]) -> float:
+    """Mean time per call over ``args``, in microseconds."""
+    started = time.perf_counter()
+    for arg in args:
+        fn(arg)
+    return (time.perf_counter() - started) / max(len(args), 1) * 1e6
+
+
+def walk_query(state: AppState, status: Status, children_type: ChildrenType) -> List[str]:
+    """What ``AppState.query`` answers, found by walking the whole forest."""
+    found: List[str] = []
+    stack = list(state.data.roots)
+    while stack:
+        node = stack.pop()
+        if node.status == status and node.children_type == children_type:
+            found.append(node.id)
+        stack.extend(node.children)
+    return found
+
+
+def traced_mb(fn: Callable[[], Any]) -> Tuple[float, float]:
+    """Memory still held by the result of ``fn`` and peak during the call, in MB."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return current / 1e6, peak / 1e6
+
+
+def run_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    document = generate_forest(
+        roots=args.roots,
+        depth=args.depth,
+        fanout=args.fanout,
+        dapp_ratio=args.dapp_ratio,
+        board_chars=args.board_chars,
+        seed=args.seed,
+        max_nodes=args.nodes,
+    )
+    metrics: Dict[str, float] = {}
+    workdir = Path(tempfile.mkdtemp())
+    try:
+        path = workdir / "data.json"
+        path.write_text(json.dumps(document, ensure_ascii=False, indent=2), encoding="utf-8")
+        storage = JsonStorage(str(path))
+        metrics["file_mb"] = path.stat().st_size / 1e6
+
+        metrics["load_s"] = best_of(storage.load, args.repeat)
+        _, metrics["load_peak_mb"] = traced_mb(storage.load)
+        data = storage.load()
+        metrics["write_s"] = best_of(lambda: storage._write_sync(data), args.repeat)
+        # Sharded save after an edit in one root, against the whole-document write above
+        sharded = ShardedStorage(str(workdir / "shards"), migrate_from=str(path))
+        sharded.load()
+        metrics["write_one_root_s"] = best_of(
+            lambda: (sharded.touch(data.roots[0].id), sharded._write_sync(data)), args.repeat
+        )
+
+        metrics["state_init_s"] = best_of(
+            lambda: AppState(MemoryStorage(data), compact=args.compact), args.repeat
+        )
+        metrics["state_resident_mb"], metrics["state_peak_mb"] = traced_mb(
+            lambda: AppState(MemoryStorage(storage.load()), compact=args.compact)
+        )
+        state = AppState(MemoryStorage(storage.load()), compact=args.compact)
+
+        metrics["build_tree_nodes_s"] = best_of(lambda: build_tree_nodes(state.data.roots, state), args.repeat)
+        roots_only = {root.id for root in state.data.roots}
+        metrics["build_tree_nodes_lazy_s"] = best_of(
+            lambda: build_tree_nodes(state.data.roots, state, roots_only), args.repeat
+        )
+
+        rng = random.Random(args.seed)
+        ids: List[str] = []
+        stack = list(state.data.roots)
+        while stack:
+            node = stack.pop()
+            ids.append(node.id)
+            stack.extend(node.children)
+        sample = [rng.choice(ids) for _ in range(args.ops)]
+
+        metrics["find_node_by_id_us"] = per_call(state.find_node_by_id, sample)
+        statuses = list(Status)
+        # Indexed query vs the walk it replaces; the first query builds the index
+        metrics["query_index_build_s"] = best_of(
+            lambda: (setattr(state, "_node_index", None), state.query(status=Status.ON_HOLD)), 1
+        )
+        metrics["query_status_leaf_s"] = best_of(
+            lambda: state.query(status=Status.ON_HOLD, children_type=ChildrenType.LEAF), args.repeat
+        )
+        metrics["query_walk_s"] = best_of(lambda: walk_query(state, Status.ON_HOLD, ChildrenType.LEAF), args.repeat)
+        # Always a different value: writing the current value is a no-op
+        metrics["update_node_field_us"] = per_call(
+            lambda node_id: state.update_node_field(
+                node_id, "status", statuses[(statuses.index(state.find_node_by_id(node_id).status) + 1) % len(statuses)]  # type: ignore[union-attr]
+            ),
+            sample,
+        )
+        edits = itertools.count()
+        metrics["update_board_us"] = per_call(
+            lambda node_id: state.update_node_field(
+                node_id, "progress_board", f"{next(edits)} " + "x" * args.board_chars
+            ),
+            sample,
+        )
+        added: List[str] = []
+        metrics["add_child_to_node_us"] = per_call(
+            lambda node_id: added.append(state.add_child_to_node(node_id, ChildrenType.RRTD).id),  # type: ignore[union-attr]
+            sample,
+        )
+        # Delete the fresh leaves, so later runs see the same forest shape
+        metrics["delete_node_us"] = per_call(state.delete_node, added)
+
+        snapshots = SnapshotStore(str(workdir / "snapshots"))
+        metrics["snapshot_full_s"] = best_of(lambda: state.create_snapshot(snapshots), 1)
+        # One edit, then a snapshot that writes only the edited node's path
+        metrics["snapshot_after_edit_us"] = per_call(
+            lambda node_id: (
+                state.update_node_field(node_id, "name", f"renamed {next(edits)}"),
+                state.create_snapshot(snapshots),
+            ),
+            sample[:100],
+        )
+    finally:
+        shutil.rmtree(workdir)
+
+    return {
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "nodes": count_nodes(document),
+        "python": platform.python_version(),
+        "metrics": metrics,
+    }
+
+
+def workload(params: Dict[str, Any]) -> Dict[str, Any]:
+    """The parameters that define what is measured; sample sizes and the threshold only affect how."""
+    return {key: value for key, value in params.items() if key not in MEASUREMENT_PARAMS}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return a report line per metric, marking ones that got worse than ``threshold``."""
+    lines = []
+    for name, value in current["metrics"].items():
+        old = baseline.get("metrics", {}).get(name)
+        if old is None:
+            lines.append(f"  {name:28} {value:12.4f}  (new)")
+            continue
+        change = (value - old) / old if old else 0.0
+        flag = "REGRESSION" if change > threshold else ""
+        lines.append(f"  {name:28} {value:12.4f}  {old:12.4f}  {change:+8.1%}  {flag}")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Goal Tree benchmark suite")
+    parser.add_argument("--nodes", type=int, default=20000, help="stop generating after this many nodes")
+    parser.add_argument("--roots", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--fanout", type=int, default=6)
+    parser.add_argument("--dapp-ratio", type=float, default=0.3, help="share of parents with DAPP children")
+    parser.add_argument("--board-chars", type=int, default=200, help="characters per progress/content board")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ops", type=int, default=1000, help="calls per AppState operation")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per whole-forest measurement (best is kept)")
+    parser.add_argument("--compact", action="store_true", help="run AppState with the compact node store")
+    parser.add_argument("--output", default="bench_results.json", help="where to write results as JSON")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown counted as regression")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args)
+    Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"{results['nodes']} nodes, results written to {args.output}")
+
+    if not args.compare:
+        for name, value in results["metrics"].items():
+            print(f"  {name:28} {value:12.4f}")
+        return 0
+
+    baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+    if workload(baseline.get("params", {})) != workload(results["params"]):
+        print("warning: baseline was run with different parameters")
+    print(f"  {'metric':28} {'current':>12}  {'baseline':>12}  {'change':>8}")
+    lines = compare(results, baseline, args.threshold)
+    print("\n".join(lines))
+    return 1 if any(line.endswith("REGRESSION") for line in lines) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
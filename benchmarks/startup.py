@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Compare cold-start load paths on a large synthetic data.json.
+
+Usage: python benchmarks/startup.py [--depth 5] [--fanout 6] [--roots 20] [--workers 1 2 4 8]
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.generator import generate_forest  # noqa: E402
+from models import AppData, upgrade_app_data  # noqa: E402
+from persistence import JsonStorage, ShardedStorage  # noqa: E402
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--roots", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--fanout", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="load process counts to time")
+    args = parser.parse_args()
+
+    document = generate_forest(roots=args.roots, depth=args.depth, fanout=args.fanout, legacy=True)
+    workdir = Path(tempfile.mkdtemp())
+    try:
+        old_path = workdir / "old.json"
+        old_path.write_text(json.dumps(document, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        def compat_load() -> AppData:
+            with open(old_path, "r", encoding="utf-8") as f:
+                return AppData.model_validate(upgrade_app_data(json.load(f)))
+
+        compat = timed(compat_load, args.repeat)
+
+        # First load upgrades and rewrites the file; later loads take the fast path
+        new_path = workdir / "data.json"
+        shutil.copy(old_path, new_path)
+        storage = JsonStorage(str(new_path))
+        started = time.perf_counter()
+        data = storage.load()
+        upgrade = time.perf_counter() - started
+        fast = timed(storage.load, args.repeat)
+
+        nodes = 0
+        stack = list(data.roots)
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            stack.extend(node.children)
+
+        print(f"nodes: {nodes}, file: {old_path.stat().st_size / 1e6:.1f} MB")
+        print(f"json.load + upgrade + model_validate: {compat:.3f}s")
+        print(f"first load (upgrade + rewrite):       {upgrade:.3f}s")
+        print(f"model_validate_json (current version): {fast:.3f}s  ({compat / fast:.1f}x)")
+
+        # The same forest validated root by root in a process pool, from the file and from shards
+        shards_dir = str(workdir / "shards")
+        ShardedStorage(shards_dir, migrate_from=str(new_path)).load()
+        print(f"{'workers':>7}  {'data.json':>9}  {'shards':>9}")
+        for workers in args.workers:
+            single = timed(JsonStorage(str(new_path), load_workers=workers).load, args.repeat)
+            sharded = timed(ShardedStorage(shards_dir, load_workers=workers).load, args.repeat)
+            print(f"{workers:7}  {single:8.3f}s  {sharded:8.3f}s")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
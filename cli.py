@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Goal Tree command line - bulk export and import without the GUI.
+
+Usage:
+    python cli.py export [--data data.json] [-o nodes.ndjson]
+    python cli.py import nodes.ndjson [--data data.json] [--replace]
+
+Files hold one JSON node per line, with a "parent" id (null for roots);
+parents come before their children. A ``.db`` data file is read and
+written through SQLite row by row; a directory holds one JSON file per
+root (ShardedStorage). Only SQLite imports stream in bounded memory; other
+targets build the whole forest in memory first, so input files above
+IN_MEMORY_IMPORT_BYTES are refused unless ``--in-memory`` is given. Stop
+the GUI before importing: it would overwrite the imported data with its
+own copy. Export only reads: it never upgrades or repairs the data file.
+"""
+
+import argparse
+import sys
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Iterator, List, Optional, TextIO
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from persistence import BaseStorage, BlobStore, JournalStorage, ShardedStorage, SqliteStorage  # noqa: E402
+from persistence.ndjson import NdjsonError, dump_lines, load_records, read_records, tree_records  # noqa: E402
+
+# Largest input a non-SQLite import loads into memory without --in-memory
+IN_MEMORY_IMPORT_BYTES = 100_000_000
+
+
+def open_storage(path: str, boards: str, read_only: bool = False) -> BaseStorage:
+    blobs = BlobStore(boards)
+    if path.endswith(".db"):
+        return SqliteStorage(path, migrate_from=None, blobs=blobs, read_only=read_only)
+    if Path(path).is_dir():
+        return ShardedStorage(path, migrate_from=None, blobs=blobs, read_only=read_only)
+    return JournalStorage(path, blobs=blobs, read_only=read_only)
+
+
+def export(storage: BaseStorage, out: TextIO) -> int:
+    if isinstance(storage, SqliteStorage):
+        records = storage.iter_records()
+    else:
+        records = tree_records(storage.load().roots)
+    count = 0
+    for line in dump_lines(records, storage.blobs):
+        out.write(line)
+        count += 1
+    return count
+
+
+def import_(storage: BaseStorage, lines: Iterator[str], replace: bool, max_errors: int) -> int:
+    if isinstance(storage, SqliteStorage):
+        return storage.import_records(read_records(lines, max_errors), replace)
+    # A JSON document is written whole, so the forest is built in memory first
+    if not replace and storage.load().roots:
+        raise ValueError(f"{storage} already contains nodes; pass --replace to overwrite them")
+    data = load_records(lines, max_errors)
+    storage.save_immediate(data)
+    if storage.error_count:
+        raise OSError(f"Failed to write {storage}")
+    count = 0
+    stack = list(data.roots)
+    while stack:
+        count += 1
+        stack.extend(stack.pop().children)
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk export and import of the goal forest as NDJSON")
+    parser.add_argument("--data", default="data.json", help="data file; .db means SQLite, a directory per-root shards")
+    parser.add_argument("--boards", default="boards", help="blob directory of board text")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write every node as one line")
+    export_parser.add_argument("-o", "--output", default="-", help="output file (- for stdout)")
+    import_parser = commands.add_parser("import", help="load nodes from an NDJSON file")
+    import_parser.add_argument("input", help="input file (- for stdin)")
+    import_parser.add_argument("--replace", action="store_true", help="replace existing nodes")
+    import_parser.add_argument("--max-errors", type=int, default=100, help="stop after this many bad lines")
+    import_parser.add_argument("--in-memory", action="store_true",
+                               help="allow a large import into a non-SQLite target, which holds it all in memory")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        if not Path(args.data).exists():
+            print(f"No data at {args.data}", file=sys.stderr)
+            return 1
+        storage = open_storage(args.data, args.boards, read_only=True)
+        with nullcontext(sys.stdout) if args.output == "-" else open(args.output, "w", encoding="utf-8") as out:
+            count = export(storage, out)
+        print(f"Exported {count} nodes", file=sys.stderr)
+        return 0
+
+    if args.input != "-" and not Path(args.input).is_file():
+        print(f"No such file: {args.input}", file=sys.stderr)
+        return 1
+    storage = open_storage(args.data, args.boards)
+    if not isinstance(storage, SqliteStorage):
+        size = Path(args.input).stat().st_size if args.input != "-" else None
+        if size is not None and size > IN_MEMORY_IMPORT_BYTES and not args.in_memory:
+            print(
+                f"{args.input} is {size / 1e6:.0f} MB; importing into {args.data} builds the whole forest in memory. "
+                "Import into a .db file (streamed), or pass --in-memory.",
+                file=sys.stderr,
+            )
+            return 1
+        print(f"Note: importing into {args.data} holds the whole forest in memory; .db targets stream", file=sys.stderr)
+
+    try:
+        with nullcontext(sys.stdin) if args.input == "-" else open(args.input, encoding="utf-8") as lines:
+            count = import_(storage, lines, args.replace, args.max_errors)
+    except NdjsonError as exc:
+        print(f"Nothing imported. {exc}", file=sys.stderr)
+        return 1
+    except (ValueError, OSError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    print(f"Imported {count} nodes into {args.data}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 from .tree_view import TreeViewComponent
+from .virtual_tree import VirtualTreeView
 from .node_panel import NodeFieldsPanel
 from .boards_panel import BoardsPanel
-from .dialogs import show_children_type_dialog
+from .dialogs import show_children_type_dialog, show_snapshots_dialog
 
-__all__ = ['TreeViewComponent', 'NodeFieldsPanel', 'BoardsPanel', 'show_children_type_dialog']
+__all__ = ['TreeViewComponent', 'VirtualTreeView', 'NodeFieldsPanel', 'BoardsPanel', 'show_children_type_dialog', 'show_snapshots_dialog']
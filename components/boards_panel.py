@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
 from nicegui import ui
 
+from metrics import UI_SECONDS
+
 if TYPE_CHECKING:
-    from state import AppState
+    from state import AppState, TreeChange
 
 
 class BoardsPanel:
@@ -14,6 +16,15 @@ class BoardsPanel:
         self.splitter = splitter
         self.left_container: ui.column | None = None
         self.right_container: ui.column | None = None
+        # Textareas of the selected node's boards, and the field version each edit is based on;
+        # built once and rebound to each selected node
+        self._boards: Dict[str, Any] = {}
+        # Per board: the "Select a node" label and the scroll area holding the textarea
+        self._placeholders: Dict[str, ui.label] = {}
+        self._areas: Dict[str, ui.scroll_area] = {}
+        self._versions: Dict[str, int] = {}
+        # Set while writing a remote value into a board, so it isn't sent back
+        self._syncing = False
 
     def build(self) -> None:
         if self.splitter:
@@ -28,47 +39,71 @@ class BoardsPanel:
                 self.left_container = ui.column().classes("w-1/2 h-full")
                 self.right_container = ui.column().classes("w-1/2 h-full")
 
-        self._rebuild()
-        self.state.subscribe_selection_change(self._rebuild)
+        self._build_board(self.left_container, "progress_board", "Progress Board", "text-blue-600 bg-blue-50")
+        self._build_board(self.right_container, "content_board", "Content Board", "text-green-600 bg-green-50")
+        self._bind()
+        self.state.subscribe_selection_change(self._bind)
+        self.state.subscribe_tree_patch(self._on_change)
 
-    def _rebuild(self) -> None:
-        if self.left_container is None or self.right_container is None:
-            return
+    def _build_board(self, container: ui.column, field: str, title: str, colors: str) -> None:
+        """Build a board's title, placeholder and textarea once; ``_bind`` fills them in."""
+        with container:
+            with ui.column().classes("w-full h-full"):
+                ui.label(title).classes(f"text-sm font-bold px-3 py-1 {colors} border-b shrink-0")
+                self._placeholders[field] = ui.label("Select a node").classes("text-gray-400 italic p-4")
+                with ui.scroll_area().classes("w-full flex-grow") as area:
+                    self._boards[field] = ui.textarea(
+                        on_change=lambda e: self._update_board(field, e.value),
+                    ).classes("w-full min-h-full").props("outlined autogrow borderless")
+                self._areas[field] = area
 
-        self.left_container.clear()
-        self.right_container.clear()
+    @UI_SECONDS.labels("boards", "bind").time()
+    def _bind(self) -> None:
+        """Show the selected node's boards in the existing textareas."""
         node = self.state.get_selected_node()
+        node_id = node.id if node is not None else None
+        for field in self._boards:
+            self._placeholders[field].set_visibility(node_id is None)
+            self._areas[field].set_visibility(node_id is not None)
+            if node_id is not None:
+                self._sync_board(field)
 
-        # Progress Board (left)
-        with self.left_container:
-            with ui.column().classes("w-full h-full"):
-                ui.label("Progress Board").classes(
-                    "text-sm font-bold px-3 py-1 text-blue-600 bg-blue-50 border-b shrink-0"
-                )
-                if not node:
-                    ui.label("Select a node").classes("text-gray-400 italic p-4")
-                else:
-                    with ui.scroll_area().classes("w-full flex-grow"):
-                        ui.textarea(
-                            value=node.progress_board,
-                            on_change=lambda e: self._update_board("progress_board", e.value),
-                        ).classes("w-full min-h-full").props("outlined autogrow borderless")
+    def _update_board(self, field: str, value: str) -> None:
+        if not self.state.selected_node_id or self._syncing:
+            return
+        version = self.state.update_node_field(
+            self.state.selected_node_id, field, value, base_version=self._versions.get(field)
+        )
+        if version is None:
+            ui.notify("Another user changed this board; showing their version.", type="warning")
+            self._sync_board(field)
+        else:
+            self._versions[field] = version
 
-        # Content Board (right)
-        with self.right_container:
-            with ui.column().classes("w-full h-full"):
-                ui.label("Content Board").classes(
-                    "text-sm font-bold px-3 py-1 text-green-600 bg-green-50 border-b shrink-0"
-                )
-                if not node:
-                    ui.label("Select a node").classes("text-gray-400 italic p-4")
-                else:
-                    with ui.scroll_area().classes("w-full flex-grow"):
-                        ui.textarea(
-                            value=node.content_board,
-                            on_change=lambda e: self._update_board("content_board", e.value),
-                        ).classes("w-full min-h-full").props("outlined autogrow borderless")
+    def _sync_board(self, field: str) -> None:
+        """Show the current text of one board without sending it back."""
+        node_id = self.state.selected_node_id
+        element = self._boards.get(field)
+        if node_id is None or element is None:
+            return
+        self._versions[field] = self.state.field_version(node_id, field)
+        text = self.state.get_board(node_id, field)
+        self._syncing = True
+        try:
+            if element.value != text:
+                element.value = text
+        finally:
+            self._syncing = False
 
-    def _update_board(self, field: str, value: str) -> None:
-        if self.state.selected_node_id:
-            self.state.update_node_field(self.state.selected_node_id, field, value)
+    def _on_change(self, change: Optional["TreeChange"]) -> None:
+        """Apply another client's edit of a board of the selected node."""
+        if change is None:
+            self._bind()
+            return
+        if (
+            change.kind == "update"
+            and change.node_id == self.state.selected_node_id
+            and change.origin != getattr(self.state, "client_id", None)
+            and change.field in self._boards
+        ):
+            self._sync_board(change.field)
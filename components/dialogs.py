@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from typing import Optional
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 
 from nicegui import ui
 
 from models import ChildrenType
+from persistence import SnapshotStore
 
 
 async def show_children_type_dialog() -> Optional[ChildrenType]:
@@ -47,3 +49,59 @@ async def show_children_type_dialog() -> Optional[ChildrenType]:
     dialog.open()
     await dialog
     return result["value"]
+
+
+CHANGE_ICONS = {"added": ("add", "green"), "removed": ("remove", "red"), "changed": ("edit", "blue")}
+
+
+def show_snapshots_dialog(state: Any, store: SnapshotStore) -> None:
+    """List saved snapshots; show what changed since the previous one or restore one."""
+    snapshots: List[Dict[str, Any]] = list(reversed(store.list_snapshots()))
+
+    with ui.dialog() as dialog, ui.card().classes("p-4 w-[36rem] max-w-full"):
+        ui.label("Snapshots").classes("text-lg font-bold")
+        if not snapshots:
+            ui.label("No snapshots yet.").classes("text-sm text-gray-500")
+        changes_area = ui.column().classes("w-full gap-0")
+
+        def show_changes(older: Dict[str, Any], newer: Dict[str, Any]) -> None:
+            changes_area.clear()
+            changes = store.diff(older["id"], newer["id"])
+            with changes_area:
+                ui.label(f"{len(changes)} changes since {when(older)}").classes("text-sm font-bold mt-2")
+                with ui.scroll_area().classes("w-full h-48"):
+                    for change in changes:
+                        icon, color = CHANGE_ICONS[change["kind"]]
+                        with ui.row().classes("items-center gap-1 no-wrap"):
+                            ui.icon(icon, color=color, size="xs")
+                            ui.label(change["name"]).classes("text-sm")
+                            if change.get("fields"):
+                                ui.label(", ".join(change["fields"])).classes("text-xs text-gray-500")
+
+        def restore(snapshot: Dict[str, Any]) -> None:
+            # Keep the current forest too, so a restore can itself be undone
+            state.create_snapshot(store, f"Before restoring {when(snapshot)}")
+            state.restore_snapshot(store, snapshot["id"])
+            dialog.close()
+            ui.notify(f"Restored snapshot of {when(snapshot)}")
+
+        with ui.scroll_area().classes("w-full h-48"):
+            for i, snapshot in enumerate(snapshots):
+                with ui.row().classes("w-full items-center gap-2 no-wrap"):
+                    ui.label(when(snapshot)).classes("text-sm")
+                    ui.label(snapshot["label"]).classes("text-xs text-gray-500 flex-1")
+                    if i + 1 < len(snapshots):
+                        ui.button(
+                            "Changes", on_click=lambda older=snapshots[i + 1], newer=snapshot: show_changes(older, newer)
+                        ).props("flat dense size=sm")
+                    ui.button("Restore", on_click=lambda snapshot=snapshot: restore(snapshot)).props(
+                        "flat dense size=sm color=red"
+                    )
+
+        ui.button("Close", on_click=dialog.close).props("flat").classes("self-end")
+
+    dialog.open()
+
+
+def when(snapshot: Dict[str, Any]) -> str:
+    return datetime.fromisoformat(snapshot["created_at"]).strftime("%Y-%m-%d %H:%M")
@@ -1,52 +1,57 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, List
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 from nicegui import ui
 
-from models import ChildrenType, DAPPChildNode, Status
+from metrics import UI_SECONDS
+from models import ChildrenType, Status
 
 from .dialogs import show_children_type_dialog
 
 if TYPE_CHECKING:
-    from state import AppState
+    from state import AppState, TreeChange
+
+# DAPP list fields: label, field name and minimum number of items (ATP is required)
+DAPP_LISTS = (("ATP", "atp", 1), ("Signpost", "signposts", 0), ("Trigger", "triggers", 0))
+DAPP_FIELDS = tuple(field_name for _, field_name, _ in DAPP_LISTS)
+DAPP_MIN_ITEMS: Dict[str, int] = {field_name: min_items for _, field_name, min_items in DAPP_LISTS}
 
 
 class NodeFieldsPanel:
-    def __init__(self, state: "AppState", on_tree_refresh: Any = None):
+    def __init__(self, state: "AppState"):
         self.state = state
-        self.on_tree_refresh = on_tree_refresh
         self.container: ui.column | None = None
+        # Widgets are built once and rebound to each selected node
+        self._placeholder: ui.label | None = None
+        self._fields: ui.row | None = None
+        self._left: ui.column | None = None
+        self._dapp: ui.column | None = None
+        # Inputs of the selected node's scalar fields, and the field version each edit is based on
+        self._inputs: Dict[str, Any] = {}
+        self._versions: Dict[str, int] = {}
+        # Per DAPP list: the column holding its rows, and (row, input, delete button) per item
+        self._lists: Dict[str, ui.column] = {}
+        self._list_rows: Dict[str, List[Tuple[ui.row, ui.input, ui.button]]] = {}
+        # Set while writing a remote value into an input, so it isn't sent back
+        self._syncing = False
 
     def build(self) -> None:
         # Compact layout for bottom panel - 2 rows
         self.container = ui.column().classes("w-full p-2 gap-1 overflow-auto")
-        self._rebuild()
-        self.state.subscribe_selection_change(self._rebuild)
-
-    def _rebuild(self) -> None:
-        if self.container is None:
-            return
-
-        self.container.clear()
-        node = self.state.get_selected_node()
-
         with self.container:
-            if not node:
-                ui.label("Select a node").classes("text-gray-400 italic")
-                return
+            self._placeholder = ui.label("Select a node").classes("text-gray-400 italic")
 
             # Main layout: Left (basic fields, 60%) | Right (DAPP fields, 40%, only for DAPP_Child)
-            is_dapp = isinstance(node, DAPPChildNode)
-            with ui.row().classes("w-full h-full gap-4"):
+            self._fields = ui.row().classes("w-full h-full gap-4")
+            with self._fields:
                 # Left side: Basic node fields (60% when DAPP, 100% otherwise)
-                left_class = "flex-[6] gap-1" if is_dapp else "flex-1 gap-1"
-                with ui.column().classes(left_class):
+                self._left = ui.column().classes("flex-1 gap-1")
+                with self._left:
                     # Row 1: Name (flex) | +child (fixed) | Status (fixed)
                     with ui.row().classes("w-full items-center gap-2"):
-                        ui.input(
+                        self._inputs["name"] = ui.input(
                             "Name",
-                            value=node.name,
                             on_change=lambda e: self._update_field("name", e.value),
                         ).classes("flex-1 min-w-0").props("dense")
 
@@ -55,10 +60,9 @@ class NodeFieldsPanel:
                         )
 
                         status_options = {s.value: s.value for s in Status}
-                        ui.select(
+                        self._inputs["status"] = ui.select(
                             status_options,
                             label="Status",
-                            value=node.status.value,
                             on_change=lambda e: self._update_field("status", Status(e.value)),
                         ).classes("w-28").props("dense")
 
@@ -67,33 +71,53 @@ class NodeFieldsPanel:
                         )
 
                     # Row 2: Description (1 line default, expandable)
-                    ui.textarea(
+                    self._inputs["description"] = ui.textarea(
                         "Description",
-                        value=node.description,
                         on_change=lambda e: self._update_field("description", e.value),
                     ).classes("w-full").props("dense rows=1 autogrow")
 
                     # Row 3: Completion condition (1 line default, expandable)
-                    ui.textarea(
+                    self._inputs["completion_condition"] = ui.textarea(
                         "Completion condition",
-                        value=node.completion_condition,
                         on_change=lambda e: self._update_field("completion_condition", e.value),
                     ).classes("w-full").props("dense rows=1 autogrow")
 
-                # Right side: DAPP fields (40%, only for DAPP_Child nodes)
-                if is_dapp:
-                    with ui.column().classes("flex-[4] gap-2 border-l pl-4"):
-                        ui.label("DAPP").classes("text-sm font-bold text-purple-600")
-                        # ATP (required, min 1)
-                        self._build_dapp_list("ATP", node.atp, "atp", min_items=1)
-                        # Signposts
-                        self._build_dapp_list("Signpost", node.signposts, "signposts", min_items=0)
-                        # Triggers
-                        self._build_dapp_list("Trigger", node.triggers, "triggers", min_items=0)
-
-    def _build_dapp_list(
-        self, label: str, items: List[str], field_name: str, min_items: int = 0
-    ) -> None:
+                # Right side: DAPP fields (40%, only shown for DAPP_Child nodes)
+                self._dapp = ui.column().classes("flex-[4] gap-2 border-l pl-4")
+                with self._dapp:
+                    ui.label("DAPP").classes("text-sm font-bold text-purple-600")
+                    for label, field_name, _ in DAPP_LISTS:
+                        self._build_dapp_list(label, field_name)
+
+        self._bind()
+        self.state.subscribe_selection_change(self._bind)
+        self.state.subscribe_tree_patch(self._on_change)
+
+    @UI_SECONDS.labels("node_fields", "bind").time()
+    def _bind(self) -> None:
+        """Show the selected node in the existing widgets; only changed values are sent."""
+        if self._fields is None or self._placeholder is None or self._left is None or self._dapp is None:
+            return
+
+        node = self.state.get_selected_node()
+        self._placeholder.set_visibility(node is None)
+        self._fields.set_visibility(node is not None)
+        if node is None:
+            return
+
+        for field in self._inputs:
+            self._sync_field(field)
+        is_dapp = node.type == "DAPP_Child"
+        left_class = "flex-[6] gap-1" if is_dapp else "flex-1 gap-1"
+        if self._left.classes != left_class.split():
+            self._left.classes(replace=left_class)
+        self._dapp.set_visibility(is_dapp)
+        if is_dapp:
+            # Rows of other nodes' lists stay hidden until a DAPP node is shown again
+            for field_name in DAPP_FIELDS:
+                self._sync_list(field_name)
+
+    def _build_dapp_list(self, label: str, field_name: str) -> None:
         with ui.column().classes("w-full gap-1"):
             with ui.row().classes("items-center gap-1"):
                 ui.label(label).classes("text-xs text-purple-600 font-bold")
@@ -101,50 +125,120 @@ class NodeFieldsPanel:
                     icon="add",
                     on_click=lambda fn=field_name: self._add_list_item(fn),
                 ).props("flat dense round size=xs color=purple")
+            self._lists[field_name] = ui.column().classes("w-full gap-1")
+            self._list_rows[field_name] = []
 
-            if items:
-                for i, item in enumerate(items):
-                    with ui.row().classes("w-full items-center gap-1"):
-                        ui.input(
-                            value=item,
-                            on_change=lambda e, fn=field_name, idx=i: self._update_list_item(fn, idx, e.value),
+    def _sync_list(self, field_name: str) -> None:
+        """Match a DAPP list's rows to the selected node, adding or removing only the difference."""
+        node = self.state.get_selected_node()
+        if node is None or node.type != "DAPP_Child":
+            return
+        items: List[str] = getattr(node, field_name)
+        rows = self._list_rows[field_name]
+        self._versions[field_name] = self.state.field_version(node.id, field_name)
+        self._syncing = True
+        try:
+            while len(rows) > len(items):
+                row, _, _ = rows.pop()
+                self._lists[field_name].remove(row)
+            while len(rows) < len(items):
+                # Rows keep their position, so each one edits a fixed index
+                with self._lists[field_name]:
+                    with ui.row().classes("w-full items-center gap-1") as row:
+                        item_input = ui.input(
+                            on_change=lambda e, fn=field_name, idx=len(rows): self._update_list_item(fn, idx, e.value),
                         ).classes("flex-1").props("dense")
-
-                        # Show delete button if above minimum
-                        if len(items) > min_items:
-                            ui.button(
-                                icon="close",
-                                on_click=lambda fn=field_name, idx=i: self._remove_list_item(fn, idx),
-                            ).props("flat dense round size=xs color=negative")
+                        # Shown only above the list's minimum length
+                        delete = ui.button(
+                            icon="close",
+                            on_click=lambda fn=field_name, idx=len(rows): self._remove_list_item(fn, idx),
+                        ).props("flat dense round size=xs color=negative")
+                rows.append((row, item_input, delete))
+            removable = len(items) > DAPP_MIN_ITEMS[field_name]
+            for (_, item_input, delete), item in zip(rows, items):
+                if item_input.value != item:
+                    item_input.value = item
+                if delete.visible != removable:
+                    delete.set_visibility(removable)
+        finally:
+            self._syncing = False
 
     def _update_field(self, field: str, value: Any) -> None:
-        if self.state.selected_node_id:
-            self.state.update_node_field(self.state.selected_node_id, field, value)
-            if field in ("name", "status") and self.on_tree_refresh:
-                self.on_tree_refresh()
+        if self.state.selected_node_id and not self._syncing:
+            self._commit(self.state.selected_node_id, field, value)
+
+    def _commit(self, node_id: str, field: str, value: Any) -> Optional[int]:
+        """Send an edit based on the version this panel last saw; on conflict show the newer value."""
+        version = self.state.update_node_field(node_id, field, value, base_version=self._versions.get(field))
+        if version is None:
+            ui.notify("Another user changed this field; showing their version.", type="warning")
+            if field in self._inputs:
+                self._sync_field(field)
+            else:
+                self._sync_list(field)
+            return None
+        self._versions[field] = version
+        return version
+
+    def _sync_field(self, field: str) -> None:
+        """Show the current value of one field without sending it back."""
+        node = self.state.get_selected_node()
+        element = self._inputs.get(field)
+        if node is None or element is None:
+            return
+        value = getattr(node, field)
+        if isinstance(value, Status):
+            value = value.value
+        self._versions[field] = self.state.field_version(node.id, field)
+        self._syncing = True
+        try:
+            if element.value != value:
+                element.value = value
+        finally:
+            self._syncing = False
+
+    def _on_change(self, change: Optional["TreeChange"]) -> None:
+        """Apply another client's edit of the selected node field by field."""
+        if change is None:
+            self._bind()
+            return
+        if (
+            change.kind != "update"
+            or change.node_id != self.state.selected_node_id
+            or change.origin == getattr(self.state, "client_id", None)
+        ):
+            return
+        if change.field in self._inputs:
+            self._sync_field(change.field)
+        elif change.field in DAPP_FIELDS:
+            # List rows may have come or gone
+            self._sync_list(change.field)
 
     def _add_list_item(self, field_name: str) -> None:
         node = self.state.get_selected_node()
-        if node and isinstance(node, DAPPChildNode):
+        if node and node.type == "DAPP_Child":
             items: List[str] = getattr(node, field_name)
-            items.append("")
-            self.state._save_only()
-            self._rebuild()
+            self._commit(node.id, field_name, items + [""])
+            self._sync_list(field_name)
 
     def _update_list_item(self, field_name: str, index: int, value: str) -> None:
         node = self.state.get_selected_node()
-        if node and isinstance(node, DAPPChildNode):
-            items: List[str] = getattr(node, field_name)
+        if node and node.type == "DAPP_Child" and not self._syncing:
+            items: List[str] = list(getattr(node, field_name))
+            if index >= len(items):
+                return  # Row removed by another client
             items[index] = value
-            self.state._save_only()
+            self._commit(node.id, field_name, items)
 
     def _remove_list_item(self, field_name: str, index: int) -> None:
         node = self.state.get_selected_node()
-        if node and isinstance(node, DAPPChildNode):
-            items: List[str] = getattr(node, field_name)
+        if node and node.type == "DAPP_Child":
+            items: List[str] = list(getattr(node, field_name))
+            if index >= len(items):
+                return  # Row removed by another client
             items.pop(index)
-            self.state._save_only()
-            self._rebuild()
+            self._commit(node.id, field_name, items)
+            self._sync_list(field_name)
 
     async def _on_add_child(self) -> None:
         node = self.state.get_selected_node()
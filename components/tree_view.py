@@ -1,13 +1,17 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Dict, List
+import json
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, ContextManager, Container, Dict, List, Optional, Set, Tuple
 
 from nicegui import ui
 
+from metrics import UI_SECONDS
 from models import Status
 
 if TYPE_CHECKING:
-    from state import AppState
+    from state import AppState, TreeChange
 
 STATUS_COLORS: Dict[Status, str] = {
     Status.IN_PROGRESS: "#2196F3",  # blue
@@ -16,38 +20,204 @@ STATUS_COLORS: Dict[Status, str] = {
     Status.CANCELLED: "#F44336",  # red
 }
 
+# Node fields shown in tree headers; updates to other fields leave the tree alone
+HEADER_FIELDS = frozenset({"name", "status", "archive_ref"})
+
+# Order of the descendant counts shown in each header
+ROLLUP_STATUSES = (Status.COMPLETED, Status.IN_PROGRESS, Status.ON_HOLD, Status.CANCELLED)
+
+# JS array literal of the rollup count colors, for the header slot template
+ROLLUP_COLORS = json.dumps([STATUS_COLORS[status] for status in ROLLUP_STATUSES]).replace('"', "'")
+
+# Node header: Icon Name ... rollup HH:MM HH:MM (times on right, fixed width).
+# Written against a ui.tree node (``props.node``); other views substitute their slot scope.
+HEADER_TEMPLATE = """
+<div style="display: flex; align-items: center; width: 100%; font-size: 12px; overflow: hidden;">
+    <q-icon :name="props.node.icon" :style="{ color: props.node.status_color }" size="16px" style="flex-shrink: 0; margin-right: 4px;" />
+    <span :style="{ color: props.node.status_color }" style="flex: 1; min-width: 0; overflow: hidden; text-overflow: ellipsis; white-space: nowrap;">
+        {{ props.node.label }}
+    </span>
+    <q-icon v-if="props.node.archived" name="inventory_2" size="14px" class="text-grey-6" style="flex-shrink: 0; margin-left: 4px;">
+        <q-tooltip>Archived; expand to load</q-tooltip>
+    </q-icon>
+    <span v-if="props.node.rollup" style="flex-shrink: 0; font-family: monospace; font-size: 10px; margin-left: 4px;">
+        <template v-for="(count, i) in props.node.rollup.counts">
+            <span v-if="count" :style="{ color: """ + ROLLUP_COLORS + """[i] }">{{ count }} </span>
+        </template>
+        <span v-if="props.node.rollup.percent !== null" class="text-grey-7">{{ props.node.rollup.percent }}%</span>
+    </span>
+    <span class="text-grey-5" style="flex-shrink: 0; font-family: monospace; font-size: 10px; margin-left: 4px;">
+        {{ props.node.created_time }} {{ props.node.updated_time }}
+    </span>
+</div>
+"""
+
 NODE_ICONS: Dict[str, str] = {
     "Base": "radio_button_checked",
     "DAPP_Child": "change_history",
 }
 
+# Maximum number of search hits listed under the search box
+SEARCH_LIMIT = 20
+
+# Filter choices in the sidebar; keys are the values AppState.query takes
+TYPE_OPTIONS = {"Base": "Goals", "DAPP_Child": "Strategies"}
+CHILDREN_TYPE_OPTIONS = {"LEAF": "Leaves", "RRTD": "RRTD parents", "DAPP": "DAPP parents"}
+# Updated filter: label, age, and whether nodes older than the age match (stale) rather than newer ones
+UPDATED_FILTERS: Dict[str, Tuple[str, timedelta, bool]] = {
+    "1d": ("Within a day", timedelta(days=1), False),
+    "7d": ("Within 7 days", timedelta(days=7), False),
+    "30d": ("Within 30 days", timedelta(days=30), False),
+    "stale7": ("Not for 7 days", timedelta(days=7), True),
+    "stale30": ("Not for 30 days", timedelta(days=30), True),
+}
+
+# Maximum number of filter matches shown in the tree, with their ancestors
+FILTER_LIMIT = 500
+
 
-def build_tree_nodes(nodes: List[Any], state: "AppState") -> List[Dict[str, Any]]:
-    """Convert Pydantic nodes to ui.tree format."""
-    result = []
-    for node in nodes:
-        tree_node = {
-            "id": node.id,
-            "label": node.name,
-            "icon": NODE_ICONS.get(node.type, "circle"),
-            "status_color": STATUS_COLORS.get(node.status, "#000000"),
-            "created_time": node.created_at.strftime("%H:%M"),
-            "updated_time": node.updated_at.strftime("%H:%M"),
-            "children": build_tree_nodes(node.children, state) if node.children else [],
+# Applies a list of patch operations to a ui.tree's nodes on the client,
+# so single-node edits don't resend the whole forest. It reaches the element's
+# data through mounted_app.elements, which NiceGUI does not document as public;
+# requirements.txt caps nicegui at the major versions this was tested with.
+TREE_PATCH_JS = """<script>
+window.goalTreePatch = function (elementId, ops) {
+    const element = mounted_app.elements[elementId];
+    if (!element) return;
+    const props = element.props;
+    const find = (nodes, id) => {
+        for (const node of nodes) {
+            if (node.id === id) return node;
+            const found = find(node.children || [], id);
+            if (found) return found;
         }
-        result.append(tree_node)
-    return result
+        return null;
+    };
+    const siblings = (parentId) => parentId === null ? props.nodes : (find(props.nodes, parentId) || {}).children;
+    for (const op of ops) {
+        if (op.kind === "update") {
+            const node = find(props.nodes, op.id);
+            if (node) Object.assign(node, op.fields);
+        } else if (op.kind === "insert") {
+            const list = siblings(op.parent);
+            if (list) list.splice(op.index, 0, op.node);
+        } else if (op.kind === "remove") {
+            const list = siblings(op.parent);
+            if (list) list.splice(op.index, 1);
+        } else if (op.kind === "load") {
+            const node = find(props.nodes, op.id);
+            if (node) Object.assign(node, {lazy: op.lazy, children: op.children});
+        } else if (op.kind === "expand") {
+            const expanded = new Set(props.expanded || []);
+            op.ids.forEach((id) => expanded.add(id));
+            props.expanded = Array.from(expanded);
+        } else if (op.kind === "select") {
+            props.selected = op.id;
+        }
+    }
+};
+
+// Quasar's lazy-load "done" callbacks, waiting for children from the server
+window.goalTreeLazy = {};
+window.goalTreeLazyResolve = function (elementId, key, children) {
+    const done = goalTreeLazy[elementId + ":" + key];
+    delete goalTreeLazy[elementId + ":" + key];
+    if (done) done(children);
+};
+</script>"""
+
+
+def tree_node_fields(node: Any, state: "AppState") -> Dict[str, Any]:
+    """Display fields of a single tree node that change on edit."""
+    return {
+        "label": node.name,
+        "status_color": STATUS_COLORS.get(node.status, "#000000"),
+        "updated_time": node.updated_at.strftime("%H:%M"),
+        "rollup": tree_node_rollup(node, state),
+        "archived": bool(node.archive_ref),
+    }
+
+
+def tree_node_rollup(node: Any, state: "AppState") -> Optional[Dict[str, Any]]:
+    """Descendant counts (in ROLLUP_STATUSES order) and completion %, None for leaves."""
+    if not node.children and not state.has_hidden_children(node):
+        return None
+    rollup = state.get_rollup(node.id)
+    if rollup is None or rollup.total == 0:
+        return None
+    completion = rollup.completion
+    return {
+        "counts": [rollup.counts[status] for status in ROLLUP_STATUSES],
+        "percent": round(completion) if completion is not None else None,
+    }
+
+
+def build_tree_node(
+    node: Any, state: "AppState", expanded: Optional[Container[str]] = None,
+    visible: Optional[Container[str]] = None,
+) -> Dict[str, Any]:
+    """Convert a Pydantic node and its subtree to ui.tree format.
+
+    If ``expanded`` is given, children of nodes not in it are left out and
+    the node is marked ``lazy`` so Quasar asks for them on expand. If
+    ``visible`` is given, only descendants in it are included. Nodes with
+    hidden children (archive stubs, and nodes a partial load stopped at)
+    are always lazy: expanding one brings its children in.
+    """
+    tree_node = {
+        "id": node.id,
+        "icon": NODE_ICONS.get(node.type, "circle"),
+        "created_time": node.created_at.strftime("%H:%M"),
+        **tree_node_fields(node, state),
+        "children": [],
+    }
+    if state.has_hidden_children(node):
+        tree_node["lazy"] = True
+    elif node.children:
+        if expanded is not None and node.id not in expanded:
+            tree_node["lazy"] = True
+        else:
+            tree_node["children"] = build_tree_nodes(node.children, state, expanded, visible)
+    return tree_node
+
+
+def build_tree_nodes(
+    nodes: List[Any], state: "AppState", expanded: Optional[Container[str]] = None,
+    visible: Optional[Container[str]] = None,
+) -> List[Dict[str, Any]]:
+    """Convert Pydantic nodes to ui.tree format, skipping nodes not in ``visible`` if given."""
+    return [
+        build_tree_node(node, state, expanded, visible) for node in nodes if visible is None or node.id in visible
+    ]
 
 
 class TreeViewComponent:
-    def __init__(self, state: "AppState"):
+    def __init__(self, state: "AppState", lazy: bool = False):
         self.state = state
+        # Only send children of expanded nodes; fetch the rest on expand
+        self.lazy = lazy
         self.tree: ui.tree | None = None
         self.container: ui.column | None = None
+        self.results: ui.column | None = None
+        # id -> node dict held in the tree's props, for in-place patching
+        self._tree_dicts: Dict[str, Dict[str, Any]] = {}
+        # Expanded ids last reported by the client, to tell what it just opened or closed
+        self._expanded: Set[str] = set()
+        # Sidebar filter: AppState.query arguments, the filter inputs, and while
+        # filtering, the nodes shown (matches and their ancestors) and those opened
+        self._query: Dict[str, Any] = {}
+        self._filter_inputs: Dict[str, Any] = {}
+        self._filter_count: ui.label | None = None
+        self._resetting_filters = False
+        self._visible: Optional[Set[str]] = None
+        self._filter_opened: Set[str] = set()
 
     def build(self) -> None:
+        ui.add_head_html(TREE_PATCH_JS)
+        self._build_search()
+        self._build_filters()
         # Everything in one scroll area so button follows tree content
-        with ui.scroll_area().classes("w-full h-full"):
+        with ui.scroll_area().classes("w-full flex-grow min-h-0"):
             with ui.column().classes("w-full gap-0"):
                 self.container = ui.column().classes("w-full gap-0")
                 self._rebuild_tree()
@@ -57,17 +227,107 @@ class TreeViewComponent:
                     "ml-4 mt-1"
                 ).props("flat dense color=primary size=sm")
 
+    def _build_search(self) -> None:
+        # Search box with its hits listed above the tree
+        ui.input(placeholder="Search...", on_change=self._on_search).props(
+            "dense clearable"
+        ).classes("w-full px-2 shrink-0")
+        self.results = ui.column().classes("w-full gap-0 px-2 shrink-0")
+
+    def _build_filters(self) -> None:
+        """Status, type, children and last-update filters, folded away until needed."""
+        with ui.expansion("Filters", icon="filter_list").props("dense").classes("w-full shrink-0 text-xs"):
+            with ui.column().classes("w-full gap-0 px-2"):
+                self._filter_inputs["status"] = ui.select(
+                    {s.value: s.value for s in Status}, label="Status", multiple=True, on_change=self._on_filter
+                ).props("dense clearable use-chips").classes("w-full")
+                self._filter_inputs["node_type"] = ui.select(
+                    TYPE_OPTIONS, label="Type", on_change=self._on_filter
+                ).props("dense clearable").classes("w-full")
+                self._filter_inputs["children_type"] = ui.select(
+                    CHILDREN_TYPE_OPTIONS, label="Children", on_change=self._on_filter
+                ).props("dense clearable").classes("w-full")
+                self._filter_inputs["updated"] = ui.select(
+                    {key: label for key, (label, _, _) in UPDATED_FILTERS.items()},
+                    label="Updated",
+                    on_change=self._on_filter,
+                ).props("dense clearable").classes("w-full")
+                self._filter_count = ui.label().classes("text-xs text-gray-500")
+
+    def _on_filter(self, _: Any = None) -> None:
+        if self._resetting_filters:
+            return
+        query: Dict[str, Any] = {}
+        for key in ("status", "node_type", "children_type"):
+            value = self._filter_inputs[key].value
+            if value:
+                query[key] = value
+        updated = self._filter_inputs["updated"].value
+        if updated:
+            _, age, stale = UPDATED_FILTERS[updated]
+            query["updated_before" if stale else "updated_after"] = datetime.now() - age
+        self._query = query
+        self._rebuild_tree()
+
+    def _clear_filters(self) -> None:
+        self._resetting_filters = True
+        try:
+            for element in self._filter_inputs.values():
+                element.value = [] if element is self._filter_inputs["status"] else None
+        finally:
+            self._resetting_filters = False
+        self._on_filter()
+
+    def _apply_filter(self) -> None:
+        """Work out which nodes a rebuild shows: all, or the matches and their ancestors."""
+        if not self._query:
+            self._visible = None
+            self._filter_opened = set()
+            if self._filter_count is not None:
+                self._filter_count.set_text("")
+            return
+        matches = self.state.query(**self._query, limit=FILTER_LIMIT + 1)
+        visible = set(matches[:FILTER_LIMIT])
+        opened: Set[str] = set()
+        for node_id in matches[:FILTER_LIMIT]:
+            for ancestor in self.state.iter_ancestors(node_id):
+                if ancestor.id in opened:
+                    break  # and so are the ones above it
+                opened.add(ancestor.id)
+        self._visible = visible | opened
+        self._filter_opened = opened
+        if self._filter_count is not None:
+            if len(matches) > FILTER_LIMIT:
+                self._filter_count.set_text(f"Showing the first {FILTER_LIMIT} matches")
+            else:
+                self._filter_count.set_text(f"{len(matches)} match{'es' if len(matches) != 1 else ''}")
+
+    def _filter_affected(self, change: "TreeChange") -> bool:
+        """Whether a change may add or drop filter matches (every edit moves updated_at)."""
+        return (
+            change.kind != "update"
+            or change.field in ("status", "archive_ref")
+            or "updated_after" in self._query
+            or "updated_before" in self._query
+        )
+
+    @UI_SECONDS.labels("tree", "rebuild").time()
     def _rebuild_tree(self) -> None:
         if self.container is None:
             return
 
         self.container.clear()
+        self.tree = None
+        self._tree_dicts = {}
+        self._apply_filter()
         with self.container:
-            nodes = build_tree_nodes(self.state.data.roots, self.state)
+            nodes = build_tree_nodes(self.state.data.roots, self.state, self._expanded_filter(), self._visible)
             if not nodes:
-                ui.label("No goals yet. Click '+ Add Root Goal' to start.").classes(
-                    "text-gray-500 italic"
+                message = (
+                    "No nodes match the filters." if self._visible is not None
+                    else "No goals yet. Click '+ Add Root Goal' to start."
                 )
+                ui.label(message).classes("text-gray-500 italic")
                 return
 
             self.tree = (
@@ -82,37 +342,282 @@ class TreeViewComponent:
                 .classes("w-full")
             )
 
-            # Custom header slot: Icon Name ... HH:MM HH:MM (times on right, fixed width)
-            self.tree.add_slot(
-                "default-header",
-                """
-                <div style="display: flex; align-items: center; width: 100%; font-size: 12px; overflow: hidden;">
-                    <q-icon :name="props.node.icon" :style="{ color: props.node.status_color }" size="16px" style="flex-shrink: 0; margin-right: 4px;" />
-                    <span :style="{ color: props.node.status_color }" style="flex: 1; min-width: 0; overflow: hidden; text-overflow: ellipsis; white-space: nowrap;">
-                        {{ props.node.label }}
-                    </span>
-                    <span class="text-grey-5" style="flex-shrink: 0; font-family: monospace; font-size: 10px; margin-left: 4px;">
-                        {{ props.node.created_time }} {{ props.node.updated_time }}
-                    </span>
-                </div>
-                """,
-            )
+            # Custom header slot: Icon Name ... rollup HH:MM HH:MM (times on right, fixed width)
+            self.tree.add_slot("default-header", HEADER_TEMPLATE)
+
+            # Index the dicts actually stored in props (NiceGUI may wrap them)
+            self._index_tree_dicts(self.tree.props["nodes"])
 
-            # Set expanded state
-            if self.state.expanded_nodes:
-                self.tree.props["expanded"] = list(self.state.expanded_nodes)
+            # Set expanded state: only nodes sent to this client, so the list stays small;
+            # a filtered tree opens the path to every match
+            if self._visible is not None:
+                self._expanded = set(self._filter_opened)
+            else:
+                # Only nodes sent with their children: a lazy node in expanded_nodes has
+                # hidden children, and opening it loads or restores them
+                self._expanded = {
+                    node_id for node_id, tree_node in self._tree_dicts.items()
+                    if tree_node["children"] and node_id in self.state.expanded_nodes
+                }
+            self.tree.props["expanded"] = list(self._expanded)
             self.tree.on("update:expanded", self._on_expand_change)
+            # Even a tree sent whole has lazy nodes: archive stubs and unloaded subtrees
+            self.tree.on(
+                "lazy-load",
+                self._on_lazy_load,
+                js_handler=f"(e) => {{ goalTreeLazy['{self.tree.id}:' + e.key] = e.done; emit(e.key); }}",
+            )
 
             # Set selected node if any
             if self.state.selected_node_id:
                 self.tree.props["selected"] = self.state.selected_node_id
 
+    def _expanded_filter(self) -> Optional[Container[str]]:
+        # A filtered tree is small and sent whole
+        return self.state.expanded_nodes if self.lazy and self._visible is None else None
+
+    def _on_lazy_load(self, e: Any) -> None:
+        """Send the children of a collapsed node the client just expanded, loading or restoring hidden ones."""
+        node_id = e.args
+        tree = self.tree
+        if tree is None:
+            return
+        self.state.reveal_children(node_id)
+        if self.tree is not tree:
+            return  # The restore rebuilt the tree (it was filtered); nothing is waiting any more
+        # The node is being expanded, so its children get serialized now
+        self.state.expanded_nodes.add(node_id)
+        children = self._fill_children(node_id, self._expanded_filter())
+        if children is not None:
+            self.tree.client.run_javascript(
+                f"goalTreeLazyResolve({self.tree.id}, {json.dumps(node_id)}, "
+                f"{json.dumps(children, ensure_ascii=False)})"
+            )
+
+    def _fill_children(self, node_id: str, expanded: Optional[Container[str]]) -> Optional[List[Dict[str, Any]]]:
+        """Serialize a lazy node's current children into the server-side props."""
+        node = self.state.find_node_by_id(node_id)
+        tree_node = self._tree_dicts.get(node_id)
+        if node is None or tree_node is None:
+            return None
+        children = build_tree_nodes(node.children, self.state, expanded)
+        with self._suspend_updates():
+            tree_node["lazy"] = False
+            tree_node["children"] = children
+        self._index_tree_dicts(tree_node["children"])
+        return children
+
+    def _index_tree_dicts(self, nodes: List[Dict[str, Any]]) -> None:
+        stack = list(nodes)
+        while stack:
+            tree_node = stack.pop()
+            self._tree_dicts[tree_node["id"]] = tree_node
+            stack.extend(tree_node["children"])
+
+    def _unindex_tree_dicts(self, tree_node: Dict[str, Any]) -> None:
+        stack = [tree_node]
+        while stack:
+            current = stack.pop()
+            self._tree_dicts.pop(current["id"], None)
+            stack.extend(current["children"])
+
+    def _suspend_updates(self) -> ContextManager[Any]:
+        """Mutate tree props without NiceGUI resending the whole element."""
+        assert self.tree is not None
+        suspend = getattr(self.tree.props, "suspend_updates", None)
+        return suspend() if suspend is not None else nullcontext()
+
+    def _send_patch(self, ops: List[Dict[str, Any]]) -> None:
+        assert self.tree is not None
+        self.tree.client.run_javascript(
+            f"goalTreePatch({self.tree.id}, {json.dumps(ops, ensure_ascii=False)})"
+        )
+
+    def _siblings(self, parent_id: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        assert self.tree is not None
+        if parent_id is None:
+            return self.tree.props["nodes"]
+        parent = self._tree_dicts.get(parent_id)
+        return parent["children"] if parent is not None else None
+
+    @UI_SECONDS.labels("tree", "patch").time()
+    def apply_change(self, change: Optional["TreeChange"]) -> None:
+        """Patch the existing tree for a single change, rebuilding only when needed."""
+        if change is None or self.tree is None or (self._visible is not None and self._filter_affected(change)):
+            self._rebuild_tree()
+            return
+        if change.kind == "update" and change.field is not None and change.field not in HEADER_FIELDS:
+            return
+
+        # Descendant rollups shift along the whole ancestor chain
+        if change.kind == "remove":
+            ancestor_ids = [change.parent_id] if change.parent_id else []
+            if change.parent_id:
+                ancestor_ids += [ancestor.id for ancestor in self.state.iter_ancestors(change.parent_id)]
+        else:
+            ancestor_ids = [ancestor.id for ancestor in self.state.iter_ancestors(change.node_id)]
+
+        ops = self._change_ops(change)
+        if ops is None or self.tree is None:
+            return  # rebuilt from scratch
+        ops.extend(self._rollup_ops(ancestor_ids))
+        if ops:
+            self._send_patch(ops)
+
+    def _rollup_ops(self, node_ids: List[str]) -> List[Dict[str, Any]]:
+        """Update ops for the given nodes whose sent rollup is out of date."""
+        ops = []
+        for node_id in node_ids:
+            node = self.state.find_node_by_id(node_id)
+            tree_node = self._tree_dicts.get(node_id)
+            if node is None or tree_node is None:
+                continue
+            rollup = tree_node_rollup(node, self.state)
+            if rollup == tree_node.get("rollup"):
+                continue
+            with self._suspend_updates():
+                tree_node["rollup"] = rollup
+            ops.append({"kind": "update", "id": node_id, "fields": {"rollup": rollup}})
+        return ops
+
+    def _change_ops(self, change: "TreeChange") -> Optional[List[Dict[str, Any]]]:
+        """Apply a change to the server-side props; return the client ops, or None after a rebuild."""
+        assert self.tree is not None
+        if change.kind == "update":
+            node = self.state.find_node_by_id(change.node_id)
+            tree_node = self._tree_dicts.get(change.node_id)
+            if node is None or tree_node is None:
+                return []
+            fields = tree_node_fields(node, self.state)
+            with self._suspend_updates():
+                tree_node.update(fields)
+            return [{"kind": "update", "id": change.node_id, "fields": fields}]
+
+        elif change.kind == "insert":
+            node = self.state.find_node_by_id(change.node_id)
+            siblings = self._siblings(change.parent_id)
+            if node is None:
+                return []
+            if siblings is None:
+                # With lazy loading the parent may simply not be on the client yet
+                if not self.lazy:
+                    self._rebuild_tree()
+                    return None
+                return []
+            expand_ids = [change.node_id] + ([change.parent_id] if change.parent_id else [])
+            with self._suspend_updates():
+                expanded = self.tree.props.setdefault("expanded", [])
+                expanded.extend(i for i in expand_ids if i not in expanded)
+            self._expanded.update(expand_ids)
+            if change.parent_id:
+                self.state.expanded_nodes.add(change.parent_id)
+            expand_op = {"kind": "expand", "ids": expand_ids}
+
+            parent_tree_node = self._tree_dicts.get(change.parent_id) if change.parent_id else None
+            if parent_tree_node is not None and parent_tree_node.get("lazy"):
+                # Children were never sent; send them all now that the parent opens
+                assert change.parent_id is not None
+                children = self._fill_children(change.parent_id, self._expanded_filter())
+                return [
+                    {"kind": "load", "id": change.parent_id, "lazy": False, "children": children},
+                    expand_op,
+                ]
+
+            new_tree_node = build_tree_node(node, self.state, self._expanded_filter())
+            with self._suspend_updates():
+                siblings.insert(change.index, new_tree_node)
+            self._index_tree_dicts([siblings[change.index]])
+            return [
+                {"kind": "insert", "parent": change.parent_id, "index": change.index, "node": new_tree_node},
+                expand_op,
+            ]
+
+        elif change.kind == "remove":
+            if not self.state.data.roots:
+                self._rebuild_tree()
+                return None
+            siblings = self._siblings(change.parent_id)
+            if siblings is None:
+                if not self.lazy:
+                    self._rebuild_tree()
+                    return None
+                return []
+
+            parent_tree_node = self._tree_dicts.get(change.parent_id) if change.parent_id else None
+            if parent_tree_node is not None and parent_tree_node.get("lazy"):
+                # Removed child was never sent; only the expand arrow may change
+                parent = self.state.find_node_by_id(change.parent_id)
+                if parent is not None and not parent.children:
+                    with self._suspend_updates():
+                        parent_tree_node["lazy"] = False
+                    return [{"kind": "update", "id": change.parent_id, "fields": {"lazy": False}}]
+                return []
+
+            with self._suspend_updates():
+                removed = siblings.pop(change.index)
+            self._unindex_tree_dicts(removed)
+            return [{"kind": "remove", "parent": change.parent_id, "index": change.index}]
+
+        return []
+
+    def _on_search(self, e: Any) -> None:
+        self._show_results((e.value or "").strip())
+
+    def _show_results(self, query: str, archived: bool = False) -> None:
+        if self.results is None:
+            return
+        self.results.clear()
+        if not query:
+            return
+        nodes = self.state.search(query, limit=SEARCH_LIMIT, archived=archived)
+        with self.results:
+            if not nodes:
+                ui.label("No matches").classes("text-xs text-gray-500 italic")
+            for node in nodes:
+                ui.label(node.name).classes(
+                    "text-xs cursor-pointer hover:bg-blue-50 truncate w-full"
+                ).on("click", lambda _, node_id=node.id: self.reveal(node_id))
+            if self.state.archive is not None and not archived:
+                # Reads every archive, so only on request; matches are restored into the tree
+                ui.label("Search the archive too").classes(
+                    "text-xs text-primary cursor-pointer hover:underline"
+                ).on("click", lambda: self._show_results(query, archived=True))
+
+    def reveal(self, node_id: str) -> None:
+        """Expand the path to a node, loading lazy branches, and select it."""
+        if self._visible is not None and node_id not in self._visible:
+            self._clear_filters()
+        ancestor_ids = [ancestor.id for ancestor in self.state.iter_ancestors(node_id)]
+        self.state.expanded_nodes.update(ancestor_ids)
+        if self.tree is not None:
+            ops: List[Dict[str, Any]] = []
+            # Top down: filling the highest lazy ancestor builds the rest of the path
+            for ancestor_id in reversed(ancestor_ids):
+                tree_node = self._tree_dicts.get(ancestor_id)
+                if tree_node is not None and tree_node.get("lazy"):
+                    children = self._fill_children(ancestor_id, self._expanded_filter())
+                    ops.append({"kind": "load", "id": ancestor_id, "lazy": False, "children": children})
+            with self._suspend_updates():
+                expanded = self.tree.props.setdefault("expanded", [])
+                expanded.extend(i for i in ancestor_ids if i not in expanded)
+                self.tree.props["selected"] = node_id
+            self._expanded.update(ancestor_ids)
+            ops.append({"kind": "expand", "ids": ancestor_ids})
+            ops.append({"kind": "select", "id": node_id})
+            self._send_patch(ops)
+        self.state.select_node(node_id)
+
     def _on_node_select(self, e: Any) -> None:
         node_id = e.value if e.value else None
         self.state.select_node(node_id)
 
     def _on_expand_change(self, e: Any) -> None:
-        self.state.expanded_nodes = set(e.args)
+        expanded = set(e.args)
+        for node_id in expanded - self._expanded:
+            self.state.expanded_nodes.add(node_id)
+        for node_id in self._expanded - expanded:
+            self.state.expanded_nodes.discard(node_id)
+        self._expanded = expanded
 
     def _on_add_root(self) -> None:
         node = self.state.add_root_node()
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import json
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, ContextManager, Dict, List, Optional
+
+from nicegui import ui
+
+from metrics import UI_SECONDS
+
+from .tree_view import HEADER_FIELDS, HEADER_TEMPLATE, NODE_ICONS, TreeViewComponent, tree_node_fields, tree_node_rollup
+
+if TYPE_CHECKING:
+    from state import AppState, TreeChange
+
+# Fixed row height in px, so the scroller can place rows it has not rendered
+ROW_HEIGHT = 24
+
+# Indentation per tree level in px
+INDENT = 16
+
+# Maximum rows per JS splice call; larger spreads overflow the call stack
+SPLICE_CHUNK = 10000
+
+
+# Applies splice/update operations to a q-virtual-scroll's rows on the client,
+# through mounted_app.elements like the tree patch in tree_view.py
+ROWS_PATCH_JS = """<script>
+window.goalRowsPatch = function (elementId, ops) {
+    const element = mounted_app.elements[elementId];
+    if (!element) return;
+    const items = element.props.items;
+    for (const op of ops) {
+        if (op.kind === "splice") {
+            items.splice(op.index, op.remove);
+            for (let i = 0; i < op.rows.length; i += """ + str(SPLICE_CHUNK) + """) {
+                items.splice(op.index + i, 0, ...op.rows.slice(i, i + """ + str(SPLICE_CHUNK) + """));
+            }
+        } else if (op.kind === "update") {
+            Object.assign(items[op.index], op.fields);
+        }
+    }
+};
+</script>"""
+
+
+def row_template(element_id: int) -> str:
+    """Slot template of one row: indent, expand arrow, then the shared node header.
+
+    Events go to the q-virtual-scroll element itself: Quasar renders the
+    rows inside a QList, so ``$parent`` would be the wrong component.
+    """
+    emit = f"getElement({element_id}).$emit"
+    return (
+        f"""
+        <div class="hover:bg-blue-50" style="display: flex; align-items: center; height: {ROW_HEIGHT}px; cursor: pointer;"
+             :style="{{ paddingLeft: (props.item.depth * {INDENT} + 4) + 'px',
+                        backgroundColor: props.item.selected ? 'rgba(33, 150, 243, 0.2)' : '' }}"
+             @click="{emit}('select', props.item.id)">
+            <q-icon v-if="props.item.has_children" name="arrow_right" size="18px" class="text-grey-7"
+                    :style="{{ transform: props.item.expanded ? 'rotate(90deg)' : 'none' }}"
+                    style="flex-shrink: 0; transition: transform 0.15s;"
+                    @click.stop="{emit}('toggle', props.item.id)" />
+            <span v-else style="width: 18px; flex-shrink: 0;"></span>
+        """
+        + HEADER_TEMPLATE.replace("props.node.", "props.item.")
+        + "</div>"
+    )
+
+
+class VirtualTreeView(TreeViewComponent):
+    """Tree view that renders only the rows in the viewport.
+
+    The forest is flattened into one row per visible node (pre-order,
+    descending into ``expanded_nodes`` only) and handed to Quasar's
+    q-virtual-scroll, which keeps a screenful of rows in the DOM however
+    long the list gets. Expanding, collapsing and edits splice rows in
+    place, on the server and on the client, instead of resending the list.
+    """
+
+    def __init__(self, state: "AppState"):
+        super().__init__(state)
+        self.scroll: ui.element | None = None
+        # Rows as stored in the element's props, and each visible node's index
+        self._rows: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._selected: Optional[str] = None
+
+    def build(self) -> None:
+        ui.add_head_html(ROWS_PATCH_JS)
+        self._build_search()
+        self._build_filters()
+        self.container = ui.column().classes("w-full flex-grow min-h-0 gap-0")
+        self._rebuild_tree()
+        ui.button("+ Add Root", on_click=self._on_add_root).classes("ml-4 mt-1 shrink-0").props(
+            "flat dense color=primary size=sm"
+        )
+        self.state.subscribe_selection_change(self._on_selection_change)
+
+    @UI_SECONDS.labels("virtual_tree", "rebuild").time()
+    def _rebuild_tree(self) -> None:
+        if self.container is None:
+            return
+
+        self.container.clear()
+        self.scroll = None
+        self._rows = []
+        self._positions = {}
+        self._selected = self.state.selected_node_id
+        self._apply_filter()
+        with self.container:
+            roots = self._children(self.state.data.roots)
+            if not roots:
+                message = (
+                    "No nodes match the filters." if self._visible is not None
+                    else "No goals yet. Click '+ Add Root Goal' to start."
+                )
+                ui.label(message).classes("text-gray-500 italic")
+                return
+
+            self.scroll = ui.element("q-virtual-scroll").props(
+                f"virtual-scroll-item-size={ROW_HEIGHT}"
+            ).classes("w-full h-full")
+            self.scroll.props["items"] = self._visible_rows(roots, 0)
+            # Keep the list NiceGUI actually stores (it wraps what it is given)
+            self._rows = self.scroll.props["items"]
+            self._reindex(0)
+            self.scroll.add_slot("default", row_template(self.scroll.id))
+            self.scroll.on("toggle", self._on_toggle)
+            self.scroll.on("select", lambda e: self.state.select_node(e.args))
+
+    def _children(self, nodes: List[Any]) -> List[Any]:
+        """The nodes the current filter lets through (all without one)."""
+        if self._visible is None:
+            return nodes
+        return [node for node in nodes if node.id in self._visible]
+
+    def _row(self, node: Any, depth: int) -> Dict[str, Any]:
+        # A node with hidden children opens by loading or restoring them, so it starts closed
+        hidden = self.state.has_hidden_children(node)
+        has_children = bool(self._children(node.children)) or (hidden and self._visible is None)
+        # A filtered tree opens the path to every match
+        expanded = not hidden and node.id in (
+            self._filter_opened if self._visible is not None else self.state.expanded_nodes
+        )
+        return {
+            "id": node.id,
+            "depth": depth,
+            "icon": NODE_ICONS.get(node.type, "circle"),
+            "created_time": node.created_at.strftime("%H:%M"),
+            **tree_node_fields(node, self.state),
+            "has_children": has_children,
+            "expanded": has_children and expanded,
+            "selected": node.id == self._selected,
+        }
+
+    def _visible_rows(self, nodes: List[Any], depth: int) -> List[Dict[str, Any]]:
+        """Rows of ``nodes`` and their expanded descendants, in display order."""
+        rows = []
+        stack = [(node, depth) for node in reversed(nodes)]
+        while stack:
+            node, node_depth = stack.pop()
+            row = self._row(node, node_depth)
+            rows.append(row)
+            if row["expanded"]:
+                stack.extend((child, node_depth + 1) for child in reversed(self._children(node.children)))
+        return rows
+
+    def _reindex(self, start: int) -> None:
+        for index in range(start, len(self._rows)):
+            self._positions[self._rows[index]["id"]] = index
+
+    def _subtree_end(self, index: int) -> int:
+        """Index just past the visible descendants of the row at ``index``."""
+        depth = self._rows[index]["depth"]
+        end = index + 1
+        while end < len(self._rows) and self._rows[end]["depth"] > depth:
+            end += 1
+        return end
+
+    def _suspend_updates(self) -> ContextManager[Any]:
+        """Mutate rows without NiceGUI resending the whole element."""
+        assert self.scroll is not None
+        suspend = getattr(self.scroll.props, "suspend_updates", None)
+        return suspend() if suspend is not None else nullcontext()
+
+    def _send_patch(self, ops: List[Dict[str, Any]]) -> None:
+        assert self.scroll is not None
+        self.scroll.client.run_javascript(
+            f"goalRowsPatch({self.scroll.id}, {json.dumps(ops, ensure_ascii=False)})"
+        )
+
+    def _splice(self, index: int, remove: int, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        for row in self._rows[index:index + remove]:
+            del self._positions[row["id"]]
+        with self._suspend_updates():
+            self._rows[index:index + remove] = rows
+        self._reindex(index)
+        return {"kind": "splice", "index": index, "remove": remove, "rows": rows}
+
+    def _update(self, node_id: str, fields: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Update a visible row's fields; no op for nodes that have no row."""
+        index = self._positions.get(node_id)
+        if index is None:
+            return []
+        with self._suspend_updates():
+            self._rows[index].update(fields)
+        return [{"kind": "update", "index": index, "fields": fields}]
+
+    def _expand_ops(self, node_id: str) -> List[Dict[str, Any]]:
+        """Open a visible row, inserting rows for its children (loaded or restored first if hidden)."""
+        self.state.expanded_nodes.add(node_id)
+        index = self._positions.get(node_id)
+        node = self.state.find_node_by_id(node_id)
+        if index is None or node is None or self._rows[index]["expanded"]:
+            return []
+        self.state.reveal_children(node_id)
+        children = self._children(node.children)
+        if not children:
+            return []
+        rows = self._visible_rows(children, self._rows[index]["depth"] + 1)
+        ops = self._update(node_id, {"expanded": True})
+        ops.append(self._splice(index + 1, 0, rows))
+        return ops
+
+    def _collapse_ops(self, node_id: str) -> List[Dict[str, Any]]:
+        self.state.expanded_nodes.discard(node_id)
+        index = self._positions.get(node_id)
+        if index is None or not self._rows[index]["expanded"]:
+            return []
+        ops = self._update(node_id, {"expanded": False})
+        ops.append(self._splice(index + 1, self._subtree_end(index) - index - 1, []))
+        return ops
+
+    def _on_toggle(self, e: Any) -> None:
+        node_id = e.args
+        index = self._positions.get(node_id)
+        if self.scroll is None or index is None:
+            return
+        if self._rows[index]["expanded"]:
+            ops = self._collapse_ops(node_id)
+        else:
+            ops = self._expand_ops(node_id)
+        if ops:
+            self._send_patch(ops)
+
+    def _on_selection_change(self) -> None:
+        selected = self.state.selected_node_id
+        if self.scroll is None or selected == self._selected:
+            return
+        ops = []
+        if self._selected is not None:
+            ops += self._update(self._selected, {"selected": False})
+        if selected is not None:
+            ops += self._update(selected, {"selected": True})
+        self._selected = selected
+        if ops:
+            self._send_patch(ops)
+
+    @UI_SECONDS.labels("virtual_tree", "patch").time()
+    def apply_change(self, change: Optional["TreeChange"]) -> None:
+        """Splice or update the rows a single change touches, rebuilding only when needed."""
+        if (
+            change is None or self.scroll is None or not self.state.data.roots
+            or (self._visible is not None and self._filter_affected(change))
+        ):
+            self._rebuild_tree()
+            return
+        if change.kind == "update" and change.field is not None and change.field not in HEADER_FIELDS:
+            return
+
+        if change.kind == "remove":
+            ancestor_ids = [change.parent_id] if change.parent_id else []
+            if change.parent_id:
+                ancestor_ids += [ancestor.id for ancestor in self.state.iter_ancestors(change.parent_id)]
+        else:
+            ancestor_ids = [ancestor.id for ancestor in self.state.iter_ancestors(change.node_id)]
+
+        ops = self._change_ops(change)
+        for ancestor_id in ancestor_ids:
+            ancestor = self.state.find_node_by_id(ancestor_id)
+            index = self._positions.get(ancestor_id)
+            if ancestor is None or index is None:
+                continue
+            rollup = tree_node_rollup(ancestor, self.state)
+            if rollup != self._rows[index]["rollup"]:
+                ops += self._update(ancestor_id, {"rollup": rollup})
+        if ops:
+            self._send_patch(ops)
+
+    def _change_ops(self, change: "TreeChange") -> List[Dict[str, Any]]:
+        node = self.state.find_node_by_id(change.node_id)
+        if change.kind == "update":
+            return self._update(change.node_id, tree_node_fields(node, self.state)) if node is not None else []
+
+        elif change.kind == "insert":
+            if node is None:
+                return []
+            if change.parent_id is None:
+                roots = self.state.data.roots
+                following = roots[change.index + 1] if change.index + 1 < len(roots) else None
+                index = self._positions[following.id] if following is not None else len(self._rows)
+                return [self._splice(index, 0, self._visible_rows([node], 0))]
+
+            parent = self.state.find_node_by_id(change.parent_id)
+            parent_index = self._positions.get(change.parent_id)
+            if parent is None or parent_index is None:
+                return []  # Inside a collapsed branch; nothing on screen changes
+            ops = self._update(change.parent_id, {"has_children": True})
+            if not self._rows[parent_index]["expanded"]:
+                # Open the parent, like the tree does, so the new node shows
+                return ops + self._expand_ops(change.parent_id)
+            following_index = change.index + 1
+            if following_index < len(parent.children):
+                index = self._positions[parent.children[following_index].id]
+            else:
+                index = self._subtree_end(parent_index)
+            depth = self._rows[parent_index]["depth"] + 1
+            return ops + [self._splice(index, 0, self._visible_rows([node], depth))]
+
+        elif change.kind == "remove":
+            ops = []
+            index = self._positions.get(change.node_id)
+            if index is not None:
+                ops.append(self._splice(index, self._subtree_end(index) - index, []))
+            parent = self.state.find_node_by_id(change.parent_id) if change.parent_id else None
+            if parent is not None and not parent.children:
+                ops += self._update(change.parent_id, {"has_children": False, "expanded": False})
+            return ops
+
+        return []
+
+    def reveal(self, node_id: str) -> None:
+        """Expand the path to a node, select it and scroll it into view."""
+        if self._visible is not None and node_id not in self._visible:
+            self._clear_filters()
+        ancestor_ids = [ancestor.id for ancestor in self.state.iter_ancestors(node_id)]
+        self.state.expanded_nodes.update(ancestor_ids)
+        if self.scroll is not None:
+            ops: List[Dict[str, Any]] = []
+            # Top down: opening the highest collapsed ancestor inserts the rest of the path
+            for ancestor_id in reversed(ancestor_ids):
+                ops += self._expand_ops(ancestor_id)
+            if ops:
+                self._send_patch(ops)
+        self.state.select_node(node_id)
+        if self.scroll is not None and node_id in self._positions:
+            self.scroll.run_method("scrollTo", self._positions[node_id], "center")
@@ -2,20 +2,119 @@
 """Goal Tree Application - Browser-based goal/task management using NiceGUI."""
 
 import sys
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Any, Dict, Optional
 
 # Add project root to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from nicegui import ui
+from fastapi import Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from nicegui import Client, app, background_tasks, run, ui
+from nicegui.events import KeyEventArguments
 
-from components import BoardsPanel, NodeFieldsPanel, TreeViewComponent
-from persistence import JsonStorage
-from state import AppState
+import metrics
+from components import BoardsPanel, NodeFieldsPanel, TreeViewComponent, VirtualTreeView, show_snapshots_dialog
+from persistence import ArchiveStore, BlobStore, JournalStorage, SnapshotStore
+from state import REF_FIELDS, AppState, ClientState, CommandError, apply_commands
 
+# A new snapshot is taken once the latest is this old
+SNAPSHOT_INTERVAL = timedelta(days=1)
 
-def create_app() -> None:
-    """Create and configure the Goal Tree application."""
+# Completed and cancelled subtrees untouched for this long move to the archive.
+# Off by default: archiving is not an undoable edit, so it is opt-in
+# (None keeps everything in the live forest)
+ARCHIVE_AFTER: Optional[timedelta] = None
+
+# Board blobs and archives nothing refers to any more are deleted this often
+GC_INTERVAL = timedelta(days=1)
+
+# Levels of the tree a new view starts with expanded (None expands everything)
+EXPAND_DEPTH = 2
+
+# Forests larger than this get the virtual-scrolling tree, which keeps only
+# the rows in view in the DOM however many nodes are expanded
+VIRTUAL_TREE_MIN_NODES = 2000
+
+snapshots = SnapshotStore("snapshots")
+
+
+def create_shared_state() -> AppState:
+    """Open storage and load the forest once; every connected client edits this AppState."""
+    # Board text is kept as content-addressed blobs under boards/, loaded on selection
+    storage = JournalStorage("data.json", debounce_ms=500, max_delay_ms=5000, blobs=BlobStore("boards"))
+    # Views start with the top EXPAND_DEPTH levels open; deeper branches load lazily on expand.
+    # Old finished subtrees live compressed under archive/ until expanded or searched.
+    state = AppState(storage, expand_depth=EXPAND_DEPTH, archive=ArchiveStore("archive"))
+    # Write out anything still pending before the process exits
+    app.on_shutdown(storage.flush)
+    # Drop blobs of board text and archives that neither the forest, undo nor a snapshot uses
+    app.timer(GC_INTERVAL.total_seconds(), lambda: collect_garbage(state))
+    # Index the forest for search now, so the first search does not read every board
+    background_tasks.create(build_search_index(state))
+    # Daily history; checked hourly, and only changed subtrees are written
+    app.timer(3600, lambda: snapshot_if_due(state))
+    archive_after = ARCHIVE_AFTER
+    if archive_after is not None:
+        # Hourly too; after the first pass there is little left to move
+        app.timer(3600, lambda: state.archive_finished(datetime.now() - archive_after))
+    # Sizes for /metrics, read when scraped
+    metrics.NODES.set_function(lambda: state.node_count)
+    metrics.DATA_BYTES.set_function(lambda: storage.disk_bytes)
+    metrics.PENDING_SAVES.set_function(lambda: storage.queue_depth + storage.has_pending)
+    metrics.CLIENTS.set_function(lambda: sum(client.has_socket_connection for client in Client.instances.values()))
+    return state
+
+
+async def snapshot_if_due(state: AppState) -> None:
+    """Take a snapshot if the latest one is older than SNAPSHOT_INTERVAL."""
+    existing = snapshots.list_snapshots()
+    if existing and datetime.now() - datetime.fromisoformat(existing[-1]["created_at"]) < SNAPSHOT_INTERVAL:
+        return
+    roots, objects = state.prepare_snapshot(snapshots)
+    # A first snapshot writes a file per node; keep that off the event loop
+    await run.io_bound(snapshots.write_snapshot, roots, objects, "Daily")
+
+
+async def build_search_index(state: AppState) -> None:
+    """Build the search index, reading the forest and its boards off the event loop."""
+    build = state.begin_search_index()
+    if build is not None:
+        install = await run.io_bound(build)
+        install()
+
+
+async def collect_garbage(state: AppState) -> None:
+    """Delete board blobs and archives nothing refers to, reading snapshot history once."""
+    # Reading every snapshot object is slow; keep it off the event loop
+    snapshot_refs = await run.io_bound(snapshots.referenced_values, REF_FIELDS)
+    state.collect_garbage(snapshot_refs)
+
+
+def undo_or_redo(state: ClientState, redo: bool = False) -> None:
+    """Undo or redo this client's last change, telling the user when there is none."""
+    done = state.redo() if redo else state.undo()
+    if not done:
+        ui.notify("Nothing to redo" if redo else "Nothing to undo")
+
+
+def on_key(state: ClientState, e: KeyEventArguments) -> None:
+    """Ctrl+Z undoes, Ctrl+Shift+Z or Ctrl+Y redoes (Cmd on macOS)."""
+    if not e.action.keydown or not (e.modifiers.ctrl or e.modifiers.meta):
+        return
+    key = e.key.name.lower()
+    if key == "z":
+        undo_or_redo(state, redo=e.modifiers.shift)
+    elif key == "y":
+        undo_or_redo(state, redo=True)
+
+
+def create_app(shared: AppState, view: Optional[Dict[str, Any]] = None) -> None:
+    """Create the Goal Tree UI for the connecting client.
+
+    ``view`` holds this client's selection and expansion across reloads.
+    """
     # Remove all margin/padding and compact tree nodes
     ui.add_head_html('''<style>
         body, .q-page-container, .q-page, .nicegui-content {
@@ -48,9 +147,12 @@ def create_app() -> None:
         }
     </style>''')
 
-    # Initialize storage and state
-    storage = JsonStorage("data.json", debounce_ms=500)
-    state = AppState(storage)
+    # Selection and expansion are per client; edits go to the shared forest
+    # and come back to every client as small patches
+    client = ui.context.client
+    state = ClientState(shared, client.id, view)
+    # Older NiceGUI has no on_delete; there a disconnect ends the client
+    getattr(client, "on_delete", client.on_disconnect)(state.close)
 
     # VS Code style layout: Sidebar | Main Area (Editors / Bottom Panel)
     # Outer splitter: Goal Tree (left) | Main Area (right)
@@ -58,8 +160,21 @@ def create_app() -> None:
         # Left sidebar - Tree View
         with outer_splitter.before:
             with ui.column().classes("w-full h-full bg-gray-50 overflow-hidden gap-0"):
-                ui.label("Goal Tree").classes("text-sm font-bold px-2 py-1 text-blue-700 shrink-0")
-                tree_view = TreeViewComponent(state)
+                with ui.row().classes("w-full items-center gap-0 px-2 py-1 shrink-0"):
+                    ui.label("Goal Tree").classes("text-sm font-bold text-blue-700 flex-1")
+                    ui.button(icon="history", on_click=lambda: show_snapshots_dialog(state, snapshots)).props(
+                        "flat dense round size=sm"
+                    ).tooltip("Snapshots")
+                    ui.button(icon="undo", on_click=lambda: undo_or_redo(state)).props(
+                        "flat dense round size=sm"
+                    ).tooltip("Undo (Ctrl+Z)")
+                    ui.button(icon="redo", on_click=lambda: undo_or_redo(state, redo=True)).props(
+                        "flat dense round size=sm"
+                    ).tooltip("Redo (Ctrl+Shift+Z)")
+                if shared.node_count > VIRTUAL_TREE_MIN_NODES:
+                    tree_view = VirtualTreeView(state)
+                else:
+                    tree_view = TreeViewComponent(state, lazy=True)
                 tree_view.build()
 
         # Right main area - vertical splitter (Boards on top, Node Details at bottom)
@@ -75,15 +190,69 @@ def create_app() -> None:
                 with main_splitter.after:
                     with ui.column().classes("w-full h-full bg-gray-50 overflow-hidden node-details-panel"):
                         ui.label("Node Details").classes("text-xs font-bold px-2 py-1 text-gray-600 bg-gray-100")
-                        node_fields = NodeFieldsPanel(state, on_tree_refresh=tree_view.refresh)
+                        node_fields = NodeFieldsPanel(state)
                         node_fields.build()
 
-    # Subscribe tree rebuild to tree structure changes only
-    state.subscribe_tree_change(tree_view.refresh)
+    # Undo/redo shortcuts; ignored while typing, where the browser undoes text
+    ui.keyboard(on_key=lambda e: on_key(state, e))
+
+    # Patch the tree in place on structure and header changes
+    state.subscribe_tree_patch(tree_view.apply_change)
+
+
+# One forest per process, shared by all clients. With reload=True this module
+# is also imported by the file-watching supervisor, which never starts the app,
+# so the forest is loaded on startup rather than at import.
+shared_state: Optional[AppState] = None
+
+
+def load_shared_state() -> None:
+    global shared_state
+    shared_state = create_shared_state()
+
+
+app.on_startup(load_shared_state)
+
+
+def get_shared_state() -> AppState:
+    """The forest loaded on startup."""
+    if shared_state is None:
+        raise RuntimeError("the app has not started")
+    return shared_state
+
+
+@ui.page("/")
+async def index() -> None:
+    # Tab storage needs the connection; it survives reloads of this tab only,
+    # so every tab keeps its own selection and expansion
+    await ui.context.client.connected()
+    create_app(get_shared_state(), app.storage.tab.setdefault("view", {}))
+
+
+@app.post("/api/batch")
+async def batch_commands(request: Request) -> JSONResponse:
+    """Apply a JSON list of commands (or {"commands": [...]}) as one all-or-nothing batch.
+
+    Runs on the event loop like UI events, so it never races an edit.
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "body is not JSON"}, status_code=400)
+    commands = body.get("commands") if isinstance(body, dict) else body
+    if not isinstance(commands, list):
+        return JSONResponse({"error": "expected a list of commands"}, status_code=400)
+    try:
+        return JSONResponse(apply_commands(get_shared_state(), commands))
+    except CommandError as exc:
+        return JSONResponse({"error": str(exc), "index": exc.index}, status_code=400)
+
 
+@app.get("/metrics")
+def prometheus_metrics() -> PlainTextResponse:
+    """Timings and sizes in the Prometheus text format."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
-# Create the application
-create_app()
 
 # Run the application
 if __name__ in {"__main__", "__mp_main__"}:
@@ -0,0 +1,26 @@
+from .registry import DEFAULT_BUCKETS, REGISTRY, Counter, Gauge, Histogram, Registry
+
+# Hot-path timings, recorded where the work happens
+STATE_SECONDS = Histogram(
+    "goaltree_state_operation_seconds", "AppState mutations and lookups", ("operation",)
+)
+STORAGE_SECONDS = Histogram(
+    "goaltree_storage_seconds", "Storage load, serialize (on the event loop) and write (writer thread)",
+    ("storage", "phase"),
+)
+UI_SECONDS = Histogram(
+    "goaltree_ui_render_seconds", "Full rebuilds, rebinds and in-place patches of UI components", ("component", "kind")
+)
+NODE_LOOKUPS = Counter("goaltree_node_lookups", "Nodes looked up by id")
+
+# Sizes, read from the running app at scrape time (see main.py)
+NODES = Gauge("goaltree_nodes", "Nodes in the forest")
+DATA_BYTES = Gauge("goaltree_data_bytes", "Size of the data files on disk")
+PENDING_SAVES = Gauge("goaltree_pending_saves", "Saves waiting for the debounce or the writer thread")
+STORAGE_WRITES = Counter("goaltree_storage_writes", "Batches written by the storage writer thread")
+STORAGE_ERRORS = Counter("goaltree_storage_write_errors", "Failed storage writes")
+CLIENTS = Gauge("goaltree_connected_clients", "Browser clients with an open connection")
+
+__all__ = ['DEFAULT_BUCKETS', 'REGISTRY', 'Counter', 'Gauge', 'Histogram', 'Registry',
+           'STATE_SECONDS', 'STORAGE_SECONDS', 'UI_SECONDS', 'NODE_LOOKUPS',
+           'NODES', 'DATA_BYTES', 'PENDING_SAVES', 'STORAGE_WRITES', 'STORAGE_ERRORS', 'CLIENTS']
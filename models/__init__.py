@@ -1,4 +1,6 @@
 from .enums import Status, ChildrenType
-from .nodes import BaseNode, DAPPChildNode, AppData
+from .nodes import CURRENT_VERSION, BaseNode, DAPPChildNode, AppData, upgrade_app_data
+from .compact import CompactForest, CompactNode
 
-__all__ = ['Status', 'ChildrenType', 'BaseNode', 'DAPPChildNode', 'AppData']
+__all__ = ['Status', 'ChildrenType', 'BaseNode', 'DAPPChildNode', 'AppData', 'CURRENT_VERSION', 'upgrade_app_data',
+           'CompactForest', 'CompactNode']
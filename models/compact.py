@@ -0,0 +1,383 @@
+from __future__ import annotations
+
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from pydantic_core import to_json
+
+from .enums import ChildrenType, Status
+from .nodes import CURRENT_VERSION, AppData, BaseNode, DAPPChildNode
+
+TYPE_NAMES: Tuple[str, ...] = ("Base", "DAPP_Child")
+STATUSES: Tuple[Status, ...] = tuple(Status)
+CHILDREN_TYPES: Tuple[ChildrenType, ...] = tuple(ChildrenType)
+TEXT_FIELDS: Tuple[str, ...] = (
+    "name", "description", "completion_condition", "progress_board", "content_board",
+    "progress_board_ref", "content_board_ref", "archive_ref",
+)
+DAPP_FIELDS: Tuple[str, ...] = ("atp", "signposts", "triggers")
+# Short values repeated across nodes, worth one shared copy; free text such as boards is stored as is
+INTERNED_FIELDS = frozenset({"name", "progress_board_ref", "content_board_ref", "archive_ref"})
+
+ROOT = -1  # parent slot of root nodes
+DETACHED = -2  # parent slot of nodes not (yet) linked into the forest
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+NAIVE = -(2 ** 31)  # offset slot of timestamps without a time zone
+
+
+def _intern_list(items: List[str]) -> Tuple[str, ...]:
+    return tuple(sys.intern(item) for item in items)
+
+
+def _text_value(field: str, value: str) -> str:
+    return sys.intern(value) if field in INTERNED_FIELDS else value
+
+
+def _encode_time(value: datetime) -> Tuple[int, int]:
+    """Microseconds since the epoch and the UTC offset in seconds, or NAIVE for naive datetimes.
+
+    Naive values are counted as if they were UTC, so local time never
+    enters and ``_decode_time`` gives back exactly the same datetime.
+    """
+    offset = value.utcoffset()
+    if offset is None:
+        return (value.replace(tzinfo=timezone.utc) - EPOCH) // MICROSECOND, NAIVE
+    return (value - EPOCH) // MICROSECOND, int(offset.total_seconds())
+
+
+def _decode_time(micros: int, offset: int) -> datetime:
+    if offset == NAIVE:
+        return (EPOCH + micros * MICROSECOND).replace(tzinfo=None)
+    return (EPOCH + micros * MICROSECOND).astimezone(timezone(timedelta(seconds=offset)))
+
+
+class CompactForest:
+    """Columnar in-memory store for very large forests.
+
+    Each node is a slot index into parallel arrays: parent slot, type,
+    status and children-type codes, and timestamps as epoch microseconds
+    with their UTC offset. Text is kept in per-field lists, short repeated
+    values interned; DAPP lists and child order only
+    exist for nodes that have them. ``CompactNode`` views give nodes the
+    same attributes as the pydantic models, which are only built at the
+    persistence boundary (``model_dump``/``to_app_data``).
+    """
+
+    def __init__(self, version: str = CURRENT_VERSION, last_modified: Optional[datetime] = None):
+        self.version = version
+        self.last_modified = last_modified
+        self._ids: List[Optional[str]] = []
+        self._slots: Dict[str, int] = {}
+        self._parent = array("i")
+        self._type = array("b")
+        self._status = array("b")
+        self._children_type = array("b")
+        self._created_at = array("q")
+        self._created_offset = array("i")
+        self._updated_at = array("q")
+        self._updated_offset = array("i")
+        self._text: Dict[str, List[str]] = {field: [] for field in TEXT_FIELDS}
+        self._dapp: Dict[int, List[Tuple[str, ...]]] = {}
+        self._children: Dict[int, List[int]] = {}
+        self._root_slots: List[int] = []
+        self._free: List[int] = []
+
+    # -- construction and persistence boundary -------------------------
+
+    @classmethod
+    def from_app_data(cls, data: AppData) -> "CompactForest":
+        forest = cls(data.version, data.last_modified)
+        for root in data.roots:
+            forest.roots.append(forest.adopt(root))
+        return forest
+
+    def adopt(self, model: Union[BaseNode, DAPPChildNode]) -> "CompactNode":
+        """Copy a pydantic node and its subtree into the store, detached."""
+        top = self._store(model, DETACHED)
+        stack = [(model, top)]
+        while stack:
+            current, slot = stack.pop()
+            if current.children:
+                child_slots = [self._store(child, slot) for child in current.children]
+                self._children[slot] = child_slots
+                stack.extend(zip(current.children, child_slots))
+        return CompactNode(self, top)
+
+    def _store(self, model: Union[BaseNode, DAPPChildNode], parent: int) -> int:
+        values = (
+            parent,
+            TYPE_NAMES.index(model.type),
+            STATUSES.index(Status(model.status)),
+            CHILDREN_TYPES.index(ChildrenType(model.children_type)),
+            *_encode_time(model.created_at),
+            *_encode_time(model.updated_at),
+        )
+        columns = (
+            self._parent, self._type, self._status, self._children_type,
+            self._created_at, self._created_offset, self._updated_at, self._updated_offset,
+        )
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = model.id
+            for column, value in zip(columns, values):
+                column[slot] = value
+            for field in TEXT_FIELDS:
+                self._text[field][slot] = _text_value(field, getattr(model, field))
+        else:
+            slot = len(self._ids)
+            self._ids.append(model.id)
+            for column, value in zip(columns, values):
+                column.append(value)
+            for field in TEXT_FIELDS:
+                self._text[field].append(_text_value(field, getattr(model, field)))
+        if isinstance(model, DAPPChildNode):
+            self._dapp[slot] = [_intern_list(getattr(model, field)) for field in DAPP_FIELDS]
+        self._slots[model.id] = slot
+        return slot
+
+    def _free_subtree(self, top: int) -> None:
+        stack = [top]
+        while stack:
+            slot = stack.pop()
+            stack.extend(self._children.pop(slot, ()))
+            self._dapp.pop(slot, None)
+            self._slots.pop(self._ids[slot], None)  # type: ignore[arg-type]
+            self._ids[slot] = None
+            self._parent[slot] = DETACHED
+            for field in TEXT_FIELDS:
+                self._text[field][slot] = ""
+            self._free.append(slot)
+
+    def _node_dict(self, slot: int) -> Dict[str, Any]:
+        """JSON-mode dict of a single node, without children."""
+        node: Dict[str, Any] = {
+            "id": self._ids[slot],
+            "type": TYPE_NAMES[self._type[slot]],
+            "status": STATUSES[self._status[slot]].value,
+            "children_type": CHILDREN_TYPES[self._children_type[slot]].value,
+            "created_at": _decode_time(self._created_at[slot], self._created_offset[slot]).isoformat(),
+            "updated_at": _decode_time(self._updated_at[slot], self._updated_offset[slot]).isoformat(),
+        }
+        for field in TEXT_FIELDS:
+            node[field] = self._text[field][slot]
+        if slot in self._dapp:
+            for field, items in zip(DAPP_FIELDS, self._dapp[slot]):
+                node[field] = list(items)
+        return node
+
+    def _subtree_dict(self, top: int) -> Dict[str, Any]:
+        result = self._node_dict(top)
+        stack = [(top, result)]
+        while stack:
+            slot, node = stack.pop()
+            node["children"] = [self._node_dict(child) for child in self._children.get(slot, ())]
+            stack.extend(zip(self._children.get(slot, ()), node["children"]))
+        return result
+
+    def model_dump(self, mode: str = "json", **_: Any) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "last_modified": self.last_modified.isoformat() if self.last_modified else None,
+            "roots": [self._subtree_dict(slot) for slot in self._root_slots],
+        }
+
+    def model_dump_json(self, indent: Optional[int] = None, **_: Any) -> str:
+        return to_json(self.model_dump(), indent=indent).decode("utf-8")
+
+    def to_app_data(self) -> AppData:
+        return AppData.model_validate(self.model_dump())
+
+    # -- node access ---------------------------------------------------
+
+    @property
+    def roots(self) -> "ChildList":
+        return ChildList(self, ROOT)
+
+    def get(self, node_id: str) -> Optional["CompactNode"]:
+        slot = self._slots.get(node_id)
+        return CompactNode(self, slot) if slot is not None else None
+
+    def parent_id(self, node_id: str) -> Optional[str]:
+        """ID of a node's parent, or None for roots and unknown IDs."""
+        slot = self._slots.get(node_id)
+        if slot is None or self._parent[slot] < 0:
+            return None
+        return self._ids[self._parent[slot]]
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+class ChildList:
+    """List-like view of a node's children (or the forest's roots)."""
+
+    __slots__ = ("_forest", "_parent")
+
+    def __init__(self, forest: CompactForest, parent: int):
+        self._forest = forest
+        self._parent = parent
+
+    def _slot_list(self) -> List[int]:
+        if self._parent == ROOT:
+            return self._forest._root_slots
+        return self._forest._children.setdefault(self._parent, [])
+
+    def __len__(self) -> int:
+        if self._parent == ROOT:
+            return len(self._forest._root_slots)
+        return len(self._forest._children.get(self._parent, ()))
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __iter__(self) -> Iterator["CompactNode"]:
+        slots = self._forest._root_slots if self._parent == ROOT else self._forest._children.get(self._parent, ())
+        return (CompactNode(self._forest, slot) for slot in list(slots))
+
+    def __getitem__(self, index: int) -> "CompactNode":
+        return CompactNode(self._forest, self._slot_list()[index])
+
+    def insert(self, index: int, node: "CompactNode") -> None:
+        """Link a detached node (from ``CompactForest.adopt``) at ``index``."""
+        if node._forest is not self._forest or self._forest._parent[node._slot] != DETACHED:
+            raise ValueError("Only detached nodes of the same forest can be linked")
+        self._forest._parent[node._slot] = self._parent
+        self._slot_list().insert(index, node._slot)
+
+    def append(self, node: "CompactNode") -> None:
+        self.insert(len(self), node)
+
+    def __delitem__(self, index: int) -> None:
+        """Unlink the child at ``index`` and free its whole subtree."""
+        slots = self._slot_list()
+        slot = slots.pop(index)
+        if not slots and self._parent != ROOT:
+            del self._forest._children[self._parent]
+        self._forest._free_subtree(slot)
+
+
+def _text_property(field: str) -> property:
+    def getter(self: "CompactNode") -> str:
+        return self._forest._text[field][self._slot]
+
+    def setter(self: "CompactNode", value: str) -> None:
+        self._forest._text[field][self._slot] = _text_value(field, value)
+
+    return property(getter, setter)
+
+
+def _dapp_property(position: int) -> property:
+    def getter(self: "CompactNode") -> List[str]:
+        items = self._forest._dapp.get(self._slot)
+        if items is None:
+            raise AttributeError(DAPP_FIELDS[position])
+        # A copy: edits must go through assignment to reach the store
+        return list(items[position])
+
+    def setter(self: "CompactNode", value: List[str]) -> None:
+        items = self._forest._dapp.get(self._slot)
+        if items is None:
+            raise AttributeError(DAPP_FIELDS[position])
+        items[position] = _intern_list(value)
+
+    return property(getter, setter)
+
+
+def _timestamp_property(column: str) -> property:
+    offset_column = column.replace("_at", "_offset")
+
+    def getter(self: "CompactNode") -> datetime:
+        forest = self._forest
+        return _decode_time(getattr(forest, column)[self._slot], getattr(forest, offset_column)[self._slot])
+
+    def setter(self: "CompactNode", value: datetime) -> None:
+        micros, offset = _encode_time(value)
+        getattr(self._forest, column)[self._slot] = micros
+        getattr(self._forest, offset_column)[self._slot] = offset
+
+    return property(getter, setter)
+
+
+class CompactNode:
+    """Attribute view of one node in a CompactForest.
+
+    Reads and assignments go straight to the store, so a view stays valid
+    until its node is deleted. Views compare equal by forest and slot.
+    """
+
+    __slots__ = ("_forest", "_slot")
+
+    def __init__(self, forest: CompactForest, slot: int):
+        self._forest = forest
+        self._slot = slot
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CompactNode) and other._forest is self._forest and other._slot == self._slot
+
+    def __hash__(self) -> int:
+        return hash((id(self._forest), self._slot))
+
+    def __repr__(self) -> str:
+        return f"CompactNode(id={self.id!r}, name={self.name!r})"
+
+    @property
+    def id(self) -> str:
+        return self._forest._ids[self._slot]  # type: ignore[return-value]
+
+    @property
+    def type(self) -> str:
+        return TYPE_NAMES[self._forest._type[self._slot]]
+
+    @property
+    def status(self) -> Status:
+        return STATUSES[self._forest._status[self._slot]]
+
+    @status.setter
+    def status(self, value: Union[Status, str]) -> None:
+        self._forest._status[self._slot] = STATUSES.index(Status(value))
+
+    @property
+    def children_type(self) -> ChildrenType:
+        return CHILDREN_TYPES[self._forest._children_type[self._slot]]
+
+    @children_type.setter
+    def children_type(self, value: Union[ChildrenType, str]) -> None:
+        self._forest._children_type[self._slot] = CHILDREN_TYPES.index(ChildrenType(value))
+
+    @property
+    def children(self) -> ChildList:
+        return ChildList(self._forest, self._slot)
+
+    name = _text_property("name")
+    description = _text_property("description")
+    completion_condition = _text_property("completion_condition")
+    progress_board = _text_property("progress_board")
+    content_board = _text_property("content_board")
+    progress_board_ref = _text_property("progress_board_ref")
+    content_board_ref = _text_property("content_board_ref")
+    archive_ref = _text_property("archive_ref")
+    created_at = _timestamp_property("_created_at")
+    updated_at = _timestamp_property("_updated_at")
+    atp = _dapp_property(0)
+    signposts = _dapp_property(1)
+    triggers = _dapp_property(2)
+
+    def model_dump(self, mode: str = "json", exclude: Optional[Any] = None, **_: Any) -> Dict[str, Any]:
+        if exclude and "children" in exclude:
+            node = self._forest._node_dict(self._slot)
+            for field in exclude:
+                node.pop(field, None)
+            return node
+        return self._forest._subtree_dict(self._slot)
+
+    def model_dump_json(self, indent: Optional[int] = None, **_: Any) -> str:
+        return to_json(self.model_dump(), indent=indent).decode("utf-8")
+
+    def materialize(self) -> Union[BaseNode, DAPPChildNode]:
+        """Build the pydantic model for this node and its subtree."""
+        model_cls = DAPPChildNode if self.type == "DAPP_Child" else BaseNode
+        return model_cls.model_validate(self.model_dump())
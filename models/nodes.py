@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Annotated, List, Literal, Optional, Union
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
 from uuid import uuid4
 
-from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic import BaseModel, Field
 
 
 from .enums import ChildrenType, Status
 
+# Documents at this version validate straight from JSON bytes; older ones
+# go through upgrade_app_data once and are rewritten at this version.
+CURRENT_VERSION = "1.1"
+
 
 class BaseNode(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid4()))
@@ -23,21 +27,14 @@ class BaseNode(BaseModel):
     )
     progress_board: str = ""
     content_board: str = ""
+    # Blob refs of board text kept out of the document ("" = text is inline)
+    progress_board_ref: str = ""
+    content_board_ref: str = ""
+    # Archive ref of children kept out of the forest ("" = children are live)
+    archive_ref: str = ""
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
 
-    @model_validator(mode="before")
-    @classmethod
-    def set_default_timestamps(cls, values: dict) -> dict:
-        """Set default timestamps for backward compatibility with old JSON data."""
-        if isinstance(values, dict):
-            now = datetime.now()
-            if "created_at" not in values or values["created_at"] is None:
-                values["created_at"] = now
-            if "updated_at" not in values or values["updated_at"] is None:
-                values["updated_at"] = now
-        return values
-
 
 class DAPPChildNode(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid4()))
@@ -52,40 +49,45 @@ class DAPPChildNode(BaseModel):
     )
     progress_board: str = ""
     content_board: str = ""
+    # Blob refs of board text kept out of the document ("" = text is inline)
+    progress_board_ref: str = ""
+    content_board_ref: str = ""
+    # Archive ref of children kept out of the forest ("" = children are live)
+    archive_ref: str = ""
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
 
     # DAPP-specific fields
-    atp: List[str] = Field(default_factory=lambda: [""])
+    # ATP must have at least one entry
+    atp: List[str] = Field(default_factory=lambda: [""], min_length=1)
     signposts: List[str] = Field(default_factory=list)
     triggers: List[str] = Field(default_factory=list)
 
-    @model_validator(mode="before")
-    @classmethod
-    def set_default_timestamps(cls, values: dict) -> dict:
-        """Set default timestamps for backward compatibility with old JSON data."""
-        if isinstance(values, dict):
-            now = datetime.now()
-            if "created_at" not in values or values["created_at"] is None:
-                values["created_at"] = now
-            if "updated_at" not in values or values["updated_at"] is None:
-                values["updated_at"] = now
-        return values
-
-    @field_validator("atp")
-    @classmethod
-    def atp_must_have_at_least_one(cls, v: List[str]) -> List[str]:
-        if len(v) < 1:
-            raise ValueError("ATP must have at least one entry")
-        return v
-
 
 class AppData(BaseModel):
-    version: str = "1.0"
+    version: str = CURRENT_VERSION
     last_modified: Optional[datetime] = None
     roots: List[BaseNode] = Field(default_factory=list)
 
 
+def upgrade_app_data(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Bring an older AppData document (plain dicts) up to CURRENT_VERSION.
+
+    Version 1.0 files may lack node timestamps or store them as null.
+    """
+    now = datetime.now().isoformat()
+    stack = list(values.get("roots") or [])
+    while stack:
+        node = stack.pop()
+        if node.get("created_at") is None:
+            node["created_at"] = now
+        if node.get("updated_at") is None:
+            node["updated_at"] = now
+        stack.extend(node.get("children") or [])
+    values["version"] = CURRENT_VERSION
+    return values
+
+
 # Rebuild models to resolve forward references
 BaseNode.model_rebuild()
 DAPPChildNode.model_rebuild()
@@ -1,3 +1,9 @@
-from .storage import JsonStorage
+from .storage import BaseStorage, JsonStorage
+from .archive import ArchiveStore
+from .blobs import BlobStore
+from .journal import JournalStorage
+from .sharded_storage import ShardedStorage
+from .snapshots import SnapshotStore
+from .sqlite_storage import SqliteStorage
 
-__all__ = ['JsonStorage']
+__all__ = ['ArchiveStore', 'BaseStorage', 'BlobStore', 'JsonStorage', 'JournalStorage', 'ShardedStorage', 'SnapshotStore', 'SqliteStorage']
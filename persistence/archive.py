@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .storage import atomic_write_bytes, atomic_write_text
+
+# gzip level: 9 takes several times as long as 6 for a few percent smaller files
+COMPRESS_LEVEL = 6
+
+
+def subtree_refs(nodes: Iterable[Dict[str, Any]]) -> Set[str]:
+    """Archive refs of the stubs among JSON-mode node dicts and their descendants."""
+    refs: Set[str] = set()
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if node.get("archive_ref"):
+            refs.add(node["archive_ref"])
+        stack.extend(node.get("children", []))
+    return refs
+
+
+class ArchiveStore:
+    """Finished subtrees kept out of the live forest, one compressed file each.
+
+    An archive holds the children of one node, which stays in the forest
+    as a stub, as gzip-compressed JSON-mode node dicts. Files are named
+    after the SHA-256 of their contents, so a written archive never
+    changes and older snapshots of a stub can still find its children.
+    A small manifest (``index.json``) keeps each archive's status counts
+    and the archives nested in it, so stubs show their counts and
+    garbage collection runs without opening any archive.
+    """
+
+    def __init__(self, directory: str = "archive"):
+        self.directory = Path(directory)
+        self.manifest_path = self.directory / "index.json"
+        # ref -> {"counts": {status: n}, "refs": [nested refs], "archived_at": iso}
+        self._manifest: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({str(self.directory)!r})"
+
+    def _path(self, ref: str) -> Path:
+        return self.directory / ref[:2] / f"{ref}.json.gz"
+
+    @property
+    def manifest(self) -> Dict[str, Dict[str, Any]]:
+        if self._manifest is None:
+            if self.manifest_path.exists():
+                self._manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            else:
+                self._manifest = {}
+        return self._manifest
+
+    def _write_manifest(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(self.manifest_path, json.dumps(self.manifest, ensure_ascii=False))
+
+    def __contains__(self, ref: object) -> bool:
+        return ref in self.manifest
+
+    def put(self, nodes: List[Dict[str, Any]], counts: Dict[str, int]) -> str:
+        """Write a list of node dicts (with their subtrees) and return its ref.
+
+        ``counts`` maps statuses to how many nodes the archive holds with
+        each. The file is durable before this returns, so records that
+        refer to it may be written after.
+        """
+        data = json.dumps(nodes, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        ref = hashlib.sha256(data).hexdigest()
+        if ref not in self.manifest:
+            path = self._path(ref)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # mtime=0: the same subtree always compresses to the same bytes
+            atomic_write_bytes(path, gzip.compress(data, COMPRESS_LEVEL, mtime=0))
+            self.manifest[ref] = {
+                "counts": counts,
+                "refs": sorted(subtree_refs(nodes)),
+                "archived_at": datetime.now().isoformat(),
+            }
+            self._write_manifest()
+        return ref
+
+    def get(self, ref: str) -> List[Dict[str, Any]]:
+        """The node dicts an archive holds."""
+        return json.loads(gzip.decompress(self._path(ref).read_bytes()))
+
+    def counts(self, ref: str) -> Dict[str, int]:
+        """Nodes per status in an archive, nested archives included; empty for unknown refs."""
+        entry = self.manifest.get(ref)
+        return entry["counts"] if entry is not None else {}
+
+    def collect_garbage(self, live_refs: Iterable[str]) -> int:
+        """Delete archives neither in ``live_refs`` nor nested in one that is. Returns how many were removed."""
+        live: Set[str] = set()
+        stack = list(live_refs)
+        while stack:
+            ref = stack.pop()
+            if ref in live or ref not in self.manifest:
+                continue
+            live.add(ref)
+            stack.extend(self.manifest[ref]["refs"])
+        dead = [ref for ref in self.manifest if ref not in live]
+        if not dead:
+            return 0
+        # Manifest first: a crash in between leaves stray files, not missing ones
+        for ref in dead:
+            del self.manifest[ref]
+        self._write_manifest()
+        for ref in dead:
+            self._path(ref).unlink(missing_ok=True)
+        return len(dead)
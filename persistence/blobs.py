@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from .storage import atomic_write_text
+
+
+def blob_ref(text: str) -> str:
+    """Content address of a text: the hex SHA-256 of its UTF-8 bytes."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class BlobStore:
+    """Content-addressed text blobs in a local directory.
+
+    Each blob is a file named after the SHA-256 of its text, so identical
+    texts are stored once and a written blob never changes. ``put`` only
+    stages a blob in memory; the storage writer thread writes staged blobs
+    (``take_pending``/``write``) before any record that references them.
+    Reads go through a small LRU cache.
+    """
+
+    def __init__(self, directory: str = "boards", cache_size: int = 32):
+        self.directory = Path(directory)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        # Staged blobs not yet handed to the writer: ref -> [text, reference count]
+        self._pending: Dict[str, List] = {}
+        # Handed to the writer but maybe not on disk yet; guarded by _lock
+        self._writing: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({str(self.directory)!r})"
+
+    def _path(self, ref: str) -> Path:
+        return self.directory / ref[:2] / ref
+
+    def put(self, text: str, replaces: str = "") -> str:
+        """Stage a text and return its ref.
+
+        ``replaces`` is the ref this text supersedes. If that blob was only
+        staged and nothing else staged it, it is dropped unwritten, so a
+        burst of edits writes only the final text.
+        """
+        ref = blob_ref(text)
+        staged = self._pending.get(replaces)
+        if staged is not None and replaces != ref:
+            staged[1] -= 1
+            if staged[1] <= 0:
+                del self._pending[replaces]
+        if ref in self._pending:
+            self._pending[ref][1] += 1
+        else:
+            self._pending[ref] = [text, 1]
+        return ref
+
+    def get(self, ref: str, cache: bool = True) -> str:
+        """Text of a blob. ``cache=False`` suits bulk reads that would flush the cache."""
+        if ref in self._pending:
+            return self._pending[ref][0]
+        text = self._cache.get(ref)
+        if text is not None:
+            self._cache.move_to_end(ref)
+            return text
+        with self._lock:
+            text = self._writing.get(ref)
+        if text is None:
+            text = self._path(ref).read_text(encoding="utf-8")
+        if cache:
+            self._cache[ref] = text
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    def take_pending(self) -> Dict[str, str]:
+        """Hand staged blobs over for writing. Runs on the event loop."""
+        batch = {ref: staged[0] for ref, staged in self._pending.items()}
+        self._pending = {}
+        with self._lock:
+            self._writing.update(batch)
+        return batch
+
+    def write(self, batch: Dict[str, str]) -> None:
+        """Write blobs that are not on disk yet. Runs on the writer thread."""
+        for ref, text in batch.items():
+            path = self._path(ref)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write_text(path, text)
+        with self._lock:
+            for ref in batch:
+                self._writing.pop(ref, None)
+
+    def collect_garbage(self, live_refs: Iterable[str]) -> int:
+        """Delete blob files not in ``live_refs``. Returns how many were removed."""
+        live = set(live_refs) | set(self._pending)
+        with self._lock:
+            live |= set(self._writing)
+        removed = 0
+        if not self.directory.exists():
+            return removed
+        for path in self.directory.glob("??/*"):
+            if path.name not in live and not path.name.endswith(".tmp"):
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
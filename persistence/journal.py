@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from .storage import JsonStorage, atomic_write_text
+
+if TYPE_CHECKING:
+    from models import AppData
+
+    from .blobs import BlobStore
+
+
+def index_node_dicts(index: Dict[str, Dict[str, Any]], parents: Dict[str, Optional[str]],
+                     node: Dict[str, Any], parent_id: Optional[str]) -> None:
+    """Register a node dict and its descendants in the lookup tables."""
+    stack = [(node, parent_id)]
+    while stack:
+        current, current_parent = stack.pop()
+        index[current["id"]] = current
+        parents[current["id"]] = current_parent
+        stack.extend((child, current["id"]) for child in current.get("children", []))
+
+
+def apply_op(index: Dict[str, Dict[str, Any]], parents: Dict[str, Optional[str]],
+             roots: List[Dict[str, Any]], op: Dict[str, Any]) -> None:
+    """Apply one journal record to a forest of plain node dicts.
+
+    Replay is idempotent: adding a node that exists or touching one that
+    doesn't is a no-op, so a log may safely be replayed over a snapshot
+    that already contains it.
+    """
+    kind = op.get("op")
+    if kind == "set":
+        node = index.get(op["id"])
+        if node is not None:
+            node[op["field"]] = op["value"]
+            node["updated_at"] = op["updated_at"]
+
+    elif kind == "add":
+        new_node = op["node"]
+        if new_node["id"] in index:
+            return
+        parent_id = op.get("parent")
+        if parent_id is None:
+            siblings = roots
+        else:
+            parent = index.get(parent_id)
+            if parent is None:
+                return
+            parent["children_type"] = op["children_type"]
+            siblings = parent.setdefault("children", [])
+        siblings.insert(op.get("index", len(siblings)), new_node)
+        index_node_dicts(index, parents, new_node, parent_id)
+
+    elif kind == "delete":
+        node = index.get(op["id"])
+        if node is None:
+            return
+        parent_id = parents.get(op["id"])
+        parent = index.get(parent_id) if parent_id else None
+        siblings = roots if parent is None else parent["children"]
+        siblings[:] = [n for n in siblings if n is not node]
+        if parent is not None and not siblings:
+            parent["children_type"] = "LEAF"
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            index.pop(current["id"], None)
+            parents.pop(current["id"], None)
+            stack.extend(current.get("children", []))
+
+
+class JournalStorage(JsonStorage):
+    """JSON snapshot plus an append-only log of mutation records.
+
+    Saves append only the records received since the last save. Once the
+    log grows past ``compact_bytes`` the writer thread folds it into a new
+    snapshot. Startup loads the snapshot and replays the log.
+    """
+
+    def __init__(self, file_path: str = "data.json", debounce_ms: int = 500, max_delay_ms: int = 5000,
+                 compact_bytes: int = 1_000_000, blobs: Optional["BlobStore"] = None, load_workers: int = 1,
+                 read_only: bool = False):
+        super().__init__(file_path, debounce_ms, max_delay_ms, blobs, load_workers, read_only)
+        self.compact_bytes = compact_bytes
+        self.journal_path = self.file_path.with_name(self.file_path.name + ".journal")
+        # Log being folded into a snapshot; kept until the snapshot is durable
+        self.compacting_path = self.file_path.with_name(self.file_path.name + ".journal.compacting")
+        self._ops: List[Dict[str, Any]] = []
+        # Log bytes handed to the writer since the last compaction
+        self._journal_bytes = 0
+
+    @property
+    def disk_bytes(self) -> int:
+        logs = (self.journal_path, self.compacting_path)
+        return super().disk_bytes + sum(path.stat().st_size for path in logs if path.exists())
+
+    def load(self) -> "AppData":
+        from models import CURRENT_VERSION, AppData, upgrade_app_data
+
+        logs = [path for path in (self.compacting_path, self.journal_path) if path.exists()]
+        # Log bytes not yet folded into the snapshot; without one, force a first snapshot
+        self._journal_bytes = sum(path.stat().st_size for path in logs)
+        if not self.file_path.exists():
+            self._journal_bytes += self.compact_bytes
+        if not logs:
+            return super().load()
+
+        data = self._read_raw() or {"version": CURRENT_VERSION}
+        upgraded = data.get("version") != CURRENT_VERSION
+        if upgraded:
+            upgrade_app_data(data)
+        roots: List[Dict[str, Any]] = data.setdefault("roots", [])
+        index: Dict[str, Dict[str, Any]] = {}
+        parents: Dict[str, Optional[str]] = {}
+        for root in roots:
+            index_node_dicts(index, parents, root, None)
+
+        for path in logs:
+            for op in self._read_journal(path, repair=not self.read_only):
+                apply_op(index, parents, roots, op)
+        app_data = AppData.model_validate(data)
+        if upgraded and not self.read_only:
+            self._write_payloads([self._snapshot(app_data, full=True)])
+        return app_data
+
+    @staticmethod
+    def _read_journal(path: Path, repair: bool = True) -> List[Dict[str, Any]]:
+        """Read a log's records, cutting a torn final line off the file unless ``repair`` is False.
+
+        Records appended after a torn line would otherwise be unreadable,
+        since reading stops there.
+        """
+        if not path.exists():
+            return []
+        ops = []
+        good_bytes = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    ops.append(json.loads(line.decode("utf-8")))
+                except ValueError:
+                    # Torn final line from a crash mid-append, possibly cut inside a character
+                    break
+                good_bytes += len(line)
+        size = path.stat().st_size
+        if not repair:
+            return ops
+        if good_bytes < size or (size and not line.endswith(b"\n")):
+            with open(path, "r+b") as f:
+                # Drop the torn line, or end a whole final record the crash left without its newline
+                f.truncate(good_bytes)
+                if good_bytes and good_bytes == size:
+                    f.seek(good_bytes)
+                    f.write(b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+        return ops
+
+    def record(self, op: Dict[str, Any]) -> None:
+        self._ops.append(op)
+
+    def _snapshot(self, data: "AppData", full: bool = False) -> Any:
+        lines = "".join(json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n" for op in self._ops)
+        self._ops = []
+        self._journal_bytes += len(lines)
+        snapshot = None
+        if full or self._journal_bytes >= self.compact_bytes:
+            snapshot = self._serialize(data)
+            self._journal_bytes = 0
+        return lines, snapshot
+
+    def _write_payloads(self, payloads: List[Any]) -> None:
+        for lines, snapshot in payloads:
+            if lines:
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+            if snapshot is not None:
+                self._compact(snapshot)
+
+    def _compact(self, snapshot: str) -> None:
+        """Replace the snapshot with one that covers everything logged so far."""
+        if self.compacting_path.exists():
+            # An earlier compaction never finished; its records are still needed
+            if self.journal_path.exists():
+                with open(self.compacting_path, "a", encoding="utf-8") as f:
+                    f.write(self.journal_path.read_text(encoding="utf-8"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.journal_path.unlink()
+        elif self.journal_path.exists():
+            os.replace(self.journal_path, self.compacting_path)
+        atomic_write_text(self.file_path, snapshot)
+        self.compacting_path.unlink(missing_ok=True)
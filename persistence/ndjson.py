@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Annotated, Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from pydantic import Field, TypeAdapter, ValidationError
+
+if TYPE_CHECKING:
+    from models import AppData, BaseNode, DAPPChildNode
+
+    from .blobs import BlobStore
+
+# Board text that may be kept in a BlobStore, and the fields holding its refs
+BOARD_FIELDS = ("progress_board", "content_board")
+
+# A node's own fields, without children, and the id of its parent (None for roots)
+Record = Tuple[Optional[str], Dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class LineError:
+    """A rejected input line and why."""
+
+    line: int
+    message: str
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.message}"
+
+
+class NdjsonError(ValueError):
+    """Raised at the end of an import (or at ``max_errors``) listing every rejected line."""
+
+    def __init__(self, errors: List[LineError]):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid line(s):\n" + "\n".join(map(str, errors)))
+
+
+def tree_records(roots: Iterable[Any]) -> Iterator[Record]:
+    """Walk a forest in pre-order, parents before children, one node at a time."""
+    stack: List[Tuple[Any, Optional[str]]] = [(root, None) for root in reversed(list(roots))]
+    while stack:
+        node, parent_id = stack.pop()
+        yield parent_id, node.model_dump(mode="json", exclude={"children"})
+        stack.extend((child, node.id) for child in reversed(node.children))
+
+
+def dump_lines(records: Iterable[Record], blobs: Optional["BlobStore"] = None) -> Iterator[str]:
+    """NDJSON lines for node records: the node's fields plus ``"parent"``.
+
+    With ``blobs``, board text kept in the blob store is written inline,
+    so the file stands on its own.
+    """
+    for parent_id, node in records:
+        if blobs is not None:
+            for field in BOARD_FIELDS:
+                ref = node.get(f"{field}_ref")
+                if ref:
+                    node[field] = blobs.get(ref, cache=False)
+                    node[f"{field}_ref"] = ""
+        yield json.dumps({"parent": parent_id, **node}, ensure_ascii=False) + "\n"
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'node'}: {error['msg']}" for error in exc.errors()
+    )
+
+
+def read_records(
+    lines: Iterable[Union[str, bytes]], max_errors: int = 100
+) -> Iterator[Tuple[Optional[str], int, Union["BaseNode", "DAPPChildNode"]]]:
+    """Validate NDJSON node lines one at a time.
+
+    Yields ``(parent id, position among siblings, node)`` for every valid
+    line. A parent must appear before its children, and only each node's
+    id, children_type and child count are kept, so memory grows with the
+    number of ids rather than with the data. Bad lines are skipped and
+    collected; once the input is exhausted (or ``max_errors`` lines were
+    bad) NdjsonError lists them, so a consumer inside a transaction can
+    roll back.
+    """
+    from models import BaseNode, DAPPChildNode
+
+    adapter = TypeAdapter(Annotated[Union[BaseNode, DAPPChildNode], Field(discriminator="type")])
+    children_types: Dict[str, str] = {}
+    child_counts: Dict[Optional[str], int] = {}
+    # Ids of bad lines, so their children are reported as such rather than as orphans
+    rejected: Set[str] = set()
+    errors: List[LineError] = []
+
+    def fail(number: int, message: str, node_id: Any = None) -> None:
+        if isinstance(node_id, str):
+            rejected.add(node_id)
+        errors.append(LineError(number, message))
+        if len(errors) >= max_errors:
+            raise NdjsonError(errors)
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            values = json.loads(line)
+        except ValueError as exc:
+            fail(number, f"invalid JSON: {exc}")
+            continue
+        if not isinstance(values, dict):
+            fail(number, "expected a JSON object")
+            continue
+
+        node_id = values.get("id")
+        parent_id = values.pop("parent", None)
+        if values.pop("children", None):
+            fail(number, "children must be lines of their own, naming this node as parent", node_id)
+            continue
+        if parent_id is None:
+            expected_type = "Base"
+        elif not isinstance(parent_id, str):
+            fail(number, f"parent must be a node id or null, not {parent_id!r}", node_id)
+            continue
+        elif parent_id in rejected:
+            fail(number, f"parent {parent_id} was rejected", node_id)
+            continue
+        elif parent_id not in children_types:
+            fail(number, f"unknown parent {parent_id}; parents must come before their children", node_id)
+            continue
+        elif children_types[parent_id] == "LEAF":
+            fail(number, f"parent {parent_id} has children_type LEAF", node_id)
+            continue
+        else:
+            expected_type = "DAPP_Child" if children_types[parent_id] == "DAPP" else "Base"
+        values.setdefault("type", expected_type)
+        if values["type"] != expected_type:
+            where = "a root" if parent_id is None else f"a child of {children_types[parent_id]} node {parent_id}"
+            fail(number, f"type {values['type']!r} cannot be {where}; expected {expected_type!r}", node_id)
+            continue
+
+        try:
+            node: Union[BaseNode, DAPPChildNode] = adapter.validate_python(values)
+        except ValidationError as exc:
+            fail(number, _describe(exc), node_id)
+            continue
+        if node.id in children_types or node.id in rejected:
+            fail(number, f"duplicate id {node.id}")
+            continue
+
+        children_types[node.id] = node.children_type.value
+        position = child_counts.get(parent_id, 0)
+        child_counts[parent_id] = position + 1
+        yield parent_id, position, node
+
+    if errors:
+        raise NdjsonError(errors)
+
+
+def load_records(lines: Iterable[Union[str, bytes]], max_errors: int = 100) -> "AppData":
+    """Build an AppData from NDJSON lines (see ``read_records``)."""
+    from models import AppData
+
+    roots: List[BaseNode] = []
+    parents: Dict[str, Union[BaseNode, DAPPChildNode]] = {}
+    for parent_id, _, node in read_records(lines, max_errors):
+        if parent_id is None:
+            roots.append(node)  # type: ignore[arg-type]
+        else:
+            parents[parent_id].children.append(node)
+        if node.children_type.value != "LEAF":
+            parents[node.id] = node
+    return AppData(roots=roots)
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+if TYPE_CHECKING:
+    from models import AppData, BaseNode
+
+# How ``AppData.model_dump_json(indent=2)`` opens and closes the roots array,
+# and what lies between two roots. JSON strings cannot hold raw newlines,
+# so at this indentation these bytes are always structure.
+ROOTS_OPEN = b'\n  "roots": [\n'
+ROOTS_CLOSE = b"\n  ]\n}"
+ROOT_SEPARATOR = b"\n    },\n    {"
+ROOT_END = len(b"\n    }")
+ROOT_START = len(b"\n    },\n    ")
+
+
+def split_document(raw: bytes) -> Optional[Tuple[Dict[str, Any], List[bytes]]]:
+    """Split an AppData document into its other fields and the JSON text of each root.
+
+    Only finds roots in the layout JsonStorage writes; returns None for
+    any other layout (or an empty forest), which needs a plain parse.
+    """
+    start = raw.find(ROOTS_OPEN)
+    end = raw.rfind(ROOTS_CLOSE)
+    if start < 0 or end < start:
+        return None
+    try:
+        header = json.loads(raw[:start] + b'\n  "roots": []\n}')
+    except ValueError:
+        return None
+    body = raw[start + len(ROOTS_OPEN):end]
+    roots = []
+    begin = 0
+    while True:
+        separator = body.find(ROOT_SEPARATOR, begin)
+        if separator < 0:
+            roots.append(body[begin:])
+            return header, roots
+        roots.append(body[begin:separator + ROOT_END])
+        begin = separator + ROOT_START
+
+
+@lru_cache(maxsize=None)
+def _roots_adapter() -> TypeAdapter[List["BaseNode"]]:
+    from models import BaseNode
+
+    return TypeAdapter(List[BaseNode])
+
+
+def _validate_chunk(chunk: bytes) -> Optional[List["BaseNode"]]:
+    """Validate a JSON array of roots, or None if it is invalid. Runs in a worker process."""
+    try:
+        return _roots_adapter().validate_json(chunk)
+    except ValidationError:
+        # Errors are reported by the serial parse; they need not cross processes
+        return None
+
+
+def _chunks(roots: List[bytes], count: int) -> List[bytes]:
+    """Group consecutive roots into about ``count`` JSON arrays of similar size."""
+    target = sum(map(len, roots)) / count
+    chunks: List[bytes] = []
+    group: List[bytes] = []
+    size = 0
+    for root in roots:
+        group.append(root)
+        size += len(root)
+        if size >= target:
+            chunks.append(b"[" + b",".join(group) + b"]")
+            group, size = [], 0
+    if group:
+        chunks.append(b"[" + b",".join(group) + b"]")
+    return chunks
+
+
+def validate_roots(header: Dict[str, Any], roots: List[bytes], workers: int) -> Optional["AppData"]:
+    """Validate roots (JSON texts) in a pool of ``workers`` processes and assemble AppData in order.
+
+    ``header`` holds the document's other fields. Returns None if the
+    document needs upgrading or a root fails validation; the caller then
+    falls back to ``parse_app_data``, which upgrades or raises properly.
+    """
+    from models import CURRENT_VERSION, AppData
+
+    if header.get("version") != CURRENT_VERSION or len(roots) < 2:
+        return None
+    chunks = _chunks(roots, workers)
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        # map keeps chunk order, so roots come back in document order
+        parts = list(pool.map(_validate_chunk, chunks))
+    validated: List["BaseNode"] = []
+    for part in parts:
+        if part is None:
+            return None
+        validated.extend(part)
+    return AppData(version=header["version"], last_modified=header.get("last_modified"), roots=validated)
+
+
+def parse_app_data_parallel(raw: bytes, workers: int) -> Optional["AppData"]:
+    """``parse_app_data`` for a document JsonStorage wrote, its roots validated across processes.
+
+    Returns None where ``validate_roots`` does, and for documents it
+    cannot split.
+    """
+    split = split_document(raw)
+    if split is None:
+        return None
+    return validate_roots(*split, workers)
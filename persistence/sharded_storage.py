@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
+
+from metrics import STORAGE_SECONDS
+
+from .storage import BaseStorage, atomic_write_text, parse_app_data
+
+if TYPE_CHECKING:
+    from models import AppData
+
+    from .blobs import BlobStore
+
+# Root ids usable as file names as they are; others are hashed
+SAFE_NAME = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+
+class ShardedStorage(BaseStorage):
+    """One JSON file per root tree plus a manifest of root order and metadata.
+
+    ``AppState`` reports the roots each mutation changed through ``touch``;
+    a save rewrites only those shards and the manifest, so an edit costs
+    I/O in proportion to its own tree, not the whole forest. Each file is
+    replaced atomically. Shards of new roots are written before the
+    manifest lists them, and shards of deleted roots are removed after it
+    stops listing them, so a crash leaves at worst a stray file; a full
+    save removes every shard the manifest does not list. An empty
+    directory is filled from ``migrate_from`` (a JsonStorage file) on
+    first load. With ``load_workers`` above 1, shards are validated in
+    that many processes. A ``read_only`` storage reads ``migrate_from``
+    without writing the shards.
+    """
+
+    def __init__(self, directory: str = "data", debounce_ms: int = 500, max_delay_ms: int = 5000,
+                 migrate_from: Optional[str] = "data.json", blobs: Optional["BlobStore"] = None,
+                 load_workers: int = 1, read_only: bool = False):
+        super().__init__(debounce_ms, max_delay_ms, blobs, read_only)
+        self.directory = Path(directory)
+        self.manifest_path = self.directory / "manifest.json"
+        self.roots_dir = self.directory / "roots"
+        self.migrate_from = Path(migrate_from) if migrate_from else None
+        self.load_workers = load_workers
+        # Roots changed since the last snapshot, deleted ones included
+        self._dirty: Set[str] = set()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({str(self.directory)!r})"
+
+    @property
+    def disk_bytes(self) -> int:
+        if not self.directory.exists():
+            return 0
+        return sum(path.stat().st_size for path in self.directory.rglob("*.json"))
+
+    def shard_path(self, root_id: str) -> Path:
+        name = root_id if SAFE_NAME.fullmatch(root_id) else hashlib.sha256(root_id.encode("utf-8")).hexdigest()
+        return self.roots_dir / f"{name}.json"
+
+    def touch(self, root_id: str) -> None:
+        self._dirty.add(root_id)
+
+    def read_manifest(self) -> Optional[Dict[str, Any]]:
+        """The manifest as a dict, or None if nothing was stored yet."""
+        if not self.manifest_path.exists():
+            return None
+        return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+
+    def load(self) -> "AppData":
+        """Load every shard in manifest order, migrating or returning empty data if there is none."""
+        from models import AppData
+
+        manifest = self.read_manifest()
+        if manifest is None:
+            if self.migrate_from is None or not self.migrate_from.exists():
+                return AppData()
+            data, _ = parse_app_data(self.migrate_from.read_bytes())
+            if not self.read_only:
+                self._write_payloads([self._snapshot(data, full=True)])
+            return data
+
+        header = {"version": manifest["version"], "last_modified": manifest["last_modified"]}
+        shards = [self.shard_path(root_id).read_bytes() for root_id in manifest["roots"]]
+        if self.load_workers > 1:
+            from .parallel import validate_roots
+
+            parallel_data = validate_roots(header, shards, self.load_workers)
+            if parallel_data is not None:
+                return parallel_data
+        # One document for one validation pass: the manifest's fields around the shards
+        head = json.dumps(header)
+        raw = head[:-1].encode("utf-8") + b', "roots": [' + b",".join(shards) + b"]}"
+        data, upgraded = parse_app_data(raw)
+        if upgraded and not self.read_only:
+            self._write_payloads([self._snapshot(data, full=True)])
+        return data
+
+    def _snapshot(self, data: "AppData", full: bool = False) -> Any:
+        dirty, self._dirty = self._dirty, set()
+        if not dirty and not full:
+            return {}, None, False
+        data.last_modified = datetime.utcnow()
+        roots = {root.id: root for root in data.roots}
+        with STORAGE_SECONDS.labels(type(self).__name__, "serialize").time():
+            # None marks a root that is gone
+            shards: Dict[str, Optional[str]] = {
+                root_id: roots[root_id].model_dump_json(indent=2) if root_id in roots else None
+                for root_id in (roots.keys() | dirty if full else dirty)
+            }
+            manifest = json.dumps({
+                "version": data.version,
+                "last_modified": data.last_modified.isoformat(),
+                "roots": list(roots),
+            }, ensure_ascii=False, indent=2)
+        return shards, manifest, full
+
+    def _write_payloads(self, payloads: List[Any]) -> None:
+        # Later snapshots of a root supersede earlier ones
+        shards: Dict[str, Optional[str]] = {}
+        manifest = None
+        full = False
+        for payload_shards, payload_manifest, payload_full in payloads:
+            shards.update(payload_shards)
+            manifest = payload_manifest or manifest
+            full = full or payload_full
+        if manifest is None:
+            return
+        self.roots_dir.mkdir(parents=True, exist_ok=True)
+        for root_id, text in shards.items():
+            if text is not None:
+                atomic_write_text(self.shard_path(root_id), text)
+        atomic_write_text(self.manifest_path, manifest)
+        for root_id, text in shards.items():
+            if text is None:
+                self.shard_path(root_id).unlink(missing_ok=True)
+        if full:
+            # Also strays a crash or an earlier failed write left behind
+            listed = {self.shard_path(root_id).name for root_id in json.loads(manifest)["roots"]}
+            for path in self.roots_dir.glob("*.json"):
+                if path.name not in listed:
+                    path.unlink(missing_ok=True)
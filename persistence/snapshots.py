@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from .storage import atomic_write_bytes, atomic_write_text, fsync_directory
+
+
+def encode_object(node: Dict[str, Any], children: List[str]) -> bytes:
+    """Canonical bytes of a snapshot object: a node's own fields plus its children's hashes."""
+    return json.dumps(
+        {"node": node, "children": children}, sort_keys=True, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def object_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class SnapshotStore:
+    """Point-in-time copies of the forest as a Merkle tree of node objects.
+
+    Every node is stored as an object named after the SHA-256 of its own
+    fields plus the hashes of its children, so a hash stands for a whole
+    subtree. Objects are written once and shared by every snapshot that
+    contains the same subtree; a snapshot itself is a small file listing
+    its root hashes. Taking a snapshot writes only the objects of nodes
+    that changed, and diffing two snapshots skips subtrees whose hashes
+    are equal.
+    """
+
+    def __init__(self, directory: str = "snapshots"):
+        self.directory = Path(directory)
+        self.objects_dir = self.directory / "objects"
+        # Hashes known to be on disk, so repeated snapshots skip the stat call
+        self._known: Set[str] = set()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({str(self.directory)!r})"
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def has_object(self, digest: str) -> bool:
+        if digest in self._known:
+            return True
+        if self._object_path(digest).exists():
+            self._known.add(digest)
+            return True
+        return False
+
+    def _put_object(self, digest: str, data: bytes) -> Path:
+        """Write an object durably, except for its directory entry; returns its path."""
+        path = self._object_path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(path, data, sync_directory=False)
+        self._known.add(digest)
+        return path
+
+    def get_object(self, digest: str) -> Tuple[Dict[str, Any], List[str]]:
+        """A node's own fields and its children's hashes."""
+        obj = json.loads(self._object_path(digest).read_bytes())
+        return obj["node"], obj["children"]
+
+    def write_snapshot(self, roots: List[str], objects: Dict[str, bytes], label: str = "") -> str:
+        """Write new objects, then the snapshot that lists ``roots``; returns the snapshot id.
+
+        Touches only files, so it may run on a worker thread.
+        """
+        written = {
+            self._put_object(digest, data).parent for digest, data in objects.items() if not self.has_object(digest)
+        }
+        # Objects must be durable before a snapshot refers to them: their
+        # files are synced as written, their directory entries once per directory
+        for directory in written:
+            fsync_directory(directory)
+        if written:
+            fsync_directory(self.objects_dir)
+        created_at = datetime.now()
+        snapshot_id = created_at.strftime("%Y%m%dT%H%M%S%f")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(
+            self.directory / f"{snapshot_id}.json",
+            json.dumps({"id": snapshot_id, "created_at": created_at.isoformat(), "label": label, "roots": roots}),
+        )
+        return snapshot_id
+
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """Every snapshot's id, created_at, label and root hashes, oldest first."""
+        if not self.directory.exists():
+            return []
+        return [json.loads(path.read_text(encoding="utf-8")) for path in sorted(self.directory.glob("*.json"))]
+
+    def read_snapshot(self, snapshot_id: str) -> Dict[str, Any]:
+        return json.loads((self.directory / f"{snapshot_id}.json").read_text(encoding="utf-8"))
+
+    def load(self, snapshot_id: str) -> List[Dict[str, Any]]:
+        """The snapshot's roots as nested node dicts, in the shape of ``AppData.roots``."""
+        return [self._load_subtree(digest) for digest in self.read_snapshot(snapshot_id)["roots"]]
+
+    def _load_subtree(self, digest: str) -> Dict[str, Any]:
+        node, children = self.get_object(digest)
+        root = dict(node, children=[])
+        stack = [(root, children)]
+        while stack:
+            parent, child_hashes = stack.pop()
+            for child_hash in child_hashes:
+                child_node, grandchildren = self.get_object(child_hash)
+                child = dict(child_node, children=[])
+                parent["children"].append(child)
+                stack.append((child, grandchildren))
+        return root
+
+    def diff(self, old_id: str, new_id: str) -> List[Dict[str, Any]]:
+        """Changes from one snapshot to another.
+
+        Each change has a ``kind`` ("added", "removed" or "changed"), the
+        node ``id`` and ``name``, and the ``parent`` id; "changed" entries
+        also list the changed ``fields``. An added or removed subtree is a
+        single entry for its top node. Only subtrees whose hashes differ
+        are read.
+        """
+        changes: List[Dict[str, Any]] = []
+        pending = [(None, self.read_snapshot(old_id)["roots"], self.read_snapshot(new_id)["roots"])]
+        while pending:
+            parent_id, old_hashes, new_hashes = pending.pop()
+            # Hashes on both sides are identical subtrees and are never read
+            shared = set(old_hashes) & set(new_hashes)
+            old_nodes = self._read_nodes(digest for digest in old_hashes if digest not in shared)
+            new_nodes = self._read_nodes(digest for digest in new_hashes if digest not in shared)
+            for node_id, (node, children) in new_nodes.items():
+                old = old_nodes.pop(node_id, None)
+                if old is None:
+                    changes.append({"kind": "added", "id": node_id, "name": node["name"], "parent": parent_id})
+                    continue
+                old_node, old_children = old
+                fields = sorted(key for key in node.keys() | old_node.keys() if node.get(key) != old_node.get(key))
+                if fields:
+                    changes.append({
+                        "kind": "changed", "id": node_id, "name": node["name"], "parent": parent_id, "fields": fields,
+                    })
+                pending.append((node_id, old_children, children))
+            for node_id, (node, _) in old_nodes.items():
+                changes.append({"kind": "removed", "id": node_id, "name": node["name"], "parent": parent_id})
+        return changes
+
+    def _read_nodes(self, digests: Iterable[str]) -> Dict[str, Tuple[Dict[str, Any], List[str]]]:
+        nodes = {}
+        for digest in digests:
+            node, children = self.get_object(digest)
+            nodes[node["id"]] = (node, children)
+        return nodes
+
+    def referenced_values(self, fields: Iterable[str]) -> Set[str]:
+        """Every value of the given node fields in any stored object, e.g. board blob refs to keep."""
+        fields = tuple(fields)
+        values: Set[str] = set()
+        if not self.objects_dir.exists():
+            return values
+        for path in self.objects_dir.glob("??/*"):
+            if path.name.endswith(".tmp"):
+                continue
+            node = json.loads(path.read_bytes())["node"]
+            values.update(node[field] for field in fields if node.get(field))
+        return values
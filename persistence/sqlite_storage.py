@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Annotated, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pydantic import Field, TypeAdapter
+
+from .storage import BaseStorage
+
+if TYPE_CHECKING:
+    from models import AppData, BaseNode, DAPPChildNode
+
+    from .blobs import BlobStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    id TEXT PRIMARY KEY,
+    parent_id TEXT,
+    position INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    completion_condition TEXT NOT NULL DEFAULT '',
+    children_type TEXT NOT NULL,
+    progress_board TEXT NOT NULL DEFAULT '',
+    content_board TEXT NOT NULL DEFAULT '',
+    progress_board_ref TEXT NOT NULL DEFAULT '',
+    content_board_ref TEXT NOT NULL DEFAULT '',
+    archive_ref TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    atp TEXT,
+    signposts TEXT,
+    triggers TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_nodes_parent ON nodes (parent_id, position);
+"""
+
+# Node fields stored as plain columns and as JSON-encoded list columns
+SCALAR_COLUMNS = (
+    "type", "name", "description", "status", "completion_condition", "children_type",
+    "progress_board", "content_board", "progress_board_ref", "content_board_ref", "archive_ref",
+    "created_at", "updated_at",
+)
+# Columns added after the first schema; older databases get them on open
+ADDED_COLUMNS = ("progress_board_ref", "content_board_ref", "archive_ref")
+LIST_COLUMNS = ("atp", "signposts", "triggers")
+NODE_COLUMNS = ("id", "parent_id", "position") + SCALAR_COLUMNS + LIST_COLUMNS
+
+# Rows of the top ``?`` levels, each with its depth (1 = roots)
+TOP_LEVELS = """
+WITH RECURSIVE levels(id, depth) AS (
+    SELECT id, 1 FROM nodes WHERE parent_id IS NULL
+    UNION ALL
+    SELECT n.id, l.depth + 1 FROM nodes n JOIN levels l ON n.parent_id = l.id
+    WHERE l.depth < ?
+)
+"""
+
+SUBTREE_IDS = """
+WITH RECURSIVE subtree(id) AS (
+    SELECT ?
+    UNION ALL
+    SELECT n.id FROM nodes n JOIN subtree s ON n.parent_id = s.id
+)
+"""
+
+
+def _node_rows(node: Dict[str, Any], parent_id: Optional[str], position: int) -> Iterator[Tuple[Any, ...]]:
+    """Yield one row per node of a JSON-mode node dict and its subtree."""
+    stack = [(node, parent_id, position)]
+    while stack:
+        current, current_parent, current_position = stack.pop()
+        row: List[Any] = [current["id"], current_parent, current_position]
+        row.extend(current.get(column, "") for column in SCALAR_COLUMNS)
+        row.extend(
+            json.dumps(current[column], ensure_ascii=False) if column in current else None
+            for column in LIST_COLUMNS
+        )
+        yield tuple(row)
+        stack.extend((child, current["id"], i) for i, child in enumerate(current.get("children", [])))
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    node: Dict[str, Any] = {column: row[column] for column in SCALAR_COLUMNS}
+    node["id"] = row["id"]
+    for column in LIST_COLUMNS:
+        if row[column] is not None:
+            node[column] = json.loads(row[column])
+    node["children"] = []
+    return node
+
+
+class SqliteStorage(BaseStorage):
+    """One SQLite row per node, written per change instead of per document.
+
+    Mutation records from ``AppState`` become single-row UPDATEs, subtree
+    INSERTs and subtree DELETEs. With ``load_depth``, ``load`` returns only
+    the top levels; ``unloaded`` then lists the nodes whose children stayed
+    in the database, with their descendants' status counts, and
+    ``load_children`` fetches such a node's subtree when it is expanded.
+    An empty database is filled from ``migrate_from`` (a JsonStorage file)
+    on first load. A ``read_only`` storage opens the database read-only
+    and leaves an older schema as it is.
+    """
+
+    def __init__(self, file_path: str = "data.db", debounce_ms: int = 500, max_delay_ms: int = 5000,
+                 migrate_from: Optional[str] = "data.json", blobs: Optional["BlobStore"] = None,
+                 load_depth: Optional[int] = None, read_only: bool = False):
+        super().__init__(debounce_ms, max_delay_ms, blobs, read_only)
+        self.file_path = Path(file_path)
+        self.migrate_from = Path(migrate_from) if migrate_from else None
+        self.load_depth = load_depth
+        self._ops: List[Dict[str, Any]] = []
+        # Filled by a depth-limited load: node id -> descendants left in the database
+        self._unloaded: Dict[str, Dict[str, Any]] = {}
+        # Row columns of queries; a read-only view of an older schema fills in the added ones
+        self._columns = "nodes.*"
+        with closing(self._connect()) as conn, conn:
+            if not read_only:
+                conn.executescript(SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(nodes)")}
+            for column in ADDED_COLUMNS:
+                if column in existing:
+                    continue
+                if read_only:
+                    self._columns += f", '' AS {column}"
+                else:
+                    conn.execute(f"ALTER TABLE nodes ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({str(self.file_path)!r})"
+
+    @property
+    def disk_bytes(self) -> int:
+        files = (self.file_path, self.file_path.with_name(self.file_path.name + "-wal"))
+        return sum(path.stat().st_size for path in files if path.exists())
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call keeps the loop and writer threads apart
+        if self.read_only:
+            conn = sqlite3.connect(f"{self.file_path.resolve().as_uri()}?mode=ro", uri=True)
+        else:
+            conn = sqlite3.connect(self.file_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _is_empty(self, conn: sqlite3.Connection) -> bool:
+        return conn.execute("SELECT 1 FROM nodes LIMIT 1").fetchone() is None
+
+    def migrate_from_json(self, json_path: Path) -> None:
+        """Import a JsonStorage document into this (empty) database."""
+        from .storage import parse_app_data
+
+        data, _ = parse_app_data(json_path.read_bytes())
+        with closing(self._connect()) as conn, conn:
+            if not self._is_empty(conn):
+                raise ValueError(f"{self.file_path} already contains nodes")
+            self._write_meta(conn, data.version)
+            for position, root in enumerate(data.roots):
+                conn.executemany(
+                    f"INSERT INTO nodes ({', '.join(NODE_COLUMNS)}) VALUES ({', '.join('?' * len(NODE_COLUMNS))})",
+                    _node_rows(root.model_dump(mode="json"), None, position),
+                )
+
+    def import_records(
+        self, records: Iterable[Tuple[Optional[str], int, "BaseNode | DAPPChildNode"]], replace: bool = False
+    ) -> int:
+        """Insert ``(parent id, position, node)`` records (as from ``ndjson.read_records``) in one transaction.
+
+        Rows are written as records arrive, so the forest is never held in
+        memory. The database must be empty unless ``replace`` is set. If
+        ``records`` raises, nothing is imported. Returns the node count.
+        """
+        from models import CURRENT_VERSION
+
+        count = 0
+
+        def rows() -> Iterator[Tuple[Any, ...]]:
+            nonlocal count
+            for parent_id, position, node in records:
+                count += 1
+                yield from _node_rows(node.model_dump(mode="json", exclude={"children"}), parent_id, position)
+
+        with closing(self._connect()) as conn, conn:
+            if replace:
+                conn.execute("DELETE FROM nodes")
+            elif not self._is_empty(conn):
+                raise ValueError(f"{self.file_path} already contains nodes")
+            self._write_meta(conn, CURRENT_VERSION)
+            conn.executemany(
+                f"INSERT INTO nodes ({', '.join(NODE_COLUMNS)}) VALUES ({', '.join('?' * len(NODE_COLUMNS))})",
+                rows(),
+            )
+        return count
+
+    def iter_records(self) -> Iterator[Tuple[Optional[str], Dict[str, Any]]]:
+        """Stream ``(parent id, node fields)`` level by level, parents before children, without loading the forest."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                f"""
+                WITH RECURSIVE levels(id, depth) AS (
+                    SELECT id, 0 FROM nodes WHERE parent_id IS NULL
+                    UNION ALL
+                    SELECT n.id, l.depth + 1 FROM nodes n JOIN levels l ON n.parent_id = l.id
+                )
+                SELECT {self._columns} FROM nodes JOIN levels USING (id) ORDER BY depth, parent_id, position
+                """
+            )
+            for row in cursor:
+                node = _row_to_dict(row)
+                del node["children"]
+                yield row["parent_id"], node
+
+    @staticmethod
+    def _write_meta(conn: sqlite3.Connection, version: str) -> None:
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [("version", version), ("last_modified", datetime.utcnow().isoformat())],
+        )
+
+    def load(self) -> "AppData":
+        """Load the forest, or only its top ``load_depth`` levels (1 = roots only)."""
+        from models import CURRENT_VERSION, AppData
+
+        needs_migration = False
+        if not self.read_only and self.migrate_from is not None and self.migrate_from.exists():
+            with closing(self._connect()) as conn:
+                needs_migration = self._is_empty(conn)
+        if needs_migration:
+            assert self.migrate_from is not None
+            self.migrate_from_json(self.migrate_from)
+
+        with closing(self._connect()) as conn:
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            if self.load_depth is None:
+                rows = conn.execute(f"SELECT {self._columns} FROM nodes ORDER BY parent_id, position").fetchall()
+                self._unloaded = {}
+            else:
+                rows = conn.execute(
+                    TOP_LEVELS
+                    + f"SELECT {self._columns} FROM nodes JOIN levels USING (id) ORDER BY parent_id, position",
+                    (self.load_depth,),
+                ).fetchall()
+                self._unloaded = self._hidden_descendants(conn, self.load_depth)
+
+        roots = self._assemble(rows)
+        return AppData.model_validate({
+            "version": meta.get("version", CURRENT_VERSION),
+            "last_modified": meta.get("last_modified"),
+            "roots": roots,
+        })
+
+    @staticmethod
+    def _hidden_descendants(conn: sqlite3.Connection, depth: int) -> Dict[str, Dict[str, Any]]:
+        """Status counts and archive refs of the descendants of nodes at ``depth``, per such node."""
+        hidden = TOP_LEVELS + """,
+        hidden(origin, id) AS (
+            SELECT n.parent_id, n.id FROM nodes n JOIN levels l ON n.parent_id = l.id WHERE l.depth = ?
+            UNION ALL
+            SELECT h.origin, n.id FROM nodes n JOIN hidden h ON n.parent_id = h.id
+        )
+        """
+        unloaded: Dict[str, Dict[str, Any]] = {}
+        for origin, status, count in conn.execute(
+            hidden + "SELECT origin, status, COUNT(*) FROM hidden JOIN nodes USING (id) GROUP BY origin, status",
+            (depth, depth),
+        ):
+            unloaded.setdefault(origin, {"counts": {}, "archive_refs": []})["counts"][status] = count
+        for origin, ref in conn.execute(
+            hidden + "SELECT origin, archive_ref FROM hidden JOIN nodes USING (id) WHERE archive_ref != ''",
+            (depth, depth),
+        ):
+            unloaded[origin]["archive_refs"].append(ref)
+        return unloaded
+
+    def unloaded(self) -> Dict[str, Dict[str, Any]]:
+        return self._unloaded
+
+    def load_children(self, parent_id: str) -> List["BaseNode | DAPPChildNode"]:
+        from models import BaseNode, DAPPChildNode
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"""
+                WITH RECURSIVE subtree(id) AS (
+                    SELECT id FROM nodes WHERE parent_id = ?
+                    UNION ALL
+                    SELECT n.id FROM nodes n JOIN subtree s ON n.parent_id = s.id
+                )
+                SELECT {self._columns} FROM nodes JOIN subtree USING (id) ORDER BY parent_id, position
+                """,
+                (parent_id,),
+            ).fetchall()
+        self._unloaded.pop(parent_id, None)
+        adapter = TypeAdapter(List[Annotated[Union[BaseNode, DAPPChildNode], Field(discriminator="type")]])
+        return adapter.validate_python(self._assemble(rows))
+
+    @staticmethod
+    def _assemble(rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+        """Link rows (ordered by parent and position) into nested node dicts."""
+        by_id = {row["id"]: _row_to_dict(row) for row in rows}
+        top: List[Dict[str, Any]] = []
+        for row in rows:
+            parent = by_id.get(row["parent_id"])
+            if parent is not None:
+                parent["children"].append(by_id[row["id"]])
+            else:
+                top.append(by_id[row["id"]])
+        return top
+
+    def record(self, op: Dict[str, Any]) -> None:
+        self._ops.append(op)
+
+    def _snapshot(self, data: "AppData", full: bool = False) -> Any:
+        # Rows are kept current op by op, so there is never a whole document to write
+        ops, self._ops = self._ops, []
+        return ops, data.version
+
+    def _write_payloads(self, payloads: List[Any]) -> None:
+        with closing(self._connect()) as conn, conn:
+            for ops, version in payloads:
+                for op in ops:
+                    self._apply(conn, op)
+            self._write_meta(conn, version)
+
+    def _apply(self, conn: sqlite3.Connection, op: Dict[str, Any]) -> None:
+        kind = op["op"]
+        if kind == "set":
+            field = op["field"]
+            if field in LIST_COLUMNS:
+                value = json.dumps(op["value"], ensure_ascii=False)
+            elif field in SCALAR_COLUMNS:
+                value = op["value"]
+            else:
+                return
+            conn.execute(
+                f"UPDATE nodes SET {field} = ?, updated_at = ? WHERE id = ?",
+                (value, op["updated_at"], op["id"]),
+            )
+
+        elif kind == "add":
+            parent_id = op["parent"]
+            if parent_id is not None:
+                conn.execute("UPDATE nodes SET children_type = ? WHERE id = ?", (op["children_type"], parent_id))
+            (position,) = conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM nodes WHERE parent_id IS ?", (parent_id,)
+            ).fetchone()
+            if "index" in op and op["index"] < position:
+                # Inserted between siblings (an undone delete): make room
+                position = op["index"]
+                conn.execute(
+                    "UPDATE nodes SET position = position + 1 WHERE parent_id IS ? AND position >= ?",
+                    (parent_id, position),
+                )
+            conn.executemany(
+                f"INSERT OR REPLACE INTO nodes ({', '.join(NODE_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(NODE_COLUMNS))})",
+                _node_rows(op["node"], parent_id, position),
+            )
+
+        elif kind == "delete":
+            row = conn.execute("SELECT parent_id, position FROM nodes WHERE id = ?", (op["id"],)).fetchone()
+            if row is None:
+                return
+            conn.execute(SUBTREE_IDS + "DELETE FROM nodes WHERE id IN (SELECT id FROM subtree)", (op["id"],))
+            parent_id = row["parent_id"]
+            # Keep positions dense, so list indexes and positions agree
+            conn.execute(
+                "UPDATE nodes SET position = position - 1 WHERE parent_id IS ? AND position > ?",
+                (parent_id, row["position"]),
+            )
+            if parent_id is not None:
+                conn.execute(
+                    "UPDATE nodes SET children_type = 'LEAF' WHERE id = ? "
+                    "AND NOT EXISTS (SELECT 1 FROM nodes WHERE parent_id = ?)",
+                    (parent_id, parent_id),
+                )
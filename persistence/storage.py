@@ -1,65 +1,347 @@
 from __future__ import annotations
 
+import abc
 import asyncio
 import json
+import logging
+import os
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from metrics import STORAGE_ERRORS, STORAGE_SECONDS, STORAGE_WRITES
 
 if TYPE_CHECKING:
     from models import AppData
 
+    from .blobs import BlobStore
 
-class JsonStorage:
-    def __init__(self, file_path: str = "data.json", debounce_ms: int = 500):
-        self.file_path = Path(file_path)
+logger = logging.getLogger(__name__)
+
+# Wait before retrying a failed write, doubled per failure up to the maximum
+RETRY_SECONDS = 0.5
+MAX_RETRY_SECONDS = 30.0
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write text to a temp file, fsync it and rename it over ``path``.
+
+    A crash at any point leaves either the old or the new file, never a
+    truncated one.
+    """
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+
+def atomic_write_bytes(path: Path, data: bytes, sync_directory: bool = True) -> None:
+    """``atomic_write_text`` for bytes.
+
+    With ``sync_directory`` False the rename is not made durable; callers
+    writing many files into few directories sync those once at the end.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if sync_directory:
+        fsync_directory(path.parent)
+
+
+def fsync_directory(path: Path) -> None:
+    """Make renames and new entries in a directory durable (a no-op where directories cannot be opened)."""
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(path, os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def parse_app_data(raw: bytes) -> Tuple["AppData", bool]:
+    """Validate an AppData document from JSON bytes.
+
+    Current-version documents are validated in one pass by pydantic-core.
+    Older ones are upgraded as plain dicts first. Returns the data and
+    whether it was upgraded (and so should be written back).
+    """
+    from models import CURRENT_VERSION, AppData, upgrade_app_data
+
+    try:
+        data = AppData.model_validate_json(raw)
+    except ValidationError:
+        values = json.loads(raw)
+        if values.get("version") == CURRENT_VERSION:
+            raise
+        return AppData.model_validate(upgrade_app_data(values)), True
+    if data.version != CURRENT_VERSION:
+        data.version = CURRENT_VERSION
+        return data, True
+    return data, False
+
+
+class BaseStorage(abc.ABC):
+    """Debounced saving through a background writer thread.
+
+    Saves are debounced on the event loop, but never postponed by more than
+    ``max_delay_ms`` after the first unsaved change. Subclasses capture a
+    snapshot on the loop in ``_snapshot`` and write it to disk on the
+    writer thread in ``_write_payloads``.
+
+    With a ``BlobStore`` attached, node text kept out of the document
+    (board bodies) is written by the same thread, ahead of the snapshot
+    that references it.
+
+    A failed write is retried, with backoff, together with whatever was
+    queued after it: delta storage (journal lines, changed rows) has no
+    later full write to make up for a dropped one. ``_write_payloads``
+    must therefore be safe to repeat after a partial failure.
+
+    A ``read_only`` storage loads without writing anything back: no format
+    upgrade, migration or repair of what it reads. It is for reading data
+    another process owns, e.g. ``cli.py export``.
+    """
+
+    def __init__(self, debounce_ms: int = 500, max_delay_ms: int = 5000, blobs: Optional["BlobStore"] = None,
+                 read_only: bool = False):
         self.debounce_ms = debounce_ms
+        self.max_delay_ms = max_delay_ms
+        self.blobs = blobs
+        self.read_only = read_only
         self._save_task: Optional[asyncio.Task] = None
         self._pending_data: Optional[AppData] = None
+        self._first_pending_at = 0.0
+        self._last_save_call_at = 0.0
+
+        # Writer thread state, guarded by _cond; entries are (blob batch, payload)
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[Dict[str, str], Any]] = []
+        self._writing = False
+        self._writer: Optional[threading.Thread] = None
 
+        # Writer statistics
+        self.save_count = 0
+        self.error_count = 0
+        self.last_save_seconds = 0.0
+        self.max_save_seconds = 0.0
+
+    @abc.abstractmethod
     def load(self) -> "AppData":
-        """Load data from JSON file, return empty AppData if file doesn't exist."""
-        from models import AppData
+        """Read the whole forest, or its top levels for storage that loads partially."""
 
-        if not self.file_path.exists():
-            return AppData()
+    def record(self, op: Dict[str, Any]) -> None:
+        """Receive a single mutation record. Full-document storage ignores it."""
 
-        with open(self.file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return AppData.model_validate(data)
+    def unloaded(self) -> Dict[str, Dict[str, Any]]:
+        """Nodes whose children ``load`` left in storage, only with a partial load.
+
+        Maps each such node's id to ``{"counts": {status: n}, "archive_refs":
+        [...]}`` over its stored descendants, so rollups can count them.
+        """
+        return {}
+
+    def load_children(self, parent_id: str) -> List[Any]:
+        """The children, with their whole subtrees, of a node listed by ``unloaded``."""
+        raise NotImplementedError(f"{type(self).__name__} always loads the whole forest")
+
+    def touch(self, root_id: str) -> None:
+        """Note that the tree under a root changed (or the root was added or deleted).
+
+        Only storage that writes roots separately uses it.
+        """
+
+    @abc.abstractmethod
+    def _snapshot(self, data: "AppData", full: bool = False) -> Any:
+        """Capture what needs writing. Runs on the caller's thread."""
+
+    @abc.abstractmethod
+    def _write_payloads(self, payloads: List[Any]) -> None:
+        """Write queued snapshots, oldest first. Runs on the writer thread."""
 
     def _write_sync(self, data: "AppData") -> None:
         """Synchronous write to file."""
-        data.last_modified = datetime.utcnow()
-        with open(self.file_path, "w", encoding="utf-8") as f:
-            json.dump(data.model_dump(mode="json"), f, ensure_ascii=False, indent=2)
+        if self.blobs is not None:
+            self.blobs.write(self.blobs.take_pending())
+        self._write_payloads([self._snapshot(data)])
+
+    @property
+    def queue_depth(self) -> int:
+        """Snapshots waiting for or being written by the writer thread."""
+        with self._cond:
+            return len(self._queue) + (1 if self._writing else 0)
+
+    @property
+    def disk_bytes(self) -> int:
+        """Bytes the stored data takes on disk (blobs not included)."""
+        return 0
+
+    @property
+    def has_pending(self) -> bool:
+        """Whether a debounced save has not been handed to the writer yet."""
+        return self._pending_data is not None
+
+    def _writer_loop(self) -> None:
+        write_seconds = STORAGE_SECONDS.labels(type(self).__name__, "write")
+        retry_delay = RETRY_SECONDS
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: bool(self._queue))
+                entries, self._queue = self._queue, []
+                self._writing = True
+            started = time.perf_counter()
+            failed = False
+            try:
+                if self.blobs is not None:
+                    for batch, _ in entries:
+                        self.blobs.write(batch)
+                self._write_payloads([payload for _, payload in entries])
+                self.save_count += 1
+                STORAGE_WRITES.inc()
+            except Exception:
+                self.error_count += 1
+                STORAGE_ERRORS.inc()
+                logger.exception("Failed to write %s; retrying in %.1fs", self, retry_delay)
+                failed = True
+            elapsed = time.perf_counter() - started
+            write_seconds.observe(elapsed)
+            self.last_save_seconds = elapsed
+            self.max_save_seconds = max(self.max_save_seconds, elapsed)
+            with self._cond:
+                self._writing = False
+                if failed:
+                    # Ahead of anything queued meanwhile, so records stay in order
+                    self._queue[:0] = entries
+                self._cond.notify_all()
+            if failed:
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, MAX_RETRY_SECONDS)
+            else:
+                retry_delay = RETRY_SECONDS
+
+    def _submit(self, data: "AppData", full: bool = False) -> None:
+        """Snapshot data and hand it to the writer thread."""
+        self._pending_data = None
+        payload = self._snapshot(data, full)
+        batch = self.blobs.take_pending() if self.blobs is not None else {}
+        with self._cond:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name="storage-writer", daemon=True)
+                self._writer.start()
+            self._queue.append((batch, payload))
+            self._cond.notify_all()
 
     async def _debounced_save(self) -> None:
-        """Wait for debounce period then save."""
-        try:
-            await asyncio.sleep(self.debounce_ms / 1000.0)
-            if self._pending_data:
-                self._write_sync(self._pending_data)
-                self._pending_data = None
-        except asyncio.CancelledError:
-            pass
+        """Wait until typing pauses or the maximum delay passes, then save."""
+        while self._pending_data is not None:
+            deadline = min(
+                self._last_save_call_at + self.debounce_ms / 1000.0,
+                self._first_pending_at + self.max_delay_ms / 1000.0,
+            )
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._submit(self._pending_data)
+                return
+            await asyncio.sleep(remaining)
 
     def save(self, data: "AppData") -> None:
         """Schedule a debounced save operation."""
+        now = time.monotonic()
+        if self._pending_data is None:
+            self._first_pending_at = now
         self._pending_data = data
+        self._last_save_call_at = now
 
-        # Cancel any pending save task
+        # A running save task picks up the new deadline by itself
         if self._save_task and not self._save_task.done():
-            self._save_task.cancel()
+            return
 
-        # Schedule new save
         try:
             loop = asyncio.get_running_loop()
             self._save_task = loop.create_task(self._debounced_save())
         except RuntimeError:
             # No running loop, save immediately
-            self._write_sync(data)
+            self._submit(data)
+            self.flush()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Hand over any pending save and wait for the writer to finish.
+
+        Returns False if the writer is still busy after ``timeout`` seconds,
+        or if a write failed meanwhile (the writer keeps retrying it).
+        """
+        if self._pending_data is not None:
+            self._submit(self._pending_data)
+        errors = self.error_count
+        with self._cond:
+            self._cond.wait_for(lambda: (not self._queue and not self._writing) or self.error_count > errors, timeout)
+            return not self._queue and not self._writing
 
     def save_immediate(self, data: "AppData") -> None:
         """Save immediately without debouncing."""
-        self._write_sync(data)
+        self._submit(data, full=True)
+        self.flush()
+
+
+class JsonStorage(BaseStorage):
+    """Whole-document storage in a single JSON file.
+
+    With ``load_workers`` above 1, ``load`` validates the roots in that
+    many processes (see ``parallel``).
+    """
+
+    def __init__(self, file_path: str = "data.json", debounce_ms: int = 500, max_delay_ms: int = 5000,
+                 blobs: Optional["BlobStore"] = None, load_workers: int = 1, read_only: bool = False):
+        super().__init__(debounce_ms, max_delay_ms, blobs, read_only)
+        self.file_path = Path(file_path)
+        self.load_workers = load_workers
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({str(self.file_path)!r})"
+
+    @property
+    def disk_bytes(self) -> int:
+        return self.file_path.stat().st_size if self.file_path.exists() else 0
+
+    def _read_raw(self) -> Optional[Dict[str, Any]]:
+        """Read the JSON document as plain dicts, or None if the file doesn't exist."""
+        if not self.file_path.exists():
+            return None
+
+        with open(self.file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def load(self) -> "AppData":
+        """Load data from JSON file, return empty AppData if file doesn't exist."""
+        from models import AppData
+
+        if not self.file_path.exists():
+            return AppData()
+
+        raw = self.file_path.read_bytes()
+        if self.load_workers > 1:
+            from .parallel import parse_app_data_parallel
+
+            parallel_data = parse_app_data_parallel(raw, self.load_workers)
+            if parallel_data is not None:
+                return parallel_data
+        data, upgraded = parse_app_data(raw)
+        if upgraded and not self.read_only:
+            # Pay the compatibility cost once
+            self._write_payloads([self._snapshot(data, full=True)])
+        return data
+
+    def _serialize(self, data: "AppData") -> str:
+        data.last_modified = datetime.utcnow()
+        with STORAGE_SECONDS.labels(type(self).__name__, "serialize").time():
+            return data.model_dump_json(indent=2)
+
+    def _snapshot(self, data: "AppData", full: bool = False) -> Any:
+        return self._serialize(data)
+
+    def _write_payloads(self, payloads: List[Any]) -> None:
+        # Only the newest whole-document snapshot matters
+        atomic_write_text(self.file_path, payloads[-1])
@@ -1,3 +1,9 @@
-from .app_state import AppState
+from .app_state import REF_FIELDS, AppState, TreeChange
+from .client_state import ClientState
+from .commands import CommandError, apply_commands
+from .node_index import NodeIndex
+from .rollups import Rollup
+from .search import SearchIndex
+from .view_state import ExpandedNodes
 
-__all__ = ['AppState']
+__all__ = ['REF_FIELDS', 'AppState', 'ClientState', 'CommandError', 'ExpandedNodes', 'NodeIndex', 'Rollup', 'SearchIndex', 'TreeChange', 'apply_commands']
@@ -1,70 +1,882 @@
 from __future__ import annotations
 
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Callable, List, Optional, Set, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
-from models import AppData, BaseNode, ChildrenType, DAPPChildNode
-from persistence import JsonStorage
+from pydantic_core import to_jsonable_python
 
-NodeType = Union[BaseNode, DAPPChildNode]
+from metrics import NODE_LOOKUPS, STATE_SECONDS, STORAGE_SECONDS
+from models import AppData, BaseNode, ChildrenType, CompactForest, CompactNode, DAPPChildNode, Status
+from persistence import ArchiveStore, BaseStorage, SnapshotStore
+
+from .history import History
+from .merkle import MerkleIndex
+from .rollups import STATUSES, Rollup, RollupCache
+from .node_index import NodeIndex, Values
+from .search import SEARCH_FIELDS, SearchIndex, dict_tokens, has_words, tokenize
+from .view_state import ExpandedNodes
+
+logger = logging.getLogger(__name__)
+
+NodeType = Union[BaseNode, DAPPChildNode, CompactNode]
+
+# Looked up once per process; find_node_by_id is too hot for a per-call label lookup
+_lookups = NODE_LOOKUPS.labels()
+
+# Free-text fields moved into the storage's blob store when it has one
+BOARD_FIELDS = ("progress_board", "content_board")
+
+# Node fields naming board blobs and archives, which collect_garbage keeps while a snapshot refers to them
+REF_FIELDS = tuple(f"{field}_ref" for field in BOARD_FIELDS) + ("archive_ref",)
+
+# A batch with more changes than this is broadcast as one full rebuild
+BATCH_PATCH_LIMIT = 100
+
+# Statuses of finished nodes, whose old subtrees may be archived
+ARCHIVE_STATUSES = frozenset({Status.COMPLETED, Status.CANCELLED})
+
+
+@dataclass(frozen=True)
+class TreeChange:
+    """A single change to the forest, small enough to patch a view in place.
+
+    ``kind`` is "insert", "remove" or "update". ``parent_id`` is None for
+    root nodes and ``index`` is the position among the parent's children.
+    Updates name the changed ``field``. ``version`` is the document version
+    the change produced and ``origin`` the client that made it, if any.
+    """
+
+    kind: str
+    node_id: str
+    parent_id: Optional[str] = None
+    index: int = -1
+    field: Optional[str] = None
+    version: int = 0
+    origin: Optional[str] = None
+
+
+@dataclass
+class _Batch:
+    """Mutations grouped by ``AppState.batch`` and not yet broadcast or saved."""
+
+    origin: Optional[str]
+    changes: List[Optional[TreeChange]] = field(default_factory=list)
+    inverses: List[Dict[str, Any]] = field(default_factory=list)
+    rolling_back: bool = False
+
+
+@dataclass
+class _IndexBuild:
+    """Changes made while the search index is built off the event loop, replayed when it is installed."""
+
+    # Nodes whose own searchable fields changed
+    updated: Set[str] = field(default_factory=set)
+    # Nodes whose subtree is re-indexed: parents of added or removed
+    # children, new roots, and removed nodes (forgotten if still gone)
+    subtrees: Set[str] = field(default_factory=set)
 
 
 class AppState:
-    def __init__(self, storage: JsonStorage):
+    """The goal forest and every mutation of it.
+
+    One AppState may be shared by many clients (see ClientState). Each
+    mutation bumps ``version``; field updates remember the version that
+    last changed each field, so an edit based on an older version of that
+    field is detected as a conflict instead of overwriting it. Edits to
+    different fields never conflict.
+
+    Every mutation also records its inverse in the undo history of the
+    editor that made it (its ``origin``), at most ``undo_limit`` steps.
+
+    With an ``archive``, old finished subtrees can be moved out of the
+    forest (``archive_finished``), leaving their top node as a stub that
+    keeps their status counts, and put back on demand (``restore_archived``).
+    """
+
+    def __init__(self, storage: BaseStorage, expand_depth: Optional[int] = None, compact: bool = False,
+                 undo_limit: int = 100, archive: Optional[ArchiveStore] = None):
         self.storage = storage
-        self.data: AppData = storage.load()
+        self.archive = archive
+        # In compact mode nodes live in a columnar CompactForest and are
+        # handed out as CompactNode views; pydantic models only exist in storage.
+        self.compact = compact
+        with STORAGE_SECONDS.labels(type(storage).__name__, "load").time():
+            self.data: Union[AppData, CompactForest] = storage.load()
+        if compact:
+            self.data = CompactForest.from_app_data(self.data)
         self.selected_node_id: Optional[str] = None
-        self.expanded_nodes: Set[str] = set()
+        # Nodes less than expand_depth levels deep start expanded (all if None);
+        # each ClientState keeps its own expansion with the same default
+        self.expand_depth = expand_depth
+        self.expanded_nodes = ExpandedNodes(self.node_depth, expand_depth)
+
+        # Document version, bumped by every mutation, and the version that
+        # last changed each (node id, field); untouched fields count as 0
+        self.version = 0
+        self._field_versions: Dict[Tuple[str, str], int] = {}
+
+        # Undo/redo history per origin, and the (origin, direction) being replayed
+        self.undo_limit = undo_limit
+        self._histories: Dict[Optional[str], History] = {}
+        self._replaying: Optional[Tuple[Optional[str], str]] = None
+        # Open batch of mutations, if any
+        self._batch: Optional[_Batch] = None
 
-        # Expand all nodes on initial load
-        self._expand_all_nodes()
+        # id -> node and id -> parent id (None for roots) lookup tables
+        self._index: Dict[str, NodeType] = {}
+        self._parents: Dict[str, Optional[str]] = {}
+        self._rebuild_index()
+        # Nodes whose children a partial load left in storage, with those
+        # descendants' status counts in rollup order; loaded on expand
+        self._unloaded: Dict[str, List[int]] = {
+            node_id: self._stored_counts(hidden) for node_id, hidden in storage.unloaded().items()
+        }
+        # Board text lives in the storage's blob store if it has one
+        self.blobs = storage.blobs
+        if self.blobs is not None:
+            self._externalize_boards()
+        # Full-text index, built in the background or on the first search, and kept current after that
+        self._search_index: Optional[SearchIndex] = None
+        self._search_build: Optional[_IndexBuild] = None
+        # Status, type and time indexes, built on the first query and kept current after that
+        self._node_index: Optional[NodeIndex] = None
+        # Stubs restored this session; they stay live until the next start
+        self._restored: Set[str] = set()
+        # Descendant status counts per node, updated along the ancestor chain
+        self._rollups = RollupCache(self._hidden_counts)
+        self._rollups.build(self.data.roots)
+        # Subtree content hashes for snapshots, recomputed lazily where edits forgot them
+        self._merkle = MerkleIndex(self._parent_id)
 
         # Callbacks for UI updates
         self._on_tree_change: List[Callable[[], None]] = []  # For tree structure changes only
+        self._on_tree_patch: List[Callable[[Optional[TreeChange]], None]] = []
         self._on_selection_change: List[Callable[[], None]] = []
 
-    def _expand_all_nodes(self) -> None:
-        """Collect all node IDs and add to expanded_nodes."""
-        def collect_ids(nodes: List[NodeType]) -> None:
-            for node in nodes:
-                self.expanded_nodes.add(node.id)
-                collect_ids(node.children)
-        collect_ids(self.data.roots)
+    def _rebuild_index(self) -> None:
+        """Build node and parent lookup tables for the whole forest."""
+        if self.compact:
+            return  # CompactForest indexes its own nodes
+        self._index.clear()
+        self._parents.clear()
+        for root in self.data.roots:
+            self._index_subtree(root, None)
+
+    def _index_subtree(self, node: NodeType, parent_id: Optional[str]) -> None:
+        """Register a node and all its descendants in the lookup tables."""
+        if self.compact:
+            return
+        stack = [(node, parent_id)]
+        while stack:
+            current, current_parent = stack.pop()
+            self._index[current.id] = current
+            self._parents[current.id] = current_parent
+            stack.extend((child, current.id) for child in current.children)
+
+    def _unindex_subtree(self, node: NodeType) -> None:
+        """Remove a node and all its descendants from the lookup tables."""
+        if self.compact:
+            return
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self._index.pop(current.id, None)
+            self._parents.pop(current.id, None)
+            stack.extend(current.children)
+
+    def _externalize_boards(self, nodes: Optional[Iterable[NodeType]] = None) -> None:
+        """Move inline board text of ``nodes`` (the roots by default) and their subtrees into the blob store."""
+        assert self.blobs is not None
+        moved = False
+        stack = [(node, self._root_id(node.id)) for node in (self.data.roots if nodes is None else nodes)]
+        while stack:
+            node, root_id = stack.pop()
+            stack.extend((child, root_id) for child in node.children)
+            for field in BOARD_FIELDS:
+                text = getattr(node, field)
+                if not text:
+                    continue
+                ref_field = f"{field}_ref"
+                ref = self.blobs.put(text, replaces=getattr(node, ref_field))
+                for name, value in ((ref_field, ref), (field, "")):
+                    setattr(node, name, value)
+                    # Keep updated_at: moving text is not an edit
+                    self.storage.record({
+                        "op": "set",
+                        "id": node.id,
+                        "field": name,
+                        "value": value,
+                        "updated_at": node.updated_at.isoformat(),
+                    })
+                self.storage.touch(root_id)
+                moved = True
+        if moved:
+            self.storage.save(self.data)
+
+    def _inline_boards(self, node: Dict[str, Any]) -> None:
+        """Put board text back into a node dict and its subtree, so it stands on its own."""
+        if self.blobs is None:
+            return
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            stack.extend(current.get("children", []))
+            for field in BOARD_FIELDS:
+                ref = current.get(f"{field}_ref")
+                if ref:
+                    current[field] = self.blobs.get(ref, cache=False)
+                    current[f"{field}_ref"] = ""
+
+    def _stage_boards(self, node: Dict[str, Any]) -> None:
+        """Move board text of a node dict and its subtree into the blob store, leaving refs."""
+        if self.blobs is None:
+            return
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            stack.extend(current.get("children", []))
+            for field in BOARD_FIELDS:
+                text = current.get(field)
+                if text:
+                    current[f"{field}_ref"] = self.blobs.put(text)
+                    current[field] = ""
+
+    def _field_text(self, node: NodeType, field: str, cache: bool = True) -> str:
+        ref = getattr(node, f"{field}_ref") if field in BOARD_FIELDS else ""
+        if ref and self.blobs is not None:
+            return self.blobs.get(ref, cache)
+        return getattr(node, field)
+
+    def get_board(self, node_id: str, field: str) -> str:
+        """Text of a node's progress_board or content_board, wherever it is kept."""
+        node = self.find_node_by_id(node_id)
+        return self._field_text(node, field) if node is not None else ""
+
+    def prune_boards(self, keep: Iterable[str] = ()) -> int:
+        """Delete board blobs that no node, undo step or ``keep`` refers to. Returns how many were removed."""
+        if self.blobs is None:
+            return 0
+        self._load_all()
+        ref_fields = [f"{field}_ref" for field in BOARD_FIELDS]
+        refs = set(keep) | self._history_values(ref_fields)
+        stack = list(self.data.roots)
+        while stack:
+            node = stack.pop()
+            stack.extend(node.children)
+            refs.update(getattr(node, field) for field in ref_fields)
+        return self.blobs.collect_garbage(refs)
+
+    def _hidden_counts(self, node: NodeType) -> Optional[List[int]]:
+        """Status counts of descendants not in the forest (a stub's archived ones, or ones still in storage)."""
+        unloaded = self._unloaded.get(node.id)
+        if unloaded is not None:
+            return unloaded
+        if not node.archive_ref or self.archive is None:
+            return None
+        counts = self.archive.counts(node.archive_ref)
+        return [counts.get(status.value, 0) for status in STATUSES]
+
+    def _stored_counts(self, hidden: Dict[str, Any]) -> List[int]:
+        """Rollup-order counts from ``BaseStorage.unloaded``, archives under stubs among them included."""
+        counts = [hidden["counts"].get(status.value, 0) for status in STATUSES]
+        for ref in hidden["archive_refs"]:
+            archived = self.archive.counts(ref) if self.archive is not None else {}
+            counts = [count + archived.get(status.value, 0) for count, status in zip(counts, STATUSES)]
+        return counts
+
+    def has_hidden_children(self, node: NodeType) -> bool:
+        """Whether a node has children outside the forest: an archive stub, or a node a partial load stopped at."""
+        return bool(node.archive_ref) or node.id in self._unloaded
+
+    def reveal_children(self, node_id: str) -> bool:
+        """Bring a node's hidden children into the forest, from storage or the archive. False if it had none."""
+        node = self.find_node_by_id(node_id)
+        if node is None:
+            return False
+        if node.id in self._unloaded:
+            self._load_stored_children(node)
+            return True
+        return self.restore_archived(node_id)
+
+    def _load_stored_children(self, node: NodeType) -> None:
+        """Link in the children a partial load left in storage.
+
+        Nothing is recorded or broadcast: storage has them already, the
+        node's and its ancestors' rollups counted them all along, and
+        views show the node as collapsed until it is expanded.
+        """
+        del self._unloaded[node.id]
+        children = [self._new_node(child) for child in self.storage.load_children(node.id)]
+        for child in children:
+            node.children.append(child)
+            self._index_subtree(child, node.id)
+            self._search_add(child, node.id)
+            if self._node_index is not None:
+                self._node_index.add_subtree(child)
+            self._rollups.fill_subtree(child)
+        self._merkle.invalidate(node.id)
+        if self.blobs is not None:
+            self._externalize_boards(children)
+
+    def _load_all(self) -> None:
+        """Load every subtree a partial load left in storage, for work that needs the whole forest."""
+        while self._unloaded:
+            node = self.find_node_by_id(next(iter(self._unloaded)))
+            assert node is not None
+            self._load_stored_children(node)
+
+    def _load_subtree(self, node: NodeType) -> None:
+        """Load what a partial load left in storage anywhere under ``node``."""
+        if not self._unloaded:
+            return
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.id in self._unloaded:
+                self._load_stored_children(current)
+            stack.extend(current.children)
+
+    @staticmethod
+    def _stubs(roots: Iterable[NodeType]) -> List[NodeType]:
+        """Archive stubs among ``roots`` and their descendants."""
+        found = []
+        stack = list(roots)
+        while stack:
+            node = stack.pop()
+            if node.archive_ref:
+                found.append(node)
+            stack.extend(node.children)
+        return found
+
+    def _archivable(self, before: datetime) -> List[NodeType]:
+        """Topmost finished nodes with children whose whole subtree is unchanged since ``before``."""
+        order: List[NodeType] = []
+        stack = list(self.data.roots)
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(node.children)
+        # Newest updated_at per subtree; reversed pre-order finishes children first
+        newest: Dict[str, float] = {}
+        for node in reversed(order):
+            # Descendants still in storage are unknown, so their subtree never qualifies
+            own = float("inf") if node.id in self._unloaded else node.updated_at.timestamp()
+            newest[node.id] = max([own] + [newest[child.id] for child in node.children])
+        cutoff = before.timestamp()
+        found = []
+        stack = list(self.data.roots)
+        while stack:
+            node = stack.pop()
+            if node.id in self._restored:
+                continue  # Brought back this session, so it stays, all of it
+            if node.status in ARCHIVE_STATUSES and node.children and newest[node.id] < cutoff:
+                found.append(node)
+            else:
+                stack.extend(node.children)
+        return found
+
+    @STATE_SECONDS.labels("archive_finished").time()
+    def archive_finished(self, before: datetime) -> int:
+        """Move finished subtrees untouched since ``before`` into the archive.
+
+        A subtree qualifies if its top node is completed or cancelled and
+        no node in it was updated since ``before``. The top node stays in
+        the forest as a stub; its children are written to the archive and
+        unlinked, while the stub's and its ancestors' rollups keep counting
+        them. Subtrees restored this session are left alone. Views get one
+        full rebuild. Returns how many nodes left the forest.
+        """
+        if self.archive is None:
+            return 0
+        moved = sum(self._archive_children(node) for node in self._archivable(before))
+        if moved:
+            if self.selected_node_id is not None and self.find_node_by_id(self.selected_node_id) is None:
+                self.selected_node_id = None
+                self._notify_selection_change()
+            self._next_version()
+            self._notify_tree_change(None)
+        return moved
+
+    def _archive_children(self, node: NodeType) -> int:
+        assert self.archive is not None
+        rollup = self._rollups.get(node.id)
+        assert rollup is not None
+        child_dicts = []
+        for child in node.children:
+            child_dict = child.model_dump(mode="json")
+            # Board blobs may be pruned once no live node refers to them
+            self._inline_boards(child_dict)
+            child_dicts.append(child_dict)
+        # Durable before any record below refers to it
+        ref = self.archive.put(child_dicts, {status.value: count for status, count in rollup.counts.items() if count})
+
+        children = list(node.children)
+        moved = 0
+        for child in children:
+            stack = [child]
+            while stack:
+                moved += 1
+                stack.extend(stack.pop().children)
+            self._rollups.forget_subtree(child)
+            self._merkle.forget_subtree(child)
+            self._unindex_subtree(child)
+            self._search_remove(child, node.id)
+            if self._node_index is not None:
+                self._node_index.remove_subtree(child)
+        self._touch(node.id)
+        for index in reversed(range(len(children))):
+            self.storage.record({"op": "delete", "id": children[index].id})
+            del node.children[index]
+        node.archive_ref = ref
+        # Storage made the node a leaf when its last child went; it is not one
+        for field, value in (("children_type", node.children_type.value), ("archive_ref", ref)):
+            self.storage.record({
+                "op": "set", "id": node.id, "field": field, "value": value,
+                "updated_at": node.updated_at.isoformat(),
+            })
+        return moved
+
+    @STATE_SECONDS.labels("restore_archived").time()
+    def restore_archived(self, node_id: str) -> bool:
+        """Put an archive stub's children back into the forest. Returns False if the node is no stub.
+
+        Broadcast as an update of the stub's ``archive_ref``; views that
+        show the stub collapsed load the children when it is expanded.
+        """
+        node = self.find_node_by_id(node_id)
+        if node is None or not node.archive_ref or self.archive is None:
+            return False
+        child_dicts = self.archive.get(node.archive_ref)
+        node.archive_ref = ""
+        self._restored.add(node_id)
+        for child_dict in child_dicts:
+            self._stage_boards(child_dict)
+            model_cls = DAPPChildNode if child_dict["type"] == "DAPP_Child" else BaseNode
+            child = self._new_node(model_cls.model_validate(child_dict))
+            node.children.append(child)
+            self._index_subtree(child, node_id)
+            self._search_add(child, node_id)
+            if self._node_index is not None:
+                self._node_index.add_subtree(child)
+            # The stub and its ancestors counted these nodes all along
+            self._rollups.fill_subtree(child)
+            self.storage.record({
+                "op": "add", "parent": node_id, "children_type": node.children_type.value,
+                "node": child.model_dump(mode="json"),
+            })
+        self._merkle.invalidate(node_id)
+        self._touch(node_id)
+        self.storage.record({
+            "op": "set", "id": node_id, "field": "archive_ref", "value": "",
+            "updated_at": node.updated_at.isoformat(),
+        })
+        version = self._next_version()
+        self._field_versions[(node_id, "archive_ref")] = version
+        self._notify_tree_change(TreeChange("update", node_id, field="archive_ref", version=version))
+        return True
+
+    def _archive_has(self, ref: str, words: Set[str]) -> bool:
+        """Whether an archive, or one nested in it, holds a node containing every word."""
+        assert self.archive is not None
+        refs, seen = [ref], set()
+        while refs:
+            current_ref = refs.pop()
+            if current_ref in seen or current_ref not in self.archive:
+                continue
+            seen.add(current_ref)
+            stack = self.archive.get(current_ref)
+            while stack:
+                node = stack.pop()
+                if has_words(dict_tokens(node), words):
+                    return True
+                if node.get("archive_ref"):
+                    refs.append(node["archive_ref"])
+                stack.extend(node.get("children", []))
+        return False
+
+    def _restore_matching(self, words: Set[str]) -> None:
+        """Restore every stub whose archived nodes contain all ``words``, down to the matches."""
+        with self.batch():
+            pending = self._stubs(self.data.roots)
+            while pending:
+                node = pending.pop()
+                if self._archive_has(node.archive_ref, words):
+                    self.restore_archived(node.id)
+                    pending.extend(self._stubs(node.children))
+
+    def prune_archive(self, keep: Iterable[str] = ()) -> int:
+        """Delete archives that no stub, undo step or ``keep`` refers to. Returns how many were removed."""
+        if self.archive is None:
+            return 0
+        self._load_all()
+        refs = set(keep) | self._history_values(["archive_ref"])
+        refs.update(node.archive_ref for node in self._stubs(self.data.roots))
+        return self.archive.collect_garbage(refs)
+
+    def collect_garbage(self, snapshot_refs: Iterable[str] = ()) -> int:
+        """Prune board blobs and archives, keeping ``snapshot_refs`` too. Returns how many were removed.
+
+        ``snapshot_refs`` is ``SnapshotStore.referenced_values(REF_FIELDS)``,
+        read once for both stores; it reads every snapshot object, so
+        callers read it off the event loop.
+        """
+        keep = set(snapshot_refs)
+        return self.prune_boards(keep) + self.prune_archive(keep)
+
+    def _history_values(self, fields: List[str]) -> Set[str]:
+        values: Set[str] = set()
+        for history in self._histories.values():
+            values |= history.referenced_values(fields)
+        return values
+
+    @staticmethod
+    def _subscribe(callbacks: List, callback: Callable) -> Callable[[], None]:
+        """Add a callback and return a function that removes it again."""
+        callbacks.append(callback)
+
+        def unsubscribe() -> None:
+            if callback in callbacks:
+                callbacks.remove(callback)
 
-    def subscribe_tree_change(self, callback: Callable[[], None]) -> None:
+        return unsubscribe
+
+    def subscribe_tree_change(self, callback: Callable[[], None]) -> Callable[[], None]:
         """Subscribe to tree structure changes (add/remove nodes)."""
-        self._on_tree_change.append(callback)
+        return self._subscribe(self._on_tree_change, callback)
 
-    def subscribe_selection_change(self, callback: Callable[[], None]) -> None:
-        self._on_selection_change.append(callback)
+    def subscribe_tree_patch(self, callback: Callable[[Optional[TreeChange]], None]) -> Callable[[], None]:
+        """Subscribe to individual changes, field updates included; None means a full rebuild is needed."""
+        return self._subscribe(self._on_tree_patch, callback)
 
-    def _notify_tree_change(self) -> None:
-        """Notify tree structure changed - triggers tree rebuild."""
-        for cb in self._on_tree_change:
-            cb()
+    def subscribe_selection_change(self, callback: Callable[[], None]) -> Callable[[], None]:
+        return self._subscribe(self._on_selection_change, callback)
+
+    def _notify_tree_change(self, change: Optional[TreeChange] = None) -> None:
+        """Notify tree structure changed - triggers tree patch or rebuild."""
+        if self._batch is not None:
+            self._batch.changes.append(change)
+            return
+        # Saved first: a failing view must not keep the change from disk
+        self.storage.save(self.data)
+        self._broadcast(change)
+
+    def _broadcast(self, change: Optional[TreeChange]) -> None:
+        # Copied: a callback may unsubscribe (a client closing) while we iterate.
+        # One failing view must not keep the others from hearing of the change.
+        for cb in list(self._on_tree_change):
+            try:
+                cb()
+            except Exception:
+                logger.exception("Tree change subscriber failed")
+        for patch_cb in list(self._on_tree_patch):
+            try:
+                patch_cb(change)
+            except Exception:
+                logger.exception("Tree patch subscriber failed")
+
+    @contextmanager
+    def batch(self, origin: Optional[str] = None) -> Iterator["AppState"]:
+        """Group mutations into one broadcast, one save and one undo step.
+
+        Changes made inside the block reach subscribers when it ends. Field
+        updates are patched one by one, up to BATCH_PATCH_LIMIT of them;
+        any insert or remove makes it a single full rebuild instead, since
+        views would build inserted nodes from the final forest, children
+        added later in the block included. If the block raises, its
+        mutations are reverted and nothing is broadcast. A nested batch
+        joins the outer one.
+        """
+        if self._batch is not None:
+            yield self
+            return
+        batch = self._batch = _Batch(origin)
+        try:
+            yield self
+        except BaseException:
+            batch.rolling_back = True
+            try:
+                for step in reversed(batch.inverses):
+                    self._apply_step(step)
+            finally:
+                self._batch = None
+                # Views saw nothing; storage has the change and its reversal to write
+                self.storage.save(self.data)
+            raise
+        self._batch = None
+        if batch.inverses:
+            steps = batch.inverses
+            self._record_inverse(origin, steps[0] if len(steps) == 1 else {"op": "batch", "steps": steps})
+        if not batch.changes:
+            return
         self.storage.save(self.data)
+        if len(batch.changes) > BATCH_PATCH_LIMIT or any(
+            change is None or change.kind != "update" for change in batch.changes
+        ):
+            self._broadcast(None)
+        else:
+            for change in batch.changes:
+                self._broadcast(change)
 
     def _save_only(self) -> None:
         """Save data without triggering tree rebuild."""
         self.storage.save(self.data)
 
+    def _next_version(self) -> int:
+        self.version += 1
+        return self.version
+
+    def field_version(self, node_id: str, field: str) -> int:
+        """Document version that last changed a field; pass it back as ``base_version``."""
+        return self._field_versions.get((node_id, field), 0)
+
     def _notify_selection_change(self) -> None:
         for cb in self._on_selection_change:
             cb()
 
     def find_node_by_id(self, node_id: str) -> Optional[NodeType]:
-        """Traverse tree to find node by ID."""
-
-        def search(nodes: List[NodeType]) -> Optional[NodeType]:
-            for node in nodes:
-                if node.id == node_id:
-                    return node
-                result = search(node.children)
-                if result:
-                    return result
+        """Look up a node by ID."""
+        _lookups.inc()
+        if isinstance(self.data, CompactForest):
+            return self.data.get(node_id)
+        return self._index.get(node_id)
+
+    def _parent_id(self, node_id: str) -> Optional[str]:
+        if isinstance(self.data, CompactForest):
+            return self.data.parent_id(node_id)
+        return self._parents.get(node_id)
+
+    @property
+    def node_count(self) -> int:
+        if isinstance(self.data, CompactForest):
+            return len(self.data)
+        return len(self._index)
+
+    def node_depth(self, node_id: str) -> Optional[int]:
+        """Number of ancestors of a node (0 for roots), None for unknown IDs."""
+        if self.find_node_by_id(node_id) is None:
+            return None
+        depth = 0
+        parent_id = self._parent_id(node_id)
+        while parent_id is not None:
+            depth += 1
+            parent_id = self._parent_id(parent_id)
+        return depth
+
+    def get_parent(self, node_id: str) -> Optional[NodeType]:
+        """Return the parent of a node, or None for roots and unknown IDs."""
+        parent_id = self._parent_id(node_id)
+        return self.find_node_by_id(parent_id) if parent_id else None
+
+    def iter_ancestors(self, node_id: str) -> Iterator[NodeType]:
+        """Yield the ancestors of a node, nearest first."""
+        parent_id = self._parent_id(node_id)
+        while parent_id:
+            parent = self.find_node_by_id(parent_id)
+            assert parent is not None
+            yield parent
+            parent_id = self._parent_id(parent_id)
+
+    def _ancestor_ids(self, node_id: str) -> List[str]:
+        return [ancestor.id for ancestor in self.iter_ancestors(node_id)]
+
+    def _root_id(self, node_id: str) -> str:
+        root_id = node_id
+        parent_id = self._parent_id(root_id)
+        while parent_id:
+            root_id, parent_id = parent_id, self._parent_id(parent_id)
+        return root_id
+
+    def _touch(self, node_id: str) -> None:
+        """Tell storage which root tree a change to a (still linked) node falls in."""
+        self.storage.touch(self._root_id(node_id))
+
+    def get_rollup(self, node_id: str) -> Optional[Rollup]:
+        """Status counts and completion over a node's descendants."""
+        return self._rollups.get(node_id)
+
+    @STATE_SECONDS.labels("search").time()
+    def search(self, query: str, limit: int = 50, archived: bool = False) -> List[NodeType]:
+        """Nodes whose text contains every word of the query, name matches first.
+
+        With ``archived``, archives are searched too (reading each one) and
+        the subtrees holding matches are restored into the forest first.
+        """
+        if archived and self.archive is not None and tokenize(query):
+            self._restore_matching(tokenize(query))
+        # Nodes still in storage are searched too
+        self._load_all()
+        if self._search_index is None:
+            # Not built in the background (yet): build it here
+            self._search_build = None
+            self._search_index = self._new_search_index()
+            for root in self.data.roots:
+                self._search_index.add_subtree(root)
+
+        words = tokenize(query)
+        nodes = [node for node in map(self.find_node_by_id, self._search_index.search(query, limit)) if node]
+
+        def name_miss(node: NodeType) -> bool:
+            return not has_words(tokenize(node.name), words)
+
+        nodes.sort(key=lambda node: (name_miss(node), node.name))
+        return nodes
+
+    def _new_search_index(self) -> SearchIndex:
+        # Bulk reads of board blobs bypass the cache the boards panel uses
+        return SearchIndex(lambda node, field: self._field_text(node, field, cache=False))
+
+    def begin_search_index(self) -> Optional[Callable[[], Callable[[], None]]]:
+        """Start building the search index, so the first search need not read every board.
+
+        Returns None if there is an index already. Otherwise returns the
+        build, which reads the forest and the board blobs and may run on a
+        worker thread; it returns the function that installs the index,
+        to be called back on the event loop. Edits made in between are
+        replayed onto the index when it is installed.
+        """
+        if self._search_index is not None or self._search_build is not None:
             return None
+        self._load_all()
+        build = self._search_build = _IndexBuild()
+        roots = list(self.data.roots)
 
-        return search(self.data.roots)
+        def run() -> Callable[[], None]:
+            index = self._new_search_index()
+            for root in roots:
+                index.add_subtree(root)
+            return lambda: self._install_search_index(index, build)
+
+        return run
+
+    def _install_search_index(self, index: SearchIndex, build: _IndexBuild) -> None:
+        if self._search_build is not build:
+            return  # superseded: a search built one, or a snapshot was restored
+        self._search_build = None
+        for node_id in build.subtrees:
+            node = self.find_node_by_id(node_id)
+            if node is not None:
+                index.add_subtree(node)
+            else:
+                index.remove(node_id)
+        for node_id in build.updated - build.subtrees:
+            node = self.find_node_by_id(node_id)
+            if node is not None:
+                index.update(node)
+            else:
+                index.remove(node_id)
+        self._search_index = index
+
+    def _search_add(self, node: NodeType, parent_id: Optional[str]) -> None:
+        if self._search_index is not None:
+            self._search_index.add_subtree(node)
+        elif self._search_build is not None:
+            # The parent's whole subtree: the build may have skipped siblings as the list shifted
+            self._search_build.subtrees.add(parent_id if parent_id is not None else node.id)
+
+    def _search_remove(self, node: NodeType, parent_id: Optional[str]) -> None:
+        if self._search_index is not None:
+            self._search_index.remove_subtree(node)
+        elif self._search_build is not None:
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                self._search_build.subtrees.add(current.id)
+                stack.extend(current.children)
+            if parent_id is not None:
+                self._search_build.subtrees.add(parent_id)
+
+    def _search_update(self, node: NodeType) -> None:
+        if self._search_index is not None:
+            self._search_index.update(node)
+        elif self._search_build is not None:
+            self._search_build.updated.add(node.id)
+
+    @STATE_SECONDS.labels("query").time()
+    def query(
+        self,
+        status: Values = None,
+        children_type: Values = None,
+        node_type: Values = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        updated_after: Optional[datetime] = None,
+        updated_before: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[str]:
+        """IDs of nodes by status, children_type, node type and time range (see NodeIndex.query).
+
+        E.g. stale in-progress leaves:
+        ``query(status=Status.IN_PROGRESS, children_type=ChildrenType.LEAF, updated_before=week_ago)``
+        """
+        self._load_all()
+        if self._node_index is None:
+            self._node_index = NodeIndex()
+            self._node_index.build(self.data.roots)
+        return self._node_index.query(
+            status, children_type, node_type, created_after, created_before, updated_after, updated_before, limit
+        )
+
+    def subtree_hash(self, node_id: str) -> Optional[str]:
+        """Content hash of a node and everything below it."""
+        node = self.find_node_by_id(node_id)
+        return self._merkle.hash(node) if node is not None else None
+
+    @STATE_SECONDS.labels("create_snapshot").time()
+    def create_snapshot(self, store: SnapshotStore, label: str = "") -> str:
+        """Save the forest as it is now; only subtrees changed since the last snapshot are written."""
+        roots, objects = self.prepare_snapshot(store)
+        return store.write_snapshot(roots, objects, label)
+
+    def prepare_snapshot(self, store: SnapshotStore) -> Tuple[List[str], Dict[str, bytes]]:
+        """The forest's root hashes and the objects ``store`` lacks, for ``store.write_snapshot``.
+
+        Reads the forest, so it must run where mutations do; the write may
+        then happen on another thread.
+        """
+        self._load_all()
+        return self._merkle.missing_objects(store, self.data.roots)
+
+    @STATE_SECONDS.labels("restore_snapshot").time()
+    def restore_snapshot(self, store: SnapshotStore, snapshot_id: str) -> None:
+        """Replace the whole forest with a snapshot.
+
+        Storage records the swap as deletes of the current roots and adds
+        of the snapshot's. Undo histories are dropped, since their steps
+        refer to the replaced forest.
+        """
+        roots = store.load(snapshot_id)
+        for root in self.data.roots:
+            self.storage.record({"op": "delete", "id": root.id})
+            self.storage.touch(root.id)
+        for root in roots:
+            self.storage.record({"op": "add", "parent": None, "node": root})
+            self.storage.touch(root["id"])
+        data = AppData(version=self.data.version, last_modified=self.data.last_modified, roots=roots)
+        self.data = CompactForest.from_app_data(data) if self.compact else data
+        self._rebuild_index()
+        self._unloaded.clear()
+        self._search_index = None
+        self._search_build = None
+        self._node_index = None
+        self._rollups.build(self.data.roots)
+        self._merkle.clear()
+        self._field_versions.clear()
+        self._histories.clear()
+        self._next_version()
+        if self.selected_node_id is not None and self.find_node_by_id(self.selected_node_id) is None:
+            self.selected_node_id = None
+            self._notify_selection_change()
+        self._notify_tree_change(None)
+
+    def _new_node(self, node: NodeType) -> NodeType:
+        """Move a freshly created model into the compact store if one is used."""
+        if isinstance(self.data, CompactForest) and not isinstance(node, CompactNode):
+            return self.data.adopt(node)
+        return node
 
     def get_selected_node(self) -> Optional[NodeType]:
         if not self.selected_node_id:
@@ -81,19 +893,123 @@ class AppState:
         else:
             self.expanded_nodes.add(node_id)
 
-    def add_root_node(self, name: str = "New Goal") -> BaseNode:
-        node = BaseNode(name=name)
-        self.data.roots.append(node)
+    def history(self, origin: Optional[str] = None) -> History:
+        """Undo/redo history of one editor (None: edits made without an origin)."""
+        history = self._histories.get(origin)
+        if history is None:
+            history = self._histories[origin] = History(self.undo_limit)
+        return history
+
+    def drop_history(self, origin: Optional[str]) -> None:
+        self._histories.pop(origin, None)
+
+    def _record_inverse(self, origin: Optional[str], inverse: Dict[str, Any]) -> None:
+        if self._batch is not None:
+            if not self._batch.rolling_back:
+                self._batch.inverses.append(inverse)
+            return
+        if self._replaying is not None:
+            owner, direction = self._replaying
+            self.history(owner).record(inverse, direction)
+        else:
+            self.history(origin).record(inverse)
+
+    @STATE_SECONDS.labels("undo").time()
+    def undo(self, origin: Optional[str] = None) -> bool:
+        """Revert the last change made by ``origin``. Returns False if there was none or it no longer applies."""
+        return self._replay(origin, "undo")
+
+    @STATE_SECONDS.labels("redo").time()
+    def redo(self, origin: Optional[str] = None) -> bool:
+        """Re-apply the last change undone by ``origin``."""
+        return self._replay(origin, "redo")
+
+    def _replay(self, origin: Optional[str], direction: str) -> bool:
+        history = self._histories.get(origin)
+        step = history.pop(direction) if history is not None else None
+        if step is None:
+            return False
+        # The replayed change goes out without an origin, so every view,
+        # the replaying client's own panels included, shows it
+        self._replaying = (origin, direction)
+        try:
+            return self._apply_step(step)
+        finally:
+            self._replaying = None
+
+    def _apply_step(self, step: Dict[str, Any]) -> bool:
+        """Apply one inverse operation; a batch step reverts its steps last to first."""
+        if step["op"] == "set":
+            return self.update_node_field(
+                step["id"], step["field"], step["value"], base_version=step["version"]
+            ) is not None
+        if step["op"] == "delete":
+            return self.delete_node(step["id"])
+        if step["op"] == "batch":
+            with self.batch():
+                applied = [self._apply_step(sub_step) for sub_step in reversed(step["steps"])]
+            return any(applied)
+        return self._restore_subtree(step)
+
+    def _restore_subtree(self, step: Dict[str, Any]) -> bool:
+        """Put a deleted subtree back where it was."""
+        parent = self.find_node_by_id(step["parent"]) if step["parent"] is not None else None
+        if step["parent"] is not None and parent is None:
+            return False  # Parent deleted in the meantime
+        if self.find_node_by_id(step["node"]["id"]) is not None:
+            return False
+        if parent is not None and parent.id in self._unloaded:
+            self._load_stored_children(parent)
+        model_cls = DAPPChildNode if step["node"]["type"] == "DAPP_Child" else BaseNode
+        node = self._new_node(model_cls.model_validate(step["node"]))
+        if parent is not None:
+            parent.children_type = ChildrenType(step["children_type"])
+        siblings = self.data.roots if parent is None else parent.children
+        self._attach(node, parent, min(step["index"], len(siblings)), None)
+        return True
+
+    def _attach(self, node: NodeType, parent: Optional[NodeType], index: int, origin: Optional[str]) -> None:
+        """Link a new node (and its subtree) into the forest and broadcast the insert."""
+        siblings = self.data.roots if parent is None else parent.children
+        siblings.insert(index, node)
+        parent_id = parent.id if parent is not None else None
+        self._index_subtree(node, parent_id)
+        self._search_add(node, parent_id)
+        if self._node_index is not None:
+            self._node_index.add_subtree(node)
+            if parent is not None:
+                self._node_index.update(parent)  # children_type may have left LEAF
+        self._rollups.add_subtree(node, self._ancestor_ids(node.id))
+        self._merkle.invalidate(parent_id)
+        op: Dict[str, Any] = {"op": "add", "parent": parent_id, "node": node.model_dump(mode="json")}
+        if parent is not None:
+            op["children_type"] = parent.children_type.value
+        if index != len(siblings) - 1:
+            op["index"] = index
+        self.storage.record(op)
+        self._touch(node.id)
+        self._record_inverse(origin, {"op": "delete", "id": node.id})
+        self._notify_tree_change(TreeChange(
+            "insert", node.id, parent_id, index, version=self._next_version(), origin=origin
+        ))
+
+    @STATE_SECONDS.labels("add_root_node").time()
+    def add_root_node(self, name: str = "New Goal", origin: Optional[str] = None) -> BaseNode:
+        node = self._new_node(BaseNode(name=name))
         self.expanded_nodes.add(node.id)
-        self._notify_tree_change()
+        self._attach(node, None, len(self.data.roots), origin)
         return node
 
+    @STATE_SECONDS.labels("add_child_to_node").time()
     def add_child_to_node(
-        self, parent_id: str, children_type: ChildrenType
+        self, parent_id: str, children_type: ChildrenType, origin: Optional[str] = None
     ) -> Optional[NodeType]:
         parent = self.find_node_by_id(parent_id)
         if not parent:
             return None
+        # The new child goes after all stored ones
+        if parent_id in self._unloaded:
+            self._load_stored_children(parent)
 
         # Set children_type if this is first child (was LEAF)
         if parent.children_type == ChildrenType.LEAF:
@@ -101,57 +1017,112 @@ class AppState:
 
         # Create appropriate child type
         if parent.children_type == ChildrenType.RRTD:
-            child: NodeType = BaseNode(name="New Subgoal")
+            child: NodeType = self._new_node(BaseNode(name="New Subgoal"))
         else:  # DAPP
-            child = DAPPChildNode(name="New Strategy", atp=[""])
+            child = self._new_node(DAPPChildNode(name="New Strategy", atp=[""]))
 
-        parent.children.append(child)
         self.expanded_nodes.add(parent_id)  # Auto-expand parent
         self.expanded_nodes.add(child.id)
-        self._notify_tree_change()
+        self._attach(child, parent, len(parent.children), origin)
         return child
 
+    @STATE_SECONDS.labels("update_node_field").time()
     def update_node_field(
-        self, node_id: str, field: str, value: object, refresh_tree: bool = False
-    ) -> None:
+        self, node_id: str, field: str, value: object,
+        base_version: Optional[int] = None, origin: Optional[str] = None,
+    ) -> Optional[int]:
+        """Set one field and broadcast the change.
+
+        ``base_version`` is the field version the caller's value was based
+        on (from ``field_version``). If the field has changed since, the
+        write is rejected as a conflict. Returns the field's version after
+        the call, or None if the node is gone or the write conflicted.
+        """
         node = self.find_node_by_id(node_id)
         if node and hasattr(node, field):
+            text_field = field
+            current_version = self.field_version(node_id, field)
+            if self._field_text(node, field) == value:
+                return current_version  # Nothing to change, e.g. an echo of a remote update
+            if base_version is not None and base_version < current_version:
+                return None
+            old_value = self._field_text(node, field)
+            if field in BOARD_FIELDS and self.blobs is not None:
+                # Stage the text as a blob; the node and its record carry only the ref
+                ref_field = f"{field}_ref"
+                field, value = ref_field, self.blobs.put(str(value), replaces=getattr(node, ref_field))
+            if field == "status":
+                self._rollups.change_status(node.status, value, self._ancestor_ids(node_id))
             setattr(node, field, value)
             # Update updated_at timestamp
             node.updated_at = datetime.now()
-            if refresh_tree:
-                self._notify_tree_change()
-            else:
-                self._save_only()
+            self._merkle.invalidate(node_id)
+            if text_field in SEARCH_FIELDS:
+                self._search_update(node)
+            if self._node_index is not None:
+                self._node_index.update(node)
+            self._touch(node_id)
+            self.storage.record({
+                "op": "set",
+                "id": node_id,
+                "field": field,
+                "value": to_jsonable_python(value),
+                "updated_at": node.updated_at.isoformat(),
+            })
+            version = self._next_version()
+            self._field_versions[(node_id, text_field)] = version
+            self._record_inverse(origin, {
+                "op": "set", "id": node_id, "field": text_field, "value": old_value,
+                "version": version, "at": time.monotonic(),
+            })
+            if self._replaying is not None:
+                origin = None
+            self._notify_tree_change(TreeChange("update", node_id, field=text_field, version=version, origin=origin))
+            return version
+        return None
 
-    def delete_node(self, node_id: str) -> bool:
+    @STATE_SECONDS.labels("delete_node").time()
+    def delete_node(self, node_id: str, origin: Optional[str] = None) -> bool:
         """Delete a node and all its children. Returns True if deleted."""
-        # Check if it's a root node
-        for i, node in enumerate(self.data.roots):
-            if node.id == node_id:
-                self.data.roots.pop(i)
-                if self.selected_node_id == node_id:
-                    self.selected_node_id = None
-                    self._notify_selection_change()
-                self._notify_tree_change()
-                return True
-
-        # Search in children
-        def remove_from_parent(nodes: List[NodeType]) -> bool:
-            for parent in nodes:
-                for i, child in enumerate(parent.children):
-                    if child.id == node_id:
-                        parent.children.pop(i)
-                        # If no children left, reset to LEAF
-                        if not parent.children:
-                            parent.children_type = ChildrenType.LEAF
-                        if self.selected_node_id == node_id:
-                            self.selected_node_id = None
-                            self._notify_selection_change()
-                        self._notify_tree_change()
-                        return True
-                if remove_from_parent(parent.children):
-                    return True
+        node = self.find_node_by_id(node_id)
+        if node is None:
             return False
 
-        return remove_from_parent(self.data.roots)
+        # Undo needs the whole subtree, descendants still in storage included
+        self._load_subtree(node)
+        parent = self.get_parent(node_id)
+        siblings = self.data.roots if parent is None else parent.children
+        # Match by ID; pydantic equality would compare whole subtrees
+        index = next(i for i, n in enumerate(siblings) if n.id == node_id)
+        # Undo puts the whole subtree back at the same place
+        self._record_inverse(origin, {
+            "op": "add",
+            "parent": parent.id if parent is not None else None,
+            "index": index,
+            "children_type": parent.children_type.value if parent is not None else None,
+            "node": node.model_dump(mode="json"),
+        })
+        # Unindex first: a compact store frees the subtree on removal
+        self._touch(node_id)
+        self._rollups.remove_subtree(node, self._ancestor_ids(node_id))
+        self._merkle.forget_subtree(node)
+        self._unindex_subtree(node)
+        self._search_remove(node, parent.id if parent is not None else None)
+        if self._node_index is not None:
+            self._node_index.remove_subtree(node)
+        del siblings[index]
+        # If no children left, reset to LEAF
+        if parent is not None and not parent.children:
+            parent.children_type = ChildrenType.LEAF
+            if self._node_index is not None:
+                self._node_index.update(parent)
+        self.storage.record({"op": "delete", "id": node_id})
+
+        if self.selected_node_id is not None and self.find_node_by_id(self.selected_node_id) is None:
+            self.selected_node_id = None
+            self._notify_selection_change()
+        self._notify_tree_change(TreeChange(
+            "remove", node_id, parent.id if parent else None, index, version=self._next_version(),
+            origin=None if self._replaying is not None else origin,
+        ))
+        return True
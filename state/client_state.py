@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from typing import Any, Callable, ContextManager, List, MutableMapping, Optional
+from uuid import uuid4
+
+from models import ChildrenType
+
+from .app_state import AppState, NodeType, TreeChange
+from .view_state import ExpandedNodes
+
+
+class ClientState:
+    """One browser client's view of an AppState shared by all clients.
+
+    Selection and expansion belong to the client; everything else reads
+    through to the shared document. Given a ``view`` mapping (e.g. the
+    tab's session storage), the selection and the expansion exceptions are
+    kept there in compact form and restored from it, so a reload shows the
+    same view. Mutations are tagged with
+    ``client_id`` so views can tell their own changes from other clients',
+    and every shared change is passed on to this client's subscribers as
+    a delta.
+    """
+
+    def __init__(
+        self, shared: AppState, client_id: Optional[str] = None, view: Optional[MutableMapping[str, Any]] = None
+    ):
+        self.shared = shared
+        self.client_id = client_id or str(uuid4())
+        self._view = view if view is not None else {}
+        selected = self._view.get("selected")
+        self.selected_node_id: Optional[str] = (
+            selected if isinstance(selected, str) and shared.find_node_by_id(selected) is not None else None
+        )
+        expanded = self._view.get("expanded")
+        self.expanded_nodes = ExpandedNodes.from_dict(
+            expanded if isinstance(expanded, dict) else {}, shared.node_depth, shared.expand_depth,
+            on_change=self._save_view,
+        )
+        # Nodes deleted since the view was saved
+        self.expanded_nodes.forget(lambda node_id: shared.find_node_by_id(node_id) is not None)
+        self._on_tree_patch: List[Callable[[Optional[TreeChange]], None]] = []
+        self._on_selection_change: List[Callable[[], None]] = []
+        self._unsubscribe: Optional[Callable[[], None]] = shared.subscribe_tree_patch(self._on_shared_change)
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes not found on the client itself
+        return getattr(self.shared, name)
+
+    def close(self) -> None:
+        """Stop receiving changes; call when the client disconnects for good."""
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        self.shared.drop_history(self.client_id)
+        self._on_tree_patch.clear()
+        self._on_selection_change.clear()
+
+    def _save_view(self) -> None:
+        self._view["selected"] = self.selected_node_id
+        self._view["expanded"] = self.expanded_nodes.to_dict()
+
+    def _on_shared_change(self, change: Optional[TreeChange]) -> None:
+        # The selected node may have been deleted, here or by another client
+        if self.selected_node_id is not None and self.shared.find_node_by_id(self.selected_node_id) is None:
+            self.select_node(None)
+        for callback in list(self._on_tree_patch):
+            callback(change)
+
+    def subscribe_tree_patch(self, callback: Callable[[Optional[TreeChange]], None]) -> Callable[[], None]:
+        return self.shared._subscribe(self._on_tree_patch, callback)
+
+    def subscribe_selection_change(self, callback: Callable[[], None]) -> Callable[[], None]:
+        return self.shared._subscribe(self._on_selection_change, callback)
+
+    def get_selected_node(self) -> Optional[NodeType]:
+        if not self.selected_node_id:
+            return None
+        return self.shared.find_node_by_id(self.selected_node_id)
+
+    def select_node(self, node_id: Optional[str]) -> None:
+        self.selected_node_id = node_id
+        self._save_view()
+        for callback in list(self._on_selection_change):
+            callback()
+
+    def toggle_expanded(self, node_id: str) -> None:
+        if node_id in self.expanded_nodes:
+            self.expanded_nodes.discard(node_id)
+        else:
+            self.expanded_nodes.add(node_id)
+
+    def add_root_node(self, name: str = "New Goal") -> NodeType:
+        node = self.shared.add_root_node(name, origin=self.client_id)
+        self.expanded_nodes.add(node.id)
+        return node
+
+    def add_child_to_node(self, parent_id: str, children_type: ChildrenType) -> Optional[NodeType]:
+        self.expanded_nodes.add(parent_id)  # Auto-expand parent
+        child = self.shared.add_child_to_node(parent_id, children_type, origin=self.client_id)
+        if child is not None:
+            self.expanded_nodes.add(child.id)
+        return child
+
+    def update_node_field(
+        self, node_id: str, field: str, value: object, base_version: Optional[int] = None
+    ) -> Optional[int]:
+        return self.shared.update_node_field(node_id, field, value, base_version, origin=self.client_id)
+
+    def delete_node(self, node_id: str) -> bool:
+        return self.shared.delete_node(node_id, origin=self.client_id)
+
+    def batch(self) -> ContextManager[AppState]:
+        """Group this client's mutations into one broadcast, save and undo step."""
+        return self.shared.batch(self.client_id)
+
+    def undo(self) -> bool:
+        """Revert this client's last change."""
+        return self.shared.undo(self.client_id)
+
+    def redo(self) -> bool:
+        return self.shared.redo(self.client_id)
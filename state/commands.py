@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from typing import Annotated, Any, Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from models import BaseNode, ChildrenType, DAPPChildNode
+
+from .app_state import AppState
+
+# Fields set by the app itself, never by a command
+READ_ONLY_FIELDS = frozenset({
+    "id", "type", "children", "children_type", "created_at", "updated_at", "progress_board_ref", "content_board_ref",
+    "archive_ref",
+})
+
+_adapters: Dict[Tuple[str, str], TypeAdapter] = {}
+
+
+class CommandError(ValueError):
+    """A command that cannot be applied; ``index`` is its position in the batch."""
+
+    def __init__(self, index: int, message: str):
+        self.index = index
+        super().__init__(f"command {index}: {message}")
+
+
+def _field_adapter(node_type: str, field: str) -> Optional[TypeAdapter]:
+    """Validator for one node field, with the model's constraints (e.g. ATP not empty)."""
+    key = (node_type, field)
+    if key not in _adapters:
+        model = DAPPChildNode if node_type == "DAPP_Child" else BaseNode
+        info = model.model_fields.get(field)
+        if info is None or field in READ_ONLY_FIELDS:
+            return None
+        annotation = Annotated[(info.annotation, *info.metadata)] if info.metadata else info.annotation
+        _adapters[key] = TypeAdapter(annotation)
+    return _adapters[key]
+
+
+def apply_commands(state: AppState, commands: List[Dict[str, Any]], origin: Optional[str] = None) -> Dict[str, Any]:
+    """Apply commands in one ``AppState.batch``: all of them, or none if one fails.
+
+    Commands are dicts with an ``op``:
+
+    - ``add_root``: ``name``
+    - ``add_child``: ``parent``, ``children_type`` ("RRTD"/"DAPP", used if the parent is a leaf)
+    - ``set``: ``id``, ``field``, ``value``, optionally ``base_version``
+    - ``delete``: ``id``
+
+    ``add_root`` and ``add_child`` take optional ``fields`` to set on the
+    new node and a ``ref`` name; later commands may use ``"$name"`` for
+    the new node's id. Returns the document ``version``, the ids of named
+    nodes (``refs``) and a list with the id or field version each command
+    produced. Raises CommandError, after rolling back, on the first
+    command that fails.
+    """
+    refs: Dict[str, str] = {}
+    results: List[Any] = []
+
+    def node_id(index: int, value: Any) -> str:
+        if not isinstance(value, str):
+            raise CommandError(index, f"expected a node id, got {value!r}")
+        if value.startswith("$"):
+            if value[1:] not in refs:
+                raise CommandError(index, f"unknown ref {value}")
+            return refs[value[1:]]
+        return value
+
+    def set_field(index: int, target: str, field: str, value: Any, base_version: Optional[int] = None) -> int:
+        node = state.find_node_by_id(target)
+        if node is None:
+            raise CommandError(index, f"no node {target}")
+        adapter = _field_adapter(node.type, field)
+        if adapter is None:
+            raise CommandError(index, f"{node.type} node has no settable field {field!r}")
+        try:
+            value = adapter.validate_python(value)
+        except ValidationError as exc:
+            raise CommandError(index, f"invalid {field}: {exc.errors()[0]['msg']}") from None
+        version = state.update_node_field(target, field, value, base_version, origin=origin)
+        if version is None:
+            raise CommandError(index, f"{field} of {target} changed since version {base_version}")
+        return version
+
+    with state.batch(origin):
+        for index, command in enumerate(commands):
+            if not isinstance(command, dict):
+                raise CommandError(index, "expected an object")
+            op = command.get("op")
+            if op in ("add_root", "add_child"):
+                if op == "add_root":
+                    name = command.get("name", "New Goal")
+                    if not isinstance(name, str):
+                        raise CommandError(index, f"name must be a string, got {name!r}")
+                    node = state.add_root_node(name, origin=origin)
+                else:
+                    parent_id = node_id(index, command.get("parent"))
+                    try:
+                        children_type = ChildrenType(command.get("children_type", ChildrenType.RRTD.value))
+                    except ValueError:
+                        raise CommandError(index, f"invalid children_type {command.get('children_type')!r}") from None
+                    if children_type == ChildrenType.LEAF:
+                        raise CommandError(index, "children_type must be RRTD or DAPP")
+                    child = state.add_child_to_node(parent_id, children_type, origin=origin)
+                    if child is None:
+                        raise CommandError(index, f"no node {parent_id}")
+                    node = child
+                fields = command.get("fields") or {}
+                if not isinstance(fields, dict):
+                    raise CommandError(index, "fields must be an object")
+                for field, value in fields.items():
+                    set_field(index, node.id, field, value)
+                if command.get("ref"):
+                    refs[str(command["ref"])] = node.id
+                results.append(node.id)
+            elif op == "set":
+                results.append(set_field(
+                    index, node_id(index, command.get("id")), str(command.get("field")), command.get("value"),
+                    command.get("base_version"),
+                ))
+            elif op == "delete":
+                target = node_id(index, command.get("id"))
+                if not state.delete_node(target, origin=origin):
+                    raise CommandError(index, f"no node {target}")
+                results.append(target)
+            else:
+                raise CommandError(index, f"unknown op {op!r}")
+
+    return {"version": state.version, "refs": refs, "results": results}
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional, Set
+
+# Edits of the same field closer together than this are one undo step
+COALESCE_SECONDS = 2.0
+
+
+class History:
+    """Undo and redo stacks of inverse operations for one editor.
+
+    A step is the operation that reverts a change, in the same dict shape
+    as storage mutation records: ``set`` with the old value, ``delete`` of
+    an added node, or ``add`` of a deleted subtree at its old position.
+    A ``batch`` step holds the ``steps`` of one ``AppState.batch``.
+    A step costs memory in proportion to what it reverts, and each stack
+    holds at most ``limit`` steps; the oldest are dropped first.
+    """
+
+    def __init__(self, limit: int = 100):
+        self.limit = limit
+        self._undo: Deque[Dict[str, Any]] = deque(maxlen=limit)
+        self._redo: Deque[Dict[str, Any]] = deque(maxlen=limit)
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def record(self, inverse: Dict[str, Any], replaying: Optional[str] = None) -> None:
+        """Store the inverse of a change.
+
+        ``replaying`` is None for a new edit, or "undo"/"redo" when the
+        change itself came from undoing or redoing a step.
+        """
+        if replaying == "undo":
+            self._redo.append(inverse)
+            return
+        if replaying == "redo":
+            self._undo.append(inverse)
+            return
+
+        self._redo.clear()
+        top = self._undo[-1] if self._undo else None
+        if (
+            top is not None
+            and inverse["op"] == "set"
+            and top["op"] == "set"
+            and top["id"] == inverse["id"]
+            and top["field"] == inverse["field"]
+            and inverse["at"] - top["at"] < COALESCE_SECONDS
+        ):
+            # Still typing into the same field: keep the value from before the burst
+            top["version"] = inverse["version"]
+            top["at"] = inverse["at"]
+            return
+        self._undo.append(inverse)
+
+    def pop(self, direction: str) -> Optional[Dict[str, Any]]:
+        """Take the next step to undo ("undo") or redo ("redo"), if any."""
+        stack = self._undo if direction == "undo" else self._redo
+        return stack.pop() if stack else None
+
+    def referenced_values(self, fields: Iterable[str]) -> Set[str]:
+        """Every value of the given node fields a step would put back, e.g. board blob refs to keep."""
+        fields = set(fields)
+        values: Set[str] = set()
+        steps = [*self._undo, *self._redo]
+        while steps:
+            step = steps.pop()
+            if step["op"] == "batch":
+                steps.extend(step["steps"])
+            elif step["op"] == "set" and step["field"] in fields and step["value"]:
+                values.add(step["value"])
+            elif step["op"] == "add":
+                nodes = [step["node"]]
+                while nodes:
+                    node = nodes.pop()
+                    values.update(node[field] for field in fields if node.get(field))
+                    nodes.extend(node.get("children", ()))
+        return values
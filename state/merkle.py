@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from persistence.snapshots import SnapshotStore, encode_object, object_hash
+
+
+def node_object(node: Any, child_hashes: List[str]) -> bytes:
+    return encode_object(node.model_dump(mode="json", exclude={"children"}), child_hashes)
+
+
+class MerkleIndex:
+    """Subtree hashes for every node, recomputed only where something changed.
+
+    A node's hash covers its own fields and its children's hashes. An edit
+    forgets the hash of the edited node and of its ancestors; a hash is
+    recomputed when next asked for, from the cached hashes of the untouched
+    children. Since an edit always forgets the whole ancestor chain, a
+    node whose hash is cached has cached hashes all the way down, and
+    forgetting can stop at the first ancestor that was already forgotten.
+    """
+
+    def __init__(self, parent_of: Callable[[str], Optional[str]]):
+        self._parent_of = parent_of
+        self._hashes: Dict[str, str] = {}
+
+    def invalidate(self, node_id: Optional[str]) -> None:
+        """Forget the hashes of a changed node and its ancestors."""
+        while node_id is not None and self._hashes.pop(node_id, None) is not None:
+            node_id = self._parent_of(node_id)
+
+    def forget_subtree(self, node: Any) -> None:
+        """Drop the hashes of a removed subtree (call before unlinking)."""
+        self.invalidate(self._parent_of(node.id))
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self._hashes.pop(current.id, None)
+            stack.extend(current.children)
+
+    def clear(self) -> None:
+        self._hashes.clear()
+
+    def hash(self, node: Any, objects: Optional[Dict[str, bytes]] = None) -> str:
+        """Hash of a subtree; the encoded objects of recomputed nodes are added to ``objects``."""
+        digest = self._hashes.get(node.id)
+        if digest is not None:
+            return digest
+        stack = [(node, False)]
+        while stack:
+            current, children_done = stack.pop()
+            if children_done:
+                data = node_object(current, [self._hashes[child.id] for child in current.children])
+                digest = self._hashes[current.id] = object_hash(data)
+                if objects is not None:
+                    objects[digest] = data
+            else:
+                stack.append((current, True))
+                stack.extend((child, False) for child in current.children if child.id not in self._hashes)
+        return self._hashes[node.id]
+
+    def missing_objects(self, store: SnapshotStore, roots: Iterable[Any]) -> Tuple[List[str], Dict[str, bytes]]:
+        """Root hashes of the forest and the encoded objects the store lacks.
+
+        Objects come from the nodes rehashed since the last call, plus a
+        walk that stops at every subtree the store already has, so the
+        work is proportional to what changed.
+        """
+        roots = list(roots)
+        objects: Dict[str, bytes] = {}
+        root_hashes = [self.hash(root, objects) for root in roots]
+        stack = [root for root, digest in zip(roots, root_hashes) if not store.has_object(digest)]
+        while stack:
+            node = stack.pop()
+            digest = self._hashes[node.id]
+            if digest not in objects:
+                # Hashed earlier without being written, e.g. by subtree_hash()
+                objects[digest] = node_object(node, [self._hashes[child.id] for child in node.children])
+            stack.extend(child for child in node.children if not store.has_object(self._hashes[child.id]))
+        return root_hashes, {digest: data for digest, data in objects.items() if not store.has_object(digest)}
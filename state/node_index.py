@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from datetime import datetime
+from enum import Enum
+from itertools import islice
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+# Fields with an exact-value index, and fields kept sorted for range queries
+VALUE_FIELDS = ("status", "children_type", "type")
+TIME_FIELDS = ("created_at", "updated_at")
+INDEXED_FIELDS = frozenset(VALUE_FIELDS + TIME_FIELDS)
+
+# A node's indexed values: status, children_type, type, created and updated timestamps
+_Key = Tuple[str, str, str, float, float]
+
+# One value or any of several, e.g. Status.ON_HOLD or ["진행중", "보류"]
+Values = Union[str, Iterable[str], None]
+
+
+def _node_key(node: Any) -> _Key:
+    return (
+        node.status.value,
+        node.children_type.value,
+        node.type,
+        node.created_at.timestamp(),
+        node.updated_at.timestamp(),
+    )
+
+
+def _value_set(values: Values) -> Optional[FrozenSet[str]]:
+    if values is None:
+        return None
+    if isinstance(values, str):
+        values = [values]
+    return frozenset(value.value if isinstance(value, Enum) else value for value in values)
+
+
+class NodeIndex:
+    """Secondary indexes over node status, children_type, type and timestamps.
+
+    Each value field maps values to the set of node IDs having them; each
+    timestamp is kept in a sorted list of ``(timestamp, id)`` so a time
+    range is a contiguous slice. Value conditions are answered by set
+    intersection; a time range narrower than that is walked instead,
+    checking the other conditions against each node's stored values. A
+    query never walks the forest.
+    """
+
+    def __init__(self) -> None:
+        self._values: Dict[str, Dict[str, Set[str]]] = {}
+        self._times: Dict[str, List[Tuple[float, str]]] = {}
+        self._keys: Dict[str, _Key] = {}
+        self.clear()
+
+    def clear(self) -> None:
+        self._values = {field: {} for field in VALUE_FIELDS}
+        self._times = {field: [] for field in TIME_FIELDS}
+        self._keys = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def build(self, roots: Iterable[Any]) -> None:
+        """Index a whole forest, sorting each time list once."""
+        self.clear()
+        stack = list(roots)
+        while stack:
+            node = stack.pop()
+            key = self._keys[node.id] = _node_key(node)
+            for field, value in zip(VALUE_FIELDS, key):
+                self._values[field].setdefault(value, set()).add(node.id)
+            for field, timestamp in zip(TIME_FIELDS, key[3:]):
+                self._times[field].append((timestamp, node.id))
+            stack.extend(node.children)
+        for entries in self._times.values():
+            entries.sort()
+
+    def add_subtree(self, node: Any) -> None:
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self.update(current)
+            stack.extend(current.children)
+
+    def remove_subtree(self, node: Any) -> None:
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            key = self._keys.pop(current.id, None)
+            if key is not None:
+                self._unlink(current.id, key)
+            stack.extend(current.children)
+
+    def update(self, node: Any) -> None:
+        """Re-index one node after an indexed field (or updated_at) changed."""
+        key = _node_key(node)
+        old = self._keys.get(node.id)
+        if old == key:
+            return
+        if old is not None:
+            self._unlink(node.id, old)
+        self._keys[node.id] = key
+        for field, value in zip(VALUE_FIELDS, key):
+            self._values[field].setdefault(value, set()).add(node.id)
+        for field, timestamp in zip(TIME_FIELDS, key[3:]):
+            insort(self._times[field], (timestamp, node.id))
+
+    def _unlink(self, node_id: str, key: _Key) -> None:
+        for field, value in zip(VALUE_FIELDS, key):
+            ids = self._values[field][value]
+            ids.discard(node_id)
+            if not ids:
+                del self._values[field][value]
+        for field, timestamp in zip(TIME_FIELDS, key[3:]):
+            entries = self._times[field]
+            del entries[bisect_left(entries, (timestamp, node_id))]
+
+    def query(
+        self,
+        status: Values = None,
+        children_type: Values = None,
+        node_type: Values = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        updated_after: Optional[datetime] = None,
+        updated_before: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[str]:
+        """IDs of nodes meeting every given condition.
+
+        Value conditions match any of the given values. ``*_after`` is
+        inclusive and ``*_before`` exclusive. With no conditions at all,
+        every node matches.
+        """
+        value_conditions = [
+            (i, values) for i, values in enumerate(map(_value_set, (status, children_type, node_type)))
+            if values is not None
+        ]
+        time_conditions = [
+            (
+                i, field,
+                after.timestamp() if after is not None else float("-inf"),
+                before.timestamp() if before is not None else float("inf"),
+            )
+            for i, (field, after, before) in enumerate(
+                (("created_at", created_after, created_before), ("updated_at", updated_after, updated_before))
+            )
+            if after is not None or before is not None
+        ]
+
+        if not value_conditions and not time_conditions:
+            return list(islice(self._keys, limit))
+
+        # Value conditions intersect as sets; a time range is a slice
+        id_sets: List[Set[str]] = []
+        for i, values in value_conditions:
+            ids = [self._values[VALUE_FIELDS[i]].get(value, set()) for value in values]
+            id_sets.append(ids[0] if len(ids) == 1 else set().union(*ids))
+        id_sets.sort(key=len)
+        ranges = []
+        for i, field, low, high in time_conditions:
+            entries = self._times[field]
+            start = bisect_left(entries, (low,))
+            end = max(bisect_left(entries, (high,)), start)
+            ranges.append((end - start, i, entries, start, end))
+        ranges.sort(key=lambda entry: entry[0])
+
+        keys = self._keys
+        found: Iterator[str]
+        if ranges and (not id_sets or ranges[0][0] < len(id_sets[0])):
+            # The narrowest time range drives; everything else is checked per node
+            _, driver, entries, start, end = ranges[0]
+            candidates = (entries[j][1] for j in range(start, end))
+            checks = value_conditions
+            bounds = [(3 + i, low, high) for i, _, low, high in time_conditions if i != driver]
+        else:
+            candidates = iter(id_sets[0].intersection(*id_sets[1:]) if len(id_sets) > 1 else id_sets[0])
+            checks = []
+            bounds = [(3 + i, low, high) for i, _, low, high in time_conditions]
+
+        if not checks and not bounds:
+            found = candidates
+        else:
+            def matches(node_id: str) -> bool:
+                key = keys[node_id]
+                for i, values in checks:
+                    if key[i] not in values:
+                        return False
+                for i, low, high in bounds:
+                    if not low <= key[i] < high:
+                        return False
+                return True
+
+            found = filter(matches, candidates)
+        return list(islice(found, limit))
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from models import Status
+
+STATUSES = tuple(Status)
+# Status is a str enum, so plain status strings find their index too
+STATUS_INDEX: Dict[Any, int] = {status: i for i, status in enumerate(STATUSES)}
+
+
+@dataclass(frozen=True)
+class Rollup:
+    """Status counts over a node's descendants (the node itself excluded)."""
+
+    counts: Dict[Status, int]
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def completion(self) -> Optional[float]:
+        """Percentage of non-cancelled descendants that are completed."""
+        active = self.total - self.counts[Status.CANCELLED]
+        if active == 0:
+            return None
+        return 100.0 * self.counts[Status.COMPLETED] / active
+
+
+class RollupCache:
+    """Descendant status counts for every node, maintained incrementally.
+
+    Counts are built once in a single post-order pass. After that an add,
+    delete or status change only touches the ancestors of the changed
+    node, so a mutation costs O(depth) instead of a subtree walk.
+
+    ``archived(node)`` gives the status counts of descendants kept out of
+    the forest (an archive stub's), which count as if they were present.
+    """
+
+    def __init__(self, archived: Callable[[Any], Optional[List[int]]] = lambda node: None) -> None:
+        self._counts: Dict[str, List[int]] = {}
+        self._archived = archived
+
+    def build(self, roots: Iterable[Any]) -> None:
+        self._counts.clear()
+        for root in roots:
+            self._count_subtree(root)
+
+    def _count_subtree(self, node: Any) -> List[int]:
+        """Fill counts for a subtree; return its totals including ``node``."""
+        # Reversed pre-order finishes every child before its parent
+        order = []
+        stack = [(node, "")]
+        while stack:
+            current, parent_id = stack.pop()
+            order.append((current, parent_id))
+            stack.extend((child, current.id) for child in current.children)
+        # Subtree totals (node included) handed up to parents not yet reached
+        pending: Dict[str, List[int]] = {}
+        totals: List[int] = []
+        for current, parent_id in reversed(order):
+            counts = pending.pop(current.id, None) or [0] * len(STATUSES)
+            archived = self._archived(current)
+            if archived is not None:
+                counts = [a + b for a, b in zip(counts, archived)]
+            self._counts[current.id] = counts
+            totals = counts.copy()
+            totals[STATUS_INDEX[current.status]] += 1
+            parent_counts = pending.get(parent_id)
+            if parent_counts is None:
+                pending[parent_id] = totals
+            else:
+                pending[parent_id] = [a + b for a, b in zip(parent_counts, totals)]
+        return totals
+
+    def _subtree_totals(self, node: Any) -> List[int]:
+        totals = self._counts[node.id].copy()
+        totals[STATUS_INDEX[node.status]] += 1
+        return totals
+
+    def _shift(self, ancestor_ids: Iterable[str], delta: List[int], sign: int) -> None:
+        for ancestor_id in ancestor_ids:
+            counts = self._counts[ancestor_id]
+            for i, value in enumerate(delta):
+                counts[i] += sign * value
+
+    def add_subtree(self, node: Any, ancestor_ids: Iterable[str]) -> None:
+        """Count a newly linked subtree into itself and its ancestors."""
+        self._shift(ancestor_ids, self._count_subtree(node), 1)
+
+    def remove_subtree(self, node: Any, ancestor_ids: Iterable[str]) -> None:
+        """Take a subtree out of its ancestors' counts (call before unlinking)."""
+        self._shift(ancestor_ids, self._subtree_totals(node), -1)
+        self.forget_subtree(node)
+
+    def forget_subtree(self, node: Any) -> None:
+        """Drop a subtree's counts but leave its ancestors' totals (it is being archived)."""
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self._counts.pop(current.id, None)
+            stack.extend(current.children)
+
+    def fill_subtree(self, node: Any) -> None:
+        """Count a subtree its ancestors already include (it came back from the archive)."""
+        self._count_subtree(node)
+
+    def change_status(self, old: Any, new: Any, ancestor_ids: Iterable[str]) -> None:
+        old_index, new_index = STATUS_INDEX[old], STATUS_INDEX[new]
+        if old_index == new_index:
+            return
+        for ancestor_id in ancestor_ids:
+            counts = self._counts[ancestor_id]
+            counts[old_index] -= 1
+            counts[new_index] += 1
+
+    def get(self, node_id: str) -> Optional[Rollup]:
+        counts = self._counts.get(node_id)
+        if counts is None:
+            return None
+        return Rollup(dict(zip(STATUSES, counts)))
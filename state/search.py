@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import re
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Set
+
+# Fields searched on every node; the DAPP lists only exist on DAPP_Child nodes
+TEXT_FIELDS = ("name", "description", "completion_condition", "progress_board", "content_board")
+LIST_FIELDS = ("atp", "signposts", "triggers")
+SEARCH_FIELDS = frozenset(TEXT_FIELDS + LIST_FIELDS)
+
+# \w matches Hangul syllables and jamo as well as Latin letters and digits
+WORD_RE = re.compile(r"\w+")
+
+# Below this many candidates, filter by each node's own tokens instead of
+# merging posting lists for every token that starts with the query word
+SCAN_LIMIT = 2000
+
+
+def tokenize(text: str) -> Set[str]:
+    return set(WORD_RE.findall(text.lower()))
+
+
+def node_tokens(node: Any, text: Callable[[Any, str], str] = getattr) -> FrozenSet[str]:
+    """All words in a node's searchable fields, read through ``text(node, field)``."""
+    texts = [text(node, field) for field in TEXT_FIELDS]
+    if node.type == "DAPP_Child":
+        for field in LIST_FIELDS:
+            texts.extend(getattr(node, field))
+    # One regex pass over the joined fields; "\n" keeps words from running together
+    return frozenset(WORD_RE.findall("\n".join(texts).lower()))
+
+
+def dict_tokens(node: Dict[str, Any]) -> FrozenSet[str]:
+    """``node_tokens`` of a JSON-mode node dict, e.g. one read from an archive."""
+    texts = [node.get(field, "") for field in TEXT_FIELDS]
+    for field in LIST_FIELDS:
+        texts.extend(node.get(field, ()))
+    return frozenset(WORD_RE.findall("\n".join(texts).lower()))
+
+
+def has_words(tokens: Iterable[str], words: Iterable[str]) -> bool:
+    """Whether every word is a prefix of some token."""
+    tokens = list(tokens)
+    return all(any(token.startswith(word) for token in tokens) for word in words)
+
+
+class SearchIndex:
+    """In-memory inverted index from words to node IDs.
+
+    Query words match as prefixes of indexed words, so Korean words with
+    particles attached ("목표를") are found by their stem ("목표"). The
+    sorted vocabulary turns a prefix into a contiguous range.
+
+    ``text(node, field)`` reads a text field, for fields kept outside the
+    node (board blobs).
+    """
+
+    def __init__(self, text: Callable[[Any, str], str] = getattr) -> None:
+        self._text = text
+        self._postings: Dict[str, Set[str]] = {}
+        self._vocabulary: List[str] = []  # sorted keys of _postings
+        self._node_tokens: Dict[str, FrozenSet[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._node_tokens)
+
+    def add_subtree(self, node: Any) -> None:
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self.update(current)
+            stack.extend(current.children)
+
+    def remove_subtree(self, node: Any) -> None:
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self.remove(current.id)
+            stack.extend(current.children)
+
+    def remove(self, node_id: str) -> None:
+        """Forget one node, e.g. one deleted from the forest."""
+        self._set_tokens(node_id, frozenset())
+        self._node_tokens.pop(node_id, None)
+
+    def update(self, node: Any) -> None:
+        """Re-index one node after its searchable fields changed."""
+        self._set_tokens(node.id, node_tokens(node, self._text))
+
+    def _set_tokens(self, node_id: str, tokens: FrozenSet[str]) -> None:
+        old = self._node_tokens.get(node_id, frozenset())
+        for token in old - tokens:
+            posting = self._postings[token]
+            posting.discard(node_id)
+            if not posting:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+        for token in tokens - old:
+            posting = self._postings.get(token)
+            if posting is None:
+                self._postings[token] = {node_id}
+                insort(self._vocabulary, token)
+            else:
+                posting.add(node_id)
+        self._node_tokens[node_id] = tokens
+
+    def _prefix_tokens(self, prefix: str) -> Iterable[str]:
+        vocabulary = self._vocabulary
+        i = bisect_left(vocabulary, prefix)
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            yield vocabulary[i]
+            i += 1
+
+    def search(self, query: str, limit: int = 50) -> List[str]:
+        """IDs of up to ``limit`` nodes containing every query word (as a word prefix)."""
+        # Longer words are usually more selective, so narrow with them first
+        words = sorted(tokenize(query), key=len, reverse=True)
+        if not words:
+            return []
+
+        candidates: Set[str] = set()
+        for i, word in enumerate(words):
+            if i > 0 and len(candidates) <= SCAN_LIMIT:
+                candidates = {
+                    node_id for node_id in candidates
+                    if any(token.startswith(word) for token in self._node_tokens[node_id])
+                }
+            else:
+                matches: Set[str] = set()
+                for token in self._prefix_tokens(word):
+                    matches |= self._postings[token]
+                candidates = matches if i == 0 else candidates & matches
+            if not candidates:
+                return []
+        return list(islice(candidates, limit))
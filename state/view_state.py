@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Most nodes a view remembers opening or closing by hand; the oldest are forgotten first
+MAX_OVERRIDES = 1000
+
+
+class ExpandedNodes:
+    """Which nodes a view shows expanded: a default depth plus the user's exceptions.
+
+    Nodes less than ``default_depth`` levels deep (roots are level 0) are
+    expanded unless closed by hand, deeper ones only if opened by hand;
+    ``default_depth`` None expands everything. Only the exceptions are
+    stored, so the state stays small however large the forest is, and
+    ``to_dict`` / ``from_dict`` turn it into a compact JSON-able form.
+    Supports ``in``, ``add``, ``discard`` and ``update`` like a set, but
+    not iteration: views ask about the nodes they are about to show.
+    """
+
+    def __init__(
+        self,
+        depth_of: Callable[[str], Optional[int]],
+        default_depth: Optional[int] = None,
+        overrides: Optional[Dict[str, bool]] = None,
+        limit: int = MAX_OVERRIDES,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        self._depth_of = depth_of
+        self.default_depth = default_depth
+        self.limit = limit
+        # node id -> expanded, for nodes that differ from the default; oldest first
+        self._overrides: Dict[str, bool] = dict(overrides or {})
+        self._on_change = on_change
+
+    def _default(self, node_id: str) -> bool:
+        if self.default_depth is None:
+            return True
+        depth = self._depth_of(node_id)
+        return depth is not None and depth < self.default_depth
+
+    def __contains__(self, node_id: object) -> bool:
+        if not isinstance(node_id, str):
+            return False
+        expanded = self._overrides.get(node_id)
+        return expanded if expanded is not None else self._default(node_id)
+
+    def _set(self, node_id: str, expanded: bool) -> None:
+        self._overrides.pop(node_id, None)
+        if self._default(node_id) != expanded:
+            self._overrides[node_id] = expanded
+            if len(self._overrides) > self.limit:
+                del self._overrides[next(iter(self._overrides))]
+        if self._on_change is not None:
+            self._on_change()
+
+    def add(self, node_id: str) -> None:
+        if node_id not in self:
+            self._set(node_id, True)
+
+    def discard(self, node_id: str) -> None:
+        if node_id in self:
+            self._set(node_id, False)
+
+    def update(self, node_ids: Iterable[str]) -> None:
+        for node_id in node_ids:
+            self.add(node_id)
+
+    def forget(self, keep: Callable[[str], bool]) -> None:
+        """Drop exceptions for nodes ``keep`` rejects, e.g. deleted ones."""
+        self._overrides = {node_id: expanded for node_id, expanded in self._overrides.items() if keep(node_id)}
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return {
+            "open": [node_id for node_id, expanded in self._overrides.items() if expanded],
+            "closed": [node_id for node_id, expanded in self._overrides.items() if not expanded],
+        }
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: Dict[str, Any],
+        depth_of: Callable[[str], Optional[int]],
+        default_depth: Optional[int] = None,
+        on_change: Optional[Callable[[], None]] = None,
+    ) -> "ExpandedNodes":
+        """Restore exceptions saved by ``to_dict``; anything malformed is ignored."""
+        overrides: Dict[str, bool] = {}
+        for key, expanded in (("open", True), ("closed", False)):
+            node_ids = data.get(key)
+            if isinstance(node_ids, list):
+                overrides.update((node_id, expanded) for node_id in node_ids if isinstance(node_id, str))
+        return cls(depth_of, default_depth, overrides, on_change=on_change)
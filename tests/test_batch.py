@@ -0,0 +1,110 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from models import ChildrenType
+from persistence import JournalStorage
+from state import AppState, CommandError, TreeChange, apply_commands
+
+
+def dump(state: AppState) -> List[Dict[str, Any]]:
+    return json.loads(state.data.model_dump_json())["roots"]
+
+
+def without_times(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    stripped = []
+    for node in nodes:
+        node = {key: value for key, value in node.items() if key != "updated_at"}
+        node["children"] = without_times(node["children"])
+        stripped.append(node)
+    return stripped
+
+
+@pytest.fixture(params=[False, True], ids=["models", "compact"])
+def state(tmp_path: Path, request: pytest.FixtureRequest) -> AppState:
+    state = AppState(JournalStorage(str(tmp_path / "data.json")), compact=request.param)
+    root = state.add_root_node("목표")
+    state.add_child_to_node(root.id, ChildrenType.RRTD)
+    state.drop_history(None)
+    return state
+
+
+def reload(state: AppState) -> AppState:
+    storage = state.storage
+    assert isinstance(storage, JournalStorage)
+    storage.flush()
+    return AppState(JournalStorage(str(storage.file_path)))
+
+
+def test_batch_is_one_broadcast_and_one_undo_step(state: AppState) -> None:
+    changes: List[Optional[TreeChange]] = []
+    state.subscribe_tree_patch(changes.append)
+    root = state.data.roots[0]
+
+    with state.batch("a"):
+        child = state.add_child_to_node(root.id, ChildrenType.RRTD, origin="a")
+        assert child is not None
+        state.add_child_to_node(child.id, ChildrenType.RRTD, origin="a")
+        state.update_node_field(root.id, "name", "바뀐 목표", origin="a")
+    assert changes == [None]  # inserts make it one rebuild
+
+    assert state.undo("a")
+    assert len(root.children) == 1 and root.name == "목표"
+    assert not state.undo("a")
+
+
+def test_failed_batch_is_rolled_back_and_not_broadcast(state: AppState) -> None:
+    changes: List[Optional[TreeChange]] = []
+    state.subscribe_tree_patch(changes.append)
+    before = dump(state)
+    root = state.data.roots[0]
+
+    with pytest.raises(RuntimeError):
+        with state.batch("a"):
+            state.update_node_field(root.id, "name", "바뀐 목표", origin="a")
+            state.delete_node(root.children[0].id, origin="a")
+            raise RuntimeError("stop")
+
+    assert without_times(dump(state)) == without_times(before)
+    assert changes == []
+    assert not state.undo("a")
+    assert dump(reload(state)) == dump(state)
+
+
+def test_apply_commands_resolves_refs(state: AppState) -> None:
+    result = apply_commands(state, [
+        {"op": "add_root", "name": "새 목표", "ref": "goal"},
+        {"op": "add_child", "parent": "$goal", "fields": {"name": "하위", "description": "설명"}, "ref": "sub"},
+        {"op": "set", "id": "$sub", "field": "status", "value": "완료"},
+    ], origin="a")
+
+    goal = state.find_node_by_id(result["refs"]["goal"])
+    assert goal is not None and [child.id for child in goal.children] == [result["refs"]["sub"]]
+    assert goal.children[0].status.value == "완료"
+    assert dump(reload(state)) == dump(state)
+
+
+@pytest.mark.parametrize("bad, message", [
+    ({"op": "set", "id": "$sub", "field": "status", "value": "없는 상태"}, "invalid status"),
+    ({"op": "set", "id": "$sub", "field": "children", "value": []}, "no settable field"),
+    ({"op": "delete", "id": "missing"}, "no node missing"),
+    ({"op": "rename"}, "unknown op"),
+])
+def test_apply_commands_rolls_back_on_the_first_failure(state: AppState, bad: Dict[str, Any], message: str) -> None:
+    before = dump(state)
+    commands = [
+        {"op": "add_root", "name": "새 목표", "ref": "goal"},
+        {"op": "add_child", "parent": "$goal", "ref": "sub"},
+        {"op": "delete", "id": state.data.roots[0].children[0].id},
+        bad,
+    ]
+
+    with pytest.raises(CommandError, match=message) as raised:
+        apply_commands(state, commands, origin="a")
+
+    assert raised.value.index == 3
+    assert without_times(dump(state)) == without_times(before)
+    assert not state.undo("a")
+    assert without_times(dump(reload(state))) == without_times(before)
@@ -0,0 +1,73 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+import cli
+from benchmarks.generator import generate_forest
+from persistence import JournalStorage, SqliteStorage
+
+
+def records_by_id(path: Path) -> Dict[str, Dict[str, Any]]:
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    return {record["id"]: record for record in records}
+
+
+@pytest.fixture
+def data_file(tmp_path: Path) -> Path:
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(generate_forest(roots=3, depth=3, fanout=3, seed=7)), encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("target", ["copy.json", "copy.db", "shards"])
+def test_export_import_round_trip(tmp_path: Path, data_file: Path, target: str) -> None:
+    boards = str(tmp_path / "boards")
+    exported = tmp_path / "nodes.ndjson"
+    assert cli.main(["--data", str(data_file), "--boards", boards, "export", "-o", str(exported)]) == 0
+    if target == "shards":
+        (tmp_path / target).mkdir()
+    copy = str(tmp_path / target)
+    assert cli.main(["--data", copy, "--boards", boards, "import", str(exported)]) == 0
+    again = tmp_path / "again.ndjson"
+    assert cli.main(["--data", copy, "--boards", boards, "export", "-o", str(again)]) == 0
+
+    records = records_by_id(exported)
+    assert len(records) == 3 + 9 + 27
+    assert records_by_id(again) == records
+
+
+def test_export_leaves_an_older_file_as_it_is(tmp_path: Path, data_file: Path) -> None:
+    document = json.loads(data_file.read_text(encoding="utf-8"))
+    document["version"] = "1.0"
+    for root in document["roots"]:
+        root["created_at"] = None
+    data_file.write_text(json.dumps(document), encoding="utf-8")
+    journal = JournalStorage(str(data_file)).journal_path
+    journal.write_bytes(b'{"op": "delete", "id": "')  # torn by a crash
+    before = (data_file.read_bytes(), journal.read_bytes())
+
+    out = tmp_path / "nodes.ndjson"
+    assert cli.main(["--data", str(data_file), "--boards", str(tmp_path / "b"), "export", "-o", str(out)]) == 0
+    assert (data_file.read_bytes(), journal.read_bytes()) == before
+
+
+def test_export_reads_an_older_sqlite_schema(tmp_path: Path, data_file: Path) -> None:
+    db = tmp_path / "data.db"
+    SqliteStorage(str(db), migrate_from=str(data_file)).load()
+    with sqlite3.connect(db) as conn:
+        conn.execute("ALTER TABLE nodes DROP COLUMN archive_ref")
+    before = db.read_bytes()
+
+    out = tmp_path / "nodes.ndjson"
+    assert cli.main(["--data", str(db), "--boards", str(tmp_path / "b"), "export", "-o", str(out)]) == 0
+    assert len(out.read_text(encoding="utf-8").splitlines()) == 39
+    assert db.read_bytes() == before
+
+
+def test_missing_input_is_an_error(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    assert cli.main(["--data", str(tmp_path / "d.json"), "import", str(tmp_path / "missing.ndjson")]) == 1
+    assert "No such file" in capsys.readouterr().err
+    assert not (tmp_path / "d.json").exists()
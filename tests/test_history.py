@@ -0,0 +1,93 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from models import ChildrenType, Status
+from persistence import JournalStorage
+from state import AppState
+
+
+def dump(state: AppState) -> List[Dict[str, Any]]:
+    return json.loads(state.data.model_dump_json())["roots"]
+
+
+def without_times(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    stripped = []
+    for node in nodes:
+        node = {key: value for key, value in node.items() if key != "updated_at"}
+        node["children"] = without_times(node["children"])
+        stripped.append(node)
+    return stripped
+
+
+@pytest.fixture(params=[False, True], ids=["models", "compact"])
+def state(tmp_path: Path, request: pytest.FixtureRequest) -> AppState:
+    state = AppState(JournalStorage(str(tmp_path / "data.json")), compact=request.param)
+    root = state.add_root_node("목표")
+    child = state.add_child_to_node(root.id, ChildrenType.RRTD)
+    assert child is not None
+    state.add_child_to_node(child.id, ChildrenType.DAPP)
+    state.drop_history(None)
+    return state
+
+
+def reload(state: AppState) -> AppState:
+    storage = state.storage
+    assert isinstance(storage, JournalStorage)
+    storage.flush()
+    return AppState(JournalStorage(str(storage.file_path)))
+
+
+def edit(state: AppState) -> None:
+    """One edit of each kind, by client "a"."""
+    root = state.data.roots[0]
+    child = root.children[0]
+    state.update_node_field(root.id, "name", "바뀐 목표", origin="a")
+    state.update_node_field(child.id, "status", Status.COMPLETED, origin="a")
+    state.add_child_to_node(root.id, ChildrenType.RRTD, origin="a")
+    state.delete_node(child.id, origin="a")
+
+
+def test_undo_restores_every_edit_and_redo_repeats_it(state: AppState) -> None:
+    before = without_times(dump(state))
+    edit(state)
+    after = without_times(dump(state))
+
+    while state.undo("a"):
+        pass
+    assert without_times(dump(state)) == before
+    while state.redo("a"):
+        pass
+    assert without_times(dump(state)) == after
+    # Rollups follow both ways
+    root_id = state.data.roots[0].id
+    assert state.get_rollup(root_id) == reload(state).get_rollup(root_id)
+
+
+def test_undo_is_per_client(state: AppState) -> None:
+    root_id = state.data.roots[0].id
+    state.update_node_field(root_id, "description", "a의 설명", origin="a")
+    state.update_node_field(root_id, "name", "b의 이름", origin="b")
+
+    assert state.undo("a")
+    node = state.find_node_by_id(root_id)
+    assert node is not None and node.description == "" and node.name == "b의 이름"
+    assert not state.undo("a")
+
+
+def test_undo_of_a_stale_edit_does_not_overwrite_a_newer_one(state: AppState) -> None:
+    root_id = state.data.roots[0].id
+    state.update_node_field(root_id, "name", "a의 이름", origin="a")
+    state.update_node_field(root_id, "name", "b의 이름", origin="b")
+
+    assert not state.undo("a")
+    node = state.find_node_by_id(root_id)
+    assert node is not None and node.name == "b의 이름"
+
+
+def test_undone_edits_are_saved(state: AppState) -> None:
+    edit(state)
+    state.undo("a")  # puts the deleted subtree back
+    assert dump(reload(state)) == dump(state)
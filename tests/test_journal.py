@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import pytest
+
+from persistence import JournalStorage
+from state import AppState
+
+
+def open_state(path: Path) -> AppState:
+    return AppState(JournalStorage(str(path)))
+
+
+def root_names(state: AppState) -> list:
+    return [root.name for root in state.data.roots]
+
+
+@pytest.fixture
+def journaled(tmp_path: Path) -> Path:
+    """A data file whose journal holds records not yet folded into the snapshot."""
+    path = tmp_path / "data.json"
+    state = open_state(path)
+    state.add_root_node("첫째")
+    state.storage.flush()
+    state.add_root_node("둘째")
+    state.storage.flush()
+    assert JournalStorage(str(path)).journal_path.stat().st_size > 0
+    return path
+
+
+@pytest.mark.parametrize("tail", [
+    b'{"op":"set","id":"x","fie',
+    # Cut inside a three-byte Hangul character
+    '{"op":"set","id":"x","field":"name","value":"목'.encode("utf-8")[:-1],
+], ids=["mid-record", "mid-character"])
+def test_torn_line_is_dropped_and_later_records_survive(journaled: Path, tail: bytes) -> None:
+    journal = JournalStorage(str(journaled)).journal_path
+    journal.write_bytes(journal.read_bytes() + tail)
+
+    state = open_state(journaled)
+    assert root_names(state) == ["첫째", "둘째"]
+    state.add_root_node("셋째")
+    state.storage.flush()
+
+    assert root_names(open_state(journaled)) == ["첫째", "둘째", "셋째"]
+
+
+def test_whole_final_record_without_newline_is_kept(journaled: Path) -> None:
+    journal = JournalStorage(str(journaled)).journal_path
+    journal.write_bytes(journal.read_bytes().rstrip(b"\n"))
+
+    state = open_state(journaled)
+    state.add_root_node("셋째")
+    state.storage.flush()
+
+    assert root_names(open_state(journaled)) == ["첫째", "둘째", "셋째"]
@@ -0,0 +1,78 @@
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from benchmarks.generator import generate_forest
+from models import ChildrenType
+from persistence import ShardedStorage
+from state import AppState
+
+
+def dump(state: AppState) -> List[Dict[str, Any]]:
+    return json.loads(state.data.model_dump_json())["roots"]
+
+
+def mtimes(storage: ShardedStorage) -> Dict[str, int]:
+    return {path.name: path.stat().st_mtime_ns for path in storage.roots_dir.iterdir()}
+
+
+@pytest.fixture
+def directory(tmp_path: Path) -> Path:
+    source = tmp_path / "data.json"
+    source.write_text(json.dumps(generate_forest(roots=4, depth=3, fanout=3, seed=3)), encoding="utf-8")
+    ShardedStorage(str(tmp_path / "data"), migrate_from=str(source)).load()
+    return tmp_path / "data"
+
+
+def open_state(directory: Path, compact: bool = False) -> AppState:
+    return AppState(ShardedStorage(str(directory), migrate_from=None), compact=compact)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_edit_rewrites_only_its_root(directory: Path, compact: bool) -> None:
+    state = open_state(directory, compact)
+    storage = state.storage
+    assert isinstance(storage, ShardedStorage)
+    before = mtimes(storage)
+    time.sleep(0.01)
+
+    root = state.data.roots[0]
+    leaf = root.children[0].children[0]
+    state.update_node_field(leaf.id, "name", "바뀐 이름")
+    state.add_child_to_node(leaf.id, ChildrenType.RRTD)
+    storage.flush()
+
+    after = mtimes(storage)
+    assert {name for name in after if after[name] != before[name]} == {storage.shard_path(root.id).name}
+    assert dump(open_state(directory)) == dump(state)
+
+
+def test_deleted_root_loses_its_shard(directory: Path) -> None:
+    state = open_state(directory)
+    storage = state.storage
+    assert isinstance(storage, ShardedStorage)
+    root_id = state.data.roots[1].id
+
+    state.delete_node(root_id, origin="c")
+    storage.flush()
+    assert not storage.shard_path(root_id).exists()
+    assert dump(open_state(directory)) == dump(state)
+
+    state.undo("c")
+    storage.flush()
+    assert storage.shard_path(root_id).exists()
+    assert dump(open_state(directory)) == dump(state)
+
+
+def test_full_save_removes_unlisted_shards(directory: Path) -> None:
+    storage = ShardedStorage(str(directory), migrate_from=None)
+    data = storage.load()
+    stray = storage.shard_path("left-by-a-crash")
+    stray.write_text(data.roots[0].model_dump_json(), encoding="utf-8")
+
+    storage._write_payloads([storage._snapshot(data, full=True)])
+    assert not stray.exists()
+    assert len(list(storage.roots_dir.iterdir())) == len(data.roots)
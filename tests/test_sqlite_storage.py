@@ -0,0 +1,84 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from benchmarks.generator import generate_forest
+from models import ChildrenType
+from persistence import SqliteStorage
+from state import AppState
+
+
+def dump(state: AppState) -> List[Dict[str, Any]]:
+    return json.loads(state.data.model_dump_json())["roots"]
+
+
+def all_rollups(state: AppState) -> Dict[str, Any]:
+    rollups = {}
+    stack = list(state.data.roots)
+    while stack:
+        node = stack.pop()
+        rollups[node.id] = state.get_rollup(node.id)
+        stack.extend(node.children)
+    return rollups
+
+
+@pytest.fixture
+def database(tmp_path: Path) -> Path:
+    json_path = tmp_path / "data.json"
+    json_path.write_text(json.dumps(generate_forest(roots=4, depth=4, fanout=3, seed=5)), encoding="utf-8")
+    db_path = tmp_path / "data.db"
+    SqliteStorage(str(db_path), migrate_from=str(json_path)).load()
+    return db_path
+
+
+def open_state(path: Path, load_depth: Any = None, compact: bool = False) -> AppState:
+    return AppState(SqliteStorage(str(path), migrate_from=None, load_depth=load_depth), compact=compact)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_partial_load_counts_stored_descendants(database: Path, compact: bool) -> None:
+    full = open_state(database, compact=compact)
+    partial = open_state(database, load_depth=2, compact=compact)
+
+    assert partial.node_count < full.node_count
+    assert all(partial.node_depth(node_id) <= 1 for node_id in all_rollups(partial))
+    full_rollups = all_rollups(full)
+    for node_id, rollup in all_rollups(partial).items():
+        assert rollup == full_rollups[node_id]
+
+    partial.query()  # needs the whole forest
+    assert dump(partial) == dump(full)
+    assert all_rollups(partial) == full_rollups
+
+
+def test_expanding_loads_one_subtree(database: Path) -> None:
+    full = open_state(database)
+    partial = open_state(database, load_depth=2)
+    node = partial.data.roots[0].children[0]
+    assert partial.has_hidden_children(node) and not node.children
+
+    assert partial.reveal_children(node.id)
+    assert not partial.has_hidden_children(node)
+    assert dump(partial)[0]["children"][0] == dump(full)[0]["children"][0]
+    assert partial.has_hidden_children(partial.data.roots[0].children[1])
+
+
+def test_edits_under_unloaded_nodes_persist(database: Path) -> None:
+    partial = open_state(database, load_depth=2)
+    parent, doomed = partial.data.roots[0].children[:2]
+    stored = open_state(database)
+    stored_children = stored.find_node_by_id(parent.id).children  # type: ignore[union-attr]
+    stored_subtree = json.loads(stored.find_node_by_id(doomed.id).model_dump_json())  # type: ignore[union-attr]
+
+    child = partial.add_child_to_node(parent.id, ChildrenType.RRTD, origin="c")
+    assert child is not None
+    assert [n.id for n in parent.children] == [n.id for n in stored_children] + [child.id]
+    partial.delete_node(doomed.id, origin="c")
+    partial.undo("c")
+    assert json.loads(doomed.model_dump_json()) == stored_subtree  # stored descendants included
+    partial.storage.flush()
+
+    partial.query()
+    assert dump(open_state(database)) == dump(partial)
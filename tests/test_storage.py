@@ -0,0 +1,109 @@
+import json
+import time
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+import persistence.storage as storage_module
+from models import AppData, BaseNode
+from persistence import JournalStorage, JsonStorage
+from state import AppState
+
+
+class RecordingTime:
+    """The writer thread's clock, with sleeps recorded instead of waited out."""
+
+    def __init__(self) -> None:
+        self.sleeps: List[float] = []
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        time.sleep(0.001)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(time, name)
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> RecordingTime:
+    recording = RecordingTime()
+    monkeypatch.setattr(storage_module, "time", recording)
+    return recording
+
+
+def fail_writes(monkeypatch: pytest.MonkeyPatch, storage: JournalStorage, failures: int) -> List[int]:
+    """Make the next ``failures`` writes raise; returns the payload counts of every attempt."""
+    attempts: List[int] = []
+    write = storage._write_payloads
+
+    def flaky(payloads: List[Any]) -> None:
+        attempts.append(len(payloads))
+        if len(attempts) <= failures:
+            raise OSError("disk full")
+        write(payloads)
+
+    monkeypatch.setattr(storage, "_write_payloads", flaky)
+    return attempts
+
+
+def test_failed_write_is_retried_with_backoff(tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+                                              clock: RecordingTime) -> None:
+    path = tmp_path / "data.json"
+    state = AppState(JournalStorage(str(path)))
+    storage = state.storage
+    assert isinstance(storage, JournalStorage)
+    attempts = fail_writes(monkeypatch, storage, failures=4)
+
+    state.add_root_node("하나")
+    assert storage.flush(timeout=5) is False  # the first attempt failed
+    state.add_root_node("둘")
+    deadline = time.monotonic() + 5
+    while not storage.flush(timeout=1) and time.monotonic() < deadline:
+        pass
+
+    assert storage.error_count == 4
+    assert clock.sleeps == [0.5, 1.0, 2.0, 4.0]
+    # Nothing was dropped: the failed record went out with the one queued after it
+    assert attempts[-1] == 2
+    assert [root.name for root in JournalStorage(str(path)).load().roots] == ["하나", "둘"]
+
+
+def test_backoff_is_capped_and_resets(tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+                                      clock: RecordingTime) -> None:
+    monkeypatch.setattr(storage_module, "MAX_RETRY_SECONDS", 1.0)
+    state = AppState(JournalStorage(str(tmp_path / "data.json")))
+    storage = state.storage
+    assert isinstance(storage, JournalStorage)
+    fail_writes(monkeypatch, storage, failures=3)
+
+    state.add_root_node("하나")
+    while not storage.flush(timeout=1):
+        pass
+    state.add_root_node("둘")
+    storage.flush(timeout=1)
+
+    assert clock.sleeps == [0.5, 1.0, 1.0]
+    assert storage.save_count == 2
+
+
+def test_current_version_round_trips_without_upgrade(tmp_path: Path) -> None:
+    path = tmp_path / "data.json"
+    data = AppData(roots=[BaseNode(name="목표", children=[BaseNode(name="하위")])])
+    JsonStorage(str(path)).save_immediate(data)
+    written = path.read_bytes()
+
+    loaded, upgraded = storage_module.parse_app_data(written)
+    assert not upgraded
+    assert loaded.model_dump() == data.model_dump()
+
+
+def test_older_version_is_upgraded_once(tmp_path: Path) -> None:
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"version": "1.0", "roots": [{"name": "옛 목표", "created_at": None}]}),
+                    encoding="utf-8")
+
+    data = JsonStorage(str(path)).load()
+    assert data.roots[0].created_at is not None
+    assert json.loads(path.read_text(encoding="utf-8"))["version"] == data.version != "1.0"
+    assert storage_module.parse_app_data(path.read_bytes())[1] is False